@@ -0,0 +1,54 @@
+"""
+Latency of a barcode scan (MainController.add_to_cart_by_code) on large catalogs.
+
+Writes a synthetic catalog with a code per product, then times scanning
+codes spread over the whole catalog into a cart. A keyboard-wedge scanner
+should feel instant, so the target is a few milliseconds per scan.
+
+Usage: python -m benchmarks.barcode_scan [sizes...]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+from controller.main_controller import MainController
+
+FIRST_CODE = 4000000000000
+SCANS = 1000
+
+
+def make_catalog(size):
+    return {"Groceries": [[f"Item {i}", 1.0 + i % 7, 5, f"{FIRST_CODE + i}"] for i in range(size)]}
+
+
+def main(sizes):
+    cwd = os.getcwd()
+    print(f"{'products':>9} {'first s':>8} {'scan ms':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            # The models keep their data files in the working directory
+            os.chdir(directory)
+            try:
+                with open("products.txt", "w") as f:
+                    json.dump(make_catalog(size), f)
+                controller = MainController()
+                cart = controller.new_cart()
+                # The first scan loads the catalog and builds the code index
+                started = time.perf_counter()
+                controller.add_to_cart_by_code(str(FIRST_CODE), cart=cart)
+                first = time.perf_counter() - started
+
+                step = max(size // SCANS, 1)
+                codes = [str(FIRST_CODE + i) for i in range(0, size, step)]
+                started = time.perf_counter()
+                for code in codes:
+                    controller.add_to_cart_by_code(code)
+                scan = (time.perf_counter() - started) / len(codes)
+            finally:
+                os.chdir(cwd)
+        print(f"{size:>9} {first:>8.2f} {scan * 1e3:>8.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [50_000, 500_000])
@@ -0,0 +1,89 @@
+"""
+Memory used by the in-memory product catalog, measured with tracemalloc.
+
+Compares the old representation (a [name, price, quantity] list per product,
+(category, name) tuple keys in the index, a fresh tuple per product on every
+get_products_by_category call) with the Product records, nested index and
+ProductsView now used by ProductModel.
+
+Usage: python -m benchmarks.catalog_memory [sizes...]
+"""
+import os
+import sys
+import gc
+import json
+import tempfile
+import tracemalloc
+from model.product_model import ProductModel
+
+CATEGORIES = ("Electronics", "Groceries", "Clothing", "Books", "Beauty")
+
+
+def make_catalog(size):
+    catalog = {category: [] for category in CATEGORIES}
+    for i in range(size):
+        catalog[CATEGORIES[i % len(CATEGORIES)]].append([f"Product {i}", round(1 + i % 997 * 0.37, 2), i % 50])
+    return catalog
+
+
+def measure(build):
+    """Return (bytes still held, peak bytes) allocated by build()"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current, peak
+
+
+def old_catalog(path):
+    with open(path) as f:
+        products = json.load(f)
+    item_index, name_index = {}, {}
+    for category, items in products.items():
+        for item in items:
+            key = item[0].lower()
+            item_index[(category, key)] = item
+            name_index.setdefault(key, []).append((category, item))
+    return products, item_index, name_index
+
+
+def new_catalog(path):
+    ProductModel.PRODUCTS_FILE = path
+    ProductModel.clear_cache()
+    return ProductModel._load_products()
+
+
+def old_listing(products):
+    return [[tuple(product) for product in products[category]] for category in CATEGORIES]
+
+
+def new_listing():
+    return [ProductModel.get_products_by_category(category) for category in CATEGORIES]
+
+
+def main(sizes):
+    print(f"{'products':>10} {'lists MB':>10} {'records MB':>11} {'saved':>7} "
+          f"{'list copies MB':>15} {'views MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "products.txt")
+        for size in sizes:
+            with open(path, "w") as f:
+                json.dump(make_catalog(size), f)
+
+            old, _ = measure(lambda: old_catalog(path))
+            new, _ = measure(lambda: new_catalog(path))
+
+            products = old_catalog(path)[0]
+            old_copies, _ = measure(lambda: old_listing(products))
+            del products
+            new_views, _ = measure(new_listing)
+            ProductModel.clear_cache()
+
+            print(f"{size:>10} {old / 1e6:>10.1f} {new / 1e6:>11.1f} {1 - new / old:>7.0%} "
+                  f"{old_copies / 1e6:>15.1f} {new_views / 1e6:>9.3f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
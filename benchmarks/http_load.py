@@ -0,0 +1,153 @@
+"""
+Load test for controller.http_service: simulated checkout lanes against one
+server process.
+
+Starts the server in a scratch directory, seeds a catalog and a cashier per
+lane, then runs the lanes concurrently for a fixed time. Each lane keeps one
+keep-alive connection and loops over baskets: search, look up the basket's
+products (sent pipelined, as a scanner burst), price the cart and check out.
+Reports requests and checkouts per second and latency percentiles per
+request type.
+
+Usage: python -m benchmarks.http_load [lanes] [seconds]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import tempfile
+import subprocess
+
+CATEGORIES = ("Electronics", "Groceries", "Clothing", "Books", "Beauty")
+PRODUCTS = 2_000
+BASKET = 8
+
+
+class Lane:
+    """One till: a keep-alive connection and a login session"""
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+        self.token = None
+        self.latencies = {}
+
+    @classmethod
+    async def open(cls, port):
+        return cls(*await asyncio.open_connection("127.0.0.1", port))
+
+    def send(self, method, *args):
+        body = json.dumps({"args": args}).encode()
+        auth = f"Authorization: Bearer {self.token}\r\n" if self.token else ""
+        self.writer.write(f"POST /api/{method} HTTP/1.1\r\nHost: localhost\r\n{auth}"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+
+    async def receive(self):
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while (line := await self.reader.readline()) != b"\r\n":
+            key, _, value = line.decode().partition(":")
+            if key.lower() == "content-length":
+                length = int(value)
+        data = json.loads(await self.reader.readexactly(length))
+        if status != 200:
+            raise RuntimeError(f"{status}: {data['error']}")
+        return data
+
+    async def call(self, method, *args, pipeline=1):
+        """Send the request pipeline times back to back and wait for every answer"""
+        started = time.perf_counter()
+        for _ in range(pipeline):
+            self.send(method, *args)
+        answers = [await self.receive() for _ in range(pipeline)]
+        # Every pipelined request waited for the whole burst
+        self.latencies.setdefault(method, []).extend([time.perf_counter() - started] * pipeline)
+        return answers[-1]
+
+    async def lookups(self, items):
+        """Pipelined get_product for each (category, name)"""
+        started = time.perf_counter()
+        for category, name in items:
+            self.send("get_product", category, name)
+        answers = [await self.receive() for _ in items]
+        elapsed = time.perf_counter() - started
+        self.latencies.setdefault("get_product", []).extend([elapsed] * len(items))
+        return [answer["result"] for answer in answers]
+
+    def close(self):
+        self.writer.close()
+
+
+async def seed(port, lanes):
+    admin = await Lane.open(port)
+    admin.token = (await admin.call("validate_login", "admin", "admin123"))["token"]
+    for i in range(PRODUCTS):
+        admin.send("add_product", CATEGORIES[i % len(CATEGORIES)], f"Product {i}", round(1 + i % 97 * 0.5, 2), 10**9)
+    for i in range(lanes):
+        admin.send("add_cashier", f"lane{i}", "secret")
+    for _ in range(PRODUCTS + lanes):
+        await admin.receive()
+    admin.close()
+
+
+async def run_lane(port, number, deadline, checkouts):
+    rng = random.Random(number)
+    lane = await Lane.open(port)
+    lane.token = (await lane.call("validate_login", f"lane{number}", "secret"))["token"]
+    while time.perf_counter() < deadline:
+        await lane.call("search_products", f"Product {rng.randrange(100)}", 10)
+        items = [(CATEGORIES[i % len(CATEGORIES)], f"Product {i}")
+                 for i in (rng.randrange(PRODUCTS) for _ in range(BASKET))]
+        products = await lane.lookups(items)
+        lines = [(category, product[0], rng.randint(1, 3)) for (category, _), product in zip(items, products)]
+        await lane.call("price_cart", lines, "Card")
+        await lane.call("checkout", lines, "Card")
+        checkouts.append(1)
+    lane.close()
+    return lane.latencies
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def load(port, lanes, seconds):
+    await seed(port, lanes)
+    checkouts = []
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run_lane(port, i, started + seconds, checkouts) for i in range(lanes)))
+    elapsed = time.perf_counter() - started
+
+    latencies = {}
+    for lane_latencies in results:
+        for method, values in lane_latencies.items():
+            latencies.setdefault(method, []).extend(values)
+    everything = [value for values in latencies.values() for value in values]
+    print(f"{lanes} lanes, {elapsed:.1f} s: {len(everything) / elapsed:,.0f} requests/s, "
+          f"{len(checkouts) / elapsed:,.1f} checkouts/s")
+    print(f"{'request':>24} {'count':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for method, values in sorted(latencies.items()) + [("all", everything)]:
+        print(f"{method:>24} {len(values):>8} {percentile(values, 0.5) * 1e3:>8.1f} "
+              f"{percentile(values, 0.99) * 1e3:>8.1f}")
+
+
+def main(lanes=50, seconds=10):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as scratch:
+        # The server keeps its data files in its working directory
+        server = subprocess.Popen(
+            [sys.executable, "-m", "controller.http_service", "--port", "0"],
+            cwd=scratch, env={**os.environ, "PYTHONPATH": root},
+            stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(server.stdout.readline().rsplit(":", 1)[1])
+            asyncio.run(load(port, lanes, seconds))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
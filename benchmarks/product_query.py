@@ -0,0 +1,64 @@
+"""
+Latency of ProductModel.query_products's sorted indexes over large catalogs.
+
+Builds a SortedIndex over a synthetic catalog, times paging through typical
+admin list queries (first page, then the following pages of the same query)
+and the cost of applying a stock change to the index.
+
+Usage: python -m benchmarks.product_query [sizes...]
+"""
+import sys
+import time
+import random
+from model.product import Product, parse_sort
+from model.product_index import SortedIndex
+
+CATEGORIES = [f"Category {i}" for i in range(20)]
+QUERIES = [
+    ("price", {}),
+    ("-stock", {"max_price": 5}),
+    ("name", {"name_prefix": "product 12"}),
+    ("category,-price", {}),
+    ("-stock,price", {"category": "Category 3"}),
+]
+PAGES = 50
+PAGE = 200
+
+
+def make_catalog(size, rng):
+    products = {category: [] for category in CATEGORIES}
+    for i in range(size):
+        products[rng.choice(CATEGORIES)].append(
+            Product(f"Product {i}", rng.randint(1, 2000) / 100, rng.randint(0, 500)))
+    return products
+
+
+def main(sizes):
+    rng = random.Random(42)
+    for size in sizes:
+        products = make_catalog(size, rng)
+        started = time.perf_counter()
+        index = SortedIndex.build(products)
+        print(f"{size} products, build {time.perf_counter() - started:.2f} s")
+        print(f"{'sort':>16} {'filters':>28} {'matches':>8} {'first ms':>9} {'next ms':>8}")
+        for sort, filters in QUERIES:
+            keys = parse_sort(sort)
+            started = time.perf_counter()
+            total, _ = index.query(keys, 0, PAGE, **filters)
+            first = time.perf_counter() - started
+            started = time.perf_counter()
+            for page in range(1, PAGES + 1):
+                index.query(keys, page * PAGE, PAGE, **filters)
+            following = (time.perf_counter() - started) / PAGES
+            print(f"{sort:>16} {str(filters):>28} {total:>8} {first * 1e3:>9.2f} {following * 1e3:>8.3f}")
+
+        items = [(category, item) for category, items in products.items() for item in items[:100]]
+        started = time.perf_counter()
+        for category, item in items:
+            item.quantity -= 1
+            index.set(category, item)
+        print(f"stock change {(time.perf_counter() - started) / len(items) * 1e6:.1f} us\n")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
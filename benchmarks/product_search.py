@@ -0,0 +1,65 @@
+"""
+Latency of ProductModel.search's index over large catalogs.
+
+Builds a SearchIndex over synthetic product names and times prefix queries
+of 1-4 characters (autocomplete while typing) and misspelled whole words.
+
+Usage: python -m benchmarks.product_search [sizes...]
+"""
+import sys
+import time
+import random
+from model.product_search import SearchIndex
+
+SYLLABLES = "ba be bi bo ca ce co da de do fa fe ka ke la le li lo ma me mi mo na ne no pa pe ra re ri ro sa se so ta te to va ve".split()
+
+
+def make_words(count, rng):
+    """Pronounceable pseudo-words, so names have a realistic spread of trigrams"""
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_catalog(size, words, rng):
+    names = set()
+    while len(names) < size:
+        names.add(" ".join(rng.sample(words, rng.randint(1, 3))).title())
+    return {"All": [(name,) for name in names]}
+
+
+def misspell(word, rng):
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def time_queries(index, queries):
+    started = time.perf_counter()
+    for query in queries:
+        index.search(query, 10)
+    return (time.perf_counter() - started) / len(queries) * 1e3
+
+
+def main(sizes):
+    rng = random.Random(42)
+    print(f"{'names':>9} {'build s':>8} {'trigrams s':>11} {'prefix ms':>10} {'typo ms':>8}")
+    words = make_words(50_000, rng)
+    for size in sizes:
+        catalog = make_catalog(size, words, rng)
+        started = time.perf_counter()
+        index = SearchIndex.build(catalog)
+        build = time.perf_counter() - started
+        # The trigram index is built by the first typo-tolerant query
+        started = time.perf_counter()
+        index.search("qqqq", 10)
+        grams = time.perf_counter() - started
+
+        prefixes = [rng.choice(words)[:rng.randint(1, 4)] for _ in range(2000)]
+        typos = [misspell(rng.choice([w for w in words if len(w) > 5]), rng) for _ in range(200)]
+        print(f"{size:>9} {build:>8.1f} {grams:>11.1f} {time_queries(index, prefixes):>10.4f} "
+              f"{time_queries(index, typos):>8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
@@ -0,0 +1,122 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncController:
+    """
+    Runs MainController calls on a bounded thread pool so the Tk event loop
+    never waits on file I/O. call() returns a Future; its on_done/on_error
+    callbacks are run on the Tk thread, picked up by polling with root.after
+    (Tk must only be touched from the thread running mainloop).
+
+    Calls can be given a key to handle repeats while one is in flight:
+    "join" (the default) hands back the running call and drops the repeat,
+    e.g. a double-clicked Pay button; "replace" cancels the older call, or
+    ignores its result if it already started, e.g. search-as-you-type.
+    """
+
+    POLL_MS = 15
+
+    def __init__(self, controller, root, max_workers=4, on_busy=None):
+        self.controller = controller
+        self.root = root
+        # on_busy(True) when the first call starts, on_busy(False) when the
+        # last one finishes; run on the Tk thread
+        self.on_busy = on_busy
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="controller")
+        self._tk_thread = threading.get_ident()
+        self._finished = queue.SimpleQueue()  # callbacks to run on the Tk thread
+        self._inflight = {}      # key -> the latest Future for that key
+        self._pending = 0        # calls whose callbacks have not run yet
+        self._polling = False
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def call(self, method, *args, on_done=None, on_error=None, key=None, policy="join",
+             widgets=(), **kwargs):
+        """
+        Run controller.method(*args, **kwargs) on the pool. Must be called
+        from the Tk thread. widgets are disabled until the call is over.
+        Errors without an on_error go to Tk's report_callback_exception.
+        """
+        if key is not None and key in self._inflight:
+            running = self._inflight[key]
+            if policy == "join":
+                return running
+            running.cancel()  # no-op once started, its result is then ignored
+
+        # method names a controller method, or is a function to run as is
+        target = method if callable(method) else getattr(self.controller, method)
+        future = self._pool.submit(target, *args, **kwargs)
+        if key is not None:
+            self._inflight[key] = future
+        for widget in widgets:
+            widget.configure(state="disabled")
+
+        self._pending += 1
+        if self._pending == 1 and self.on_busy:
+            self.on_busy(True)
+        future.add_done_callback(lambda f: self._finished.put(lambda: self._deliver(f, key, on_done, on_error, widgets)))
+        self._schedule_poll()
+        return future
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        """Run the callbacks of finished calls, on the Tk thread"""
+        self._polling = False
+        try:
+            while True:
+                try:
+                    callback = self._finished.get_nowait()
+                except queue.Empty:
+                    break
+                callback()
+        finally:
+            # Keep polling even if a callback raised (Tk reports the error)
+            if self._pending:
+                self._schedule_poll()
+
+    def listen(self, events, handler):
+        """
+        Subscribe handler to a controller EventBus, run on the Tk thread.
+        Events published by calls made through this object are handled
+        before those calls' on_done. Returns the unsubscribe function.
+        """
+        def forward(event):
+            if threading.get_ident() == self._tk_thread:
+                handler(event)
+            else:
+                self._finished.put(lambda: handler(event))
+        return events.subscribe(forward)
+
+    def _deliver(self, future, key, on_done, on_error, widgets):
+        latest = key is None or self._inflight.get(key) is future
+        if latest and key is not None:
+            del self._inflight[key]
+        self._pending -= 1
+        try:
+            for widget in widgets:
+                widget.configure(state="normal")
+            # A replaced call's outcome is stale, drop it
+            if latest and not future.cancelled():
+                error = future.exception()
+                if error is None:
+                    if on_done:
+                        on_done(future.result())
+                elif on_error:
+                    on_error(error)
+                else:
+                    self.root.report_callback_exception(type(error), error, error.__traceback__)
+        finally:
+            if not self._pending and self.on_busy:
+                self.on_busy(False)
+
+    def shutdown(self, wait=False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,157 @@
+def check_quantity(quantity):
+    """Reject quantities that are not whole numbers, e.g. 1.5 or True sent over HTTP"""
+    if isinstance(quantity, bool) or not isinstance(quantity, int):
+        raise ValueError("Quantity must be a whole number")
+    return quantity
+
+
+class CartLine:
+    """
+    One product in a cart, with the category it was picked from. Unpacks and
+    compares like the (name, price, quantity) tuple carts used to hold.
+    """
+
+    __slots__ = ("category", "name", "price", "quantity")
+
+    def __init__(self, category, name, price, quantity):
+        self.category = category
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+
+    @property
+    def line_total(self):
+        return self.price * self.quantity
+
+    def __iter__(self):
+        return iter((self.name, self.price, self.quantity))
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return (self.name, self.price, self.quantity)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, CartLine):
+            return (self.category, self.name, self.price, self.quantity) == \
+                (other.category, other.name, other.price, other.quantity)
+        if isinstance(other, (list, tuple)):
+            return (self.name, self.price, self.quantity) == tuple(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"CartLine({self.category!r}, {self.name!r}, {self.price!r}, {self.quantity!r})"
+
+
+class Cart:
+    """
+    Shopping cart with one line per product, keyed by (category, name) with
+    the name matched case-insensitively like the catalog does. Adding a
+    product already in the cart adds to its line. The subtotal is updated
+    on each change, so reading it is O(1). Discounts and the total come
+    from the promotions, see MainController.price_cart.
+    """
+
+    def __init__(self, payment_method="Cash"):
+        self.payment_method = payment_method
+        self._lines = {}  # (category, lowercased name) -> CartLine, in insertion order
+        self._subtotal = 0.0
+
+    @staticmethod
+    def _key(category, name):
+        return (category, name.lower())
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines.values())
+
+    def __bool__(self):
+        return bool(self._lines)
+
+    def __getitem__(self, index):
+        """The index-th line in the order products were first added (O(n))"""
+        return list(self._lines.values())[index]
+
+    def line(self, category, name):
+        """Return the CartLine of a product, or None"""
+        return self._lines.get(self._key(category, name))
+
+    def quantity_of(self, category, name):
+        line = self.line(category, name)
+        return line.quantity if line else 0
+
+    def add(self, category, name, price, quantity=1):
+        """Add quantity of a product, merging with its line if present. Returns the line."""
+        if check_quantity(quantity) <= 0:
+            raise ValueError("Quantity must be positive")
+        key = self._key(category, name)
+        line = self._lines.get(key)
+        if line is None:
+            line = self._lines[key] = CartLine(category, name, price, 0)
+        elif line.price != price:
+            # The price changed since the line was started, the whole line follows it
+            self._subtotal += (price - line.price) * line.quantity
+            line.price = price
+        line.quantity += quantity
+        self._subtotal += price * quantity
+        return line
+
+    def set_quantity(self, category, name, quantity):
+        """Set the quantity of a line, 0 removes it"""
+        if check_quantity(quantity) < 0:
+            raise ValueError("Quantity must not be negative")
+        line = self.line(category, name)
+        if line is None:
+            raise ValueError(f"Product '{name}' is not in the cart")
+        if quantity == 0:
+            return self.remove(category, name)
+        self._subtotal += line.price * (quantity - line.quantity)
+        line.quantity = quantity
+        return line
+
+    def remove(self, category, name):
+        line = self._lines.pop(self._key(category, name), None)
+        if line is None:
+            raise ValueError(f"Product '{name}' is not in the cart")
+        self._subtotal -= line.line_total
+        if not self._lines:
+            self._subtotal = 0.0  # drop float residue
+        return line
+
+    def clear(self):
+        self._lines.clear()
+        self._subtotal = 0.0
+
+    def copy(self):
+        """A cart with copies of the lines, for handing to another thread"""
+        cart = Cart(self.payment_method)
+        for line in self:
+            cart.add(line.category, line.name, line.price, line.quantity)
+        return cart
+
+    def remove_lines(self, lines):
+        """
+        Take checked-out (category, name, quantity) lines off the cart,
+        keeping whatever was added to it since checkout_lines() was read.
+        """
+        for category, name, quantity in lines:
+            line = self.line(category, name)
+            if line is None:
+                continue
+            if line.quantity > quantity:
+                self.set_quantity(category, name, line.quantity - quantity)
+            else:
+                self.remove(category, name)
+
+    @property
+    def subtotal(self):
+        return self._subtotal
+
+    def checkout_lines(self):
+        """The (category, name, quantity) lines MainController.checkout takes"""
+        return [(line.category, line.name, line.quantity) for line in self._lines.values()]
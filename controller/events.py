@@ -0,0 +1,59 @@
+import threading
+
+# Kinds of ChangeEvent published by MainController after a change succeeds
+PRODUCT_ADDED = "product_added"
+PRODUCT_UPDATED = "product_updated"
+PRODUCT_DELETED = "product_deleted"
+STOCK_CHANGED = "stock_changed"
+CASHIER_ADDED = "cashier_added"
+CASHIER_REMOVED = "cashier_removed"
+
+
+class ChangeEvent:
+    """
+    One change: kind plus what changed. Product events carry category and
+    name, and, except for deletes, product (the product after the change,
+    a (name, price, quantity) record with a code attribute where known).
+    Cashier events carry username.
+    """
+
+    __slots__ = ("kind", "category", "name", "product", "username")
+
+    def __init__(self, kind, category=None, name=None, product=None, username=None):
+        self.kind = kind
+        self.category = category
+        self.name = name
+        self.product = product
+        self.username = username
+
+    def __repr__(self):
+        fields = ", ".join(f"{slot}={getattr(self, slot)!r}" for slot in self.__slots__[1:]
+                           if getattr(self, slot) is not None)
+        return f"ChangeEvent({self.kind!r}, {fields})"
+
+
+class EventBus:
+    """
+    Synchronous publish/subscribe. Handlers run on the publishing thread,
+    in subscription order; a view wanting them on the Tk thread subscribes
+    through AsyncController.listen.
+    """
+
+    def __init__(self):
+        self._handlers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler):
+        """Call handler(event) for every event from now on; returns an unsubscribe function"""
+        with self._lock:
+            self._handlers = self._handlers + [handler]
+        return lambda: self.unsubscribe(handler)
+
+    def unsubscribe(self, handler):
+        with self._lock:
+            self._handlers = [h for h in self._handlers if h is not handler]
+
+    def publish(self, event):
+        # The list is replaced, never changed, so no lock is needed to read it
+        for handler in self._handlers:
+            handler(event)
@@ -0,0 +1,333 @@
+"""
+Headless JSON-over-HTTP service exposing MainController, so several tills
+(lanes) can share one process that owns the catalog, users and bills.
+
+    python -m controller.http_service [--host 127.0.0.1] [--port 8765]
+
+Every call is POST /api/<method> with a JSON body {"args": [...]} and
+answers {"result": ...}, or {"error": "..."} with status 400 for invalid
+input (ValueError), 401/403 for missing or insufficient login, 404 for an
+unknown method. price_cart takes (category, name, quantity) lines and
+prices them at the server's catalog prices. validate_login answers a session token as well; the other
+methods need it in an "Authorization: Bearer <token>" header. Sessions
+expire after SESSION_TTL seconds without a call (401 "Session expired").
+A call sent with an "Idempotency-Key" header runs once: a repeat with the
+same key from the same user gets the first answer, so a lane can retry a
+checkout whose answer was lost.
+
+Connections are HTTP/1.1 keep-alive and may pipeline requests: requests
+are read while earlier ones are still being answered, and answers are
+written back in request order. Controller calls run one at a time on a
+worker thread, so file writes never block the event loop and the models
+see a single caller. The storage backend comes from the environment as
+for the views (model/storage.py); with many lanes use SMART_MART_WAL=1 or
+the sqlite backend, since by default every checkout rewrites products.txt.
+"""
+import sys
+import json
+import time
+import asyncio
+import inspect
+import secrets
+import argparse
+from collections import OrderedDict
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from controller.main_controller import MainController
+from model.product import Product
+from model.promotions import Pricing
+
+MAX_BODY = 1 << 20
+MAX_HEADERS = 100
+PIPELINE_DEPTH = 32
+# Answers to calls sent with an Idempotency-Key kept for repeats
+REPLAYS = 1024
+
+# Methods callable over HTTP and the roles allowed to call them
+CASHIER = ("cashier", "admin")
+ADMIN = ("admin",)
+METHODS = {
+    "get_products_by_category": CASHIER,
+    "search_products": CASHIER,
+    "get_product": CASHIER,
+    "get_product_by_code": CASHIER,
+    "get_product_price": CASHIER,
+    "get_all_products": CASHIER,
+    "get_products_page": CASHIER,
+    "query_products": CASHIER,
+    "get_promotions": CASHIER,
+    "price_cart": CASHIER,
+    "price_items": CASHIER,
+    "checkout": CASHIER,
+    "add_product": ADMIN,
+    "update_product": ADMIN,
+    "delete_product": ADMIN,
+    "add_cashier": ADMIN,
+    "update_cashier": ADMIN,
+    "delete_cashier": ADMIN,
+    "get_all_cashiers": ADMIN,
+    "add_promotion": ADMIN,
+    "delete_promotion": ADMIN,
+    "get_daily_summary": ADMIN,
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def encode(obj):
+    """json.dumps default= hook for controller results"""
+    if isinstance(obj, Product):
+        return [obj.name, obj.price, obj.quantity, obj.code] if obj.code else [obj.name, obj.price, obj.quantity]
+    if isinstance(obj, Pricing):
+        return {
+            "lines": obj.lines,
+            "basket_rule": obj.basket_rule,
+            "subtotal": obj.subtotal,
+            "line_discount": obj.line_discount,
+            "basket_discount": obj.basket_discount,
+        }
+    if hasattr(obj, "__iter__"):
+        return list(obj)  # ProductsView and other sequences
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ControllerService:
+    """Serves one MainController over HTTP"""
+
+    # Seconds a session stays valid after its last call
+    SESSION_TTL = 8 * 3600
+
+    def __init__(self, controller=None):
+        self.controller = controller or MainController()
+        self.sessions = {}  # token -> (username, role, expiry as time.monotonic())
+        self._replies = OrderedDict()  # (username, idempotency key) -> answer future
+        self._worker = ThreadPoolExecutor(1, thread_name_prefix="controller")
+        self.requests = 0
+        self._connections = set()  # StreamWriters of open connections
+
+    # -- controller calls, run on the worker thread ------------------------
+
+    def _call(self, method, args, session):
+        # Wrong arguments are the caller's fault (400); a TypeError raised
+        # inside the controller is a bug and goes out as a 500
+        target = getattr(self.controller, "price_cart" if method == "price_items" else method)
+        try:
+            inspect.signature(target).bind(*args)
+        except TypeError as e:
+            raise ValueError(f"Bad arguments for '{method}': {e}")
+
+        if method == "validate_login":
+            role = self.controller.validate_login(*args)
+            if role is None:
+                return {"result": None}
+            now = time.monotonic()
+            for token, (_, _, expiry) in list(self.sessions.items()):
+                if expiry <= now:
+                    self.sessions.pop(token, None)
+            token = secrets.token_urlsafe(24)
+            self.sessions[token] = (args[0], role, now + self.SESSION_TTL)
+            return {"result": role, "token": token}
+
+        if method == "price_cart":
+            lines, payment_method = args[0], args[1] if len(args) > 1 else None
+            return {"result": self._price(lines, payment_method)}
+        if method == "price_items":
+            # Loose (name, price, quantity) items, only basket deals apply
+            items, payment_method = args[0], args[1] if len(args) > 1 else None
+            return {"result": self.controller.price_cart(items, payment_method)}
+        if method == "checkout":
+            # The cashier is whoever is logged in, not what the client says
+            lines, payment_method = args[0], args[1] if len(args) > 1 else "Cash"
+            return {"result": self.controller.checkout(lines, payment_method, session[0])}
+        if method == "get_daily_summary":
+            args = [date.fromisoformat(day) if day else None for day in args]
+        return {"result": getattr(self.controller, method)(*args)}
+
+    def _price(self, lines, payment_method):
+        """Price (category, name, quantity) lines at the catalog's prices"""
+        cart = self.controller.new_cart(payment_method or "Cash")
+        for category, name, quantity in lines:
+            product = self.controller.get_product(category, name)
+            if product is None:
+                raise ValueError(f"Product '{name}' not found in category '{category}'")
+            cart.add(category, product[0], product[1], quantity)
+        return self.controller.price_cart(cart)
+
+    # -- HTTP ---------------------------------------------------------------
+
+    async def handle(self, method, path, headers, body):
+        """Return (status, payload) for one request"""
+        if method != "POST" or not path.startswith("/api/"):
+            raise HttpError(HTTPStatus.NOT_FOUND, "Not found")
+        name = path[len("/api/"):]
+        if name != "validate_login" and name not in METHODS:
+            raise HttpError(HTTPStatus.NOT_FOUND, f"Unknown method '{name}'")
+
+        session = None
+        if name != "validate_login":
+            auth = headers.get("authorization", "")
+            token = auth[len("Bearer "):] if auth.startswith("Bearer ") else None
+            session = self.sessions.get(token)
+            if session is None:
+                raise HttpError(HTTPStatus.UNAUTHORIZED, "Login required")
+            now = time.monotonic()
+            if session[2] <= now:
+                self.sessions.pop(token, None)
+                raise HttpError(HTTPStatus.UNAUTHORIZED, "Session expired")
+            session = self.sessions[token] = (session[0], session[1], now + self.SESSION_TTL)
+            if session[1] not in METHODS[name]:
+                raise HttpError(HTTPStatus.FORBIDDEN, f"'{name}' needs an admin login")
+
+        try:
+            args = json.loads(body or b"{}").get("args", [])
+        except (json.JSONDecodeError, AttributeError):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        if not isinstance(args, list):
+            raise HttpError(HTTPStatus.BAD_REQUEST, "args must be a list")
+
+        # Submitted right away, so pipelined calls reach the worker in order
+        loop = asyncio.get_running_loop()
+        key = headers.get("idempotency-key")
+        if key:
+            key = (session and session[0], key)
+            call = self._replies.get(key)
+            if call is None:
+                # A repeat that arrives while the first is still running waits for it
+                call = self._replies[key] = loop.run_in_executor(self._worker, self._call, name, args, session)
+                while len(self._replies) > REPLAYS:
+                    self._replies.popitem(last=False)
+        else:
+            call = loop.run_in_executor(self._worker, self._call, name, args, session)
+        try:
+            return HTTPStatus.OK, await asyncio.shield(call)
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+
+    async def _respond(self, request):
+        method, path, headers, body = request
+        try:
+            status, payload = await self.handle(method, path, headers, body)
+        except HttpError as e:
+            status, payload = e.status, {"error": str(e)}
+        except Exception as e:
+            status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+        self.requests += 1
+        return status, json.dumps(payload, default=encode).encode()
+
+    @staticmethod
+    async def _read_request(reader):
+        """Parse one request, None at end of stream"""
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, path, version = line.decode("latin-1").split()
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large")
+        body = await reader.readexactly(length) if length else b""
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        return (method, path.split("?", 1)[0], headers, body), keep_alive
+
+    async def serve_connection(self, reader, writer):
+        # Requests are answered concurrently but written back in order
+        answers = asyncio.Queue(PIPELINE_DEPTH)
+
+        async def write_answers():
+            while True:
+                item = await answers.get()
+                if item is None:
+                    break
+                answer, keep_alive = item
+                status, data = await answer
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+
+        writer_task = asyncio.create_task(write_answers())
+        self._connections.add(writer)
+        try:
+            while not writer_task.done():
+                try:
+                    parsed = await self._read_request(reader)
+                except HttpError as e:
+                    await answers.put((self._error(e), False))
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+                    break
+                if parsed is None:
+                    break
+                request, keep_alive = parsed
+                await answers.put((asyncio.ensure_future(self._respond(request)), keep_alive))
+                if not keep_alive:
+                    break
+            await answers.put(None)
+            await writer_task
+        except (asyncio.CancelledError, ConnectionError):
+            # Server shutting down or the client went away
+            writer_task.cancel()
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _error(error):
+        return error.status, json.dumps({"error": str(error)}).encode()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.serve_connection, host, port)
+
+    async def shutdown(self, server):
+        """Stop listening and end the open keep-alive connections"""
+        server.close()
+        for writer in list(self._connections):
+            writer.close()
+        while self._connections:
+            await asyncio.sleep(0.01)
+
+    def close(self):
+        self._worker.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve MainController over HTTP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    options = parser.parse_args(argv)
+
+    async def run():
+        service = ControllerService()
+        server = await service.start(options.host, options.port)
+        address = server.sockets[0].getsockname()
+        print(f"Serving on http://{address[0]}:{address[1]}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,76 +1,291 @@
-from model.product_model import ProductModel
-from model.bill_model import BillModel
-from model.user_model import UserModel
+import logging
+from model.storage import open_backend
+from model.product import Product
+from model.promotions import PromotionEngine
+from controller.cart import Cart, check_quantity
+from controller import events
+from controller.events import ChangeEvent, EventBus
+
+logger = logging.getLogger(__name__)
 
 class MainController:
-    def __init__(self):
+    # Discount rate applied to the subtotal per payment method, priced as
+    # basket promotions alongside the stored ones (see model/promotions.py)
+    PAYMENT_DISCOUNTS = {"Card": 0.10}
+
+    def __init__(self, backend=None, db_path=None):
+        # Storage backend: "json" (text files) or "sqlite", see model/storage.py
+        self.backend = open_backend(backend, db_path)
+        self.products = self.backend.products
+        self.users = self.backend.users
+        self.bills = self.backend.bills
+        self.promotions = self.backend.promotions
+        self._engine = None
+        self._engine_version = None
+        # Change events for views to patch their lists with (controller/events.py)
+        self.events = EventBus()
+
         # Ensure admin account exists
-        UserModel.create_initial_admin()
+        self.users.create_initial_admin()
 
-    def save_bill(self, total):
-        return BillModel.save_bill(total)
+    def save_bill(self, total, lines=None, payment_method=None, discount=0.0, cashier=None):
+        return self.bills.save_bill(total, lines, payment_method, discount, cashier)
 
-    def add_product(self, category, name, price, quantity):
-        return ProductModel.add_product(category, name, price, quantity)
+    def get_daily_summary(self, start=None, end=None):
+        """Per-day sales totals with category and cashier breakdowns"""
+        return self.bills.get_daily_summary(start, end)
 
-    def update_product(self, category, name, new_price, new_quantity):
-        return ProductModel.update_product(category, name, new_price, new_quantity)
+    def add_product(self, category, name, price, quantity, code=None):
+        result = self.products.add_product(category, name, price, quantity, code)
+        self._product_changed(events.PRODUCT_ADDED, category, name)
+        return result
+
+    def update_product(self, category, name, new_price, new_quantity, new_code=None):
+        result = self.products.update_product(category, name, new_price, new_quantity, new_code)
+        self._product_changed(events.PRODUCT_UPDATED, category, name)
+        return result
+
+    def _product_changed(self, kind, category, name):
+        # Publish a snapshot, the stored record changes with later edits
+        product = self.products.get_product(category, name)
+        if product is not None:
+            snapshot = Product(*product, code=getattr(product, "code", None))
+            self.events.publish(ChangeEvent(kind, category, snapshot.name, snapshot))
 
     def get_all_products(self):
-        return ProductModel.get_all_products()
+        return self.products.get_all_products()
 
     def delete_product(self, category, name):
-        return ProductModel.delete_product(category, name)
+        result = self.products.delete_product(category, name)
+        self.events.publish(ChangeEvent(events.PRODUCT_DELETED, category, name))
+        return result
 
     def get_product_price(self, name):
-        return ProductModel.get_price(name)
+        return self.products.get_price(name)
+
+    def new_cart(self, payment_method="Cash"):
+        """Return an empty Cart; discounts come from price_cart"""
+        return Cart(payment_method=payment_method)
 
-    def add_to_cart(self, category, name, quantity=1):
+    def add_to_cart(self, category, name, quantity=1, cart=None):
         """
         Add product with quantity to cart.
+        With a Cart, the line is added (merged with the product's line if
+        present) and stock is checked for the merged quantity.
         Returns tuple of (name, price, quantity)
         """
-        product = ProductModel.get_product(category, name)
+        product = self.products.get_product(category, name)
         if product is None:
             raise ValueError(f"Product '{name}' not found in category '{category}'")
         
-        product_name, price, available_qty = product
-        if quantity > available_qty:
+        if cart is not None:
+            self.put_in_cart(cart, category, product, quantity)
+        else:
+            self._check_stock(None, category, product[0], quantity, product[2])
+
+        return (name, product[1], quantity)
+
+    def put_in_cart(self, cart, category, product, quantity=1):
+        """
+        Add an already fetched (name, price, quantity) product to a Cart,
+        checking stock for the merged line. Does no I/O, so the UI thread
+        can call it with a product looked up in the background.
+        """
+        name, price, available_qty = product
+        self._check_stock(cart, category, name, quantity, available_qty)
+        return cart.add(category, name, price, quantity)
+
+    def add_to_cart_by_code(self, code, quantity=1, cart=None):
+        """
+        Add the product with this barcode/SKU to the cart, e.g. from a scanner.
+        Returns tuple of (category, (name, price, quantity))
+        """
+        found = self.products.get_product_by_code(code)
+        if found is None:
+            raise ValueError(f"No product with code '{code}'")
+
+        category, (name, price, available_qty) = found
+        if cart is not None:
+            self.put_in_cart(cart, category, found[1], quantity)
+        else:
+            self._check_stock(None, category, name, quantity, available_qty)
+
+        return category, (name, price, quantity)
+
+    def set_cart_quantity(self, cart, category, name, quantity):
+        """Change the quantity of a cart line (0 removes it), checking stock"""
+        if check_quantity(quantity) > 0:
+            product = self.products.get_product(category, name)
+            if product is None:
+                raise ValueError(f"Product '{name}' not found in category '{category}'")
+            if quantity > product[2]:
+                raise ValueError(f"Only {product[2]} items available for '{name}'")
+        return cart.set_quantity(category, name, quantity)
+
+    @staticmethod
+    def _check_stock(cart, category, name, quantity, available_qty):
+        check_quantity(quantity)
+        in_cart = cart.quantity_of(category, name) if cart is not None else 0
+        if quantity + in_cart > available_qty:
             raise ValueError(f"Only {available_qty} items available for '{name}'")
 
-        return (name, price, quantity)
+    def get_promotions(self):
+        return self.promotions.get_rules()
 
-    def calculate_total(self, cart):
-        return sum(price * qty for _, price, qty in cart)
+    def add_promotion(self, rule):
+        return self.promotions.add_rule(rule)
+
+    def delete_promotion(self, rule_id):
+        return self.promotions.delete_rule(rule_id)
+
+    def promotion_engine(self):
+        """The PromotionEngine for the current rules, rebuilt only when they change"""
+        version = self.promotions.version()
+        if self._engine is None or version != self._engine_version:
+            rules = [
+                {"type": "percent", "scope": "basket", "value": rate * 100,
+                 "payment_method": method, "name": f"{method} {rate:.0%}"}
+                for method, rate in self.PAYMENT_DISCOUNTS.items()
+            ]
+            self._engine = PromotionEngine(rules + self.promotions.get_rules())
+            self._engine_version = version
+        return self._engine
+
+    def price_cart(self, cart, payment_method=None, when=None):
+        """
+        Apply the promotions to a Cart, or to a list of (name, price, quantity)
+        items (which only basket deals can apply to). payment_method defaults
+        to the Cart's. Returns a model.promotions.Pricing.
+        """
+        if isinstance(cart, Cart):
+            lines = [(line.category, line.name, line.price, line.quantity) for line in cart]
+            payment_method = payment_method or cart.payment_method
+        else:
+            lines = [(None, name, price, qty) for name, price, qty in cart]
+        return self.promotion_engine().price(lines, payment_method, when)
+
+    def calculate_total(self, cart, payment_method=None, when=None):
+        return self.price_cart(cart, payment_method, when).total
+
+    def checkout(self, cart, payment_method=None, cashier=None):
+        """
+        Sell every line of the cart and record the bill in one go.
+        cart is a Cart or a list of (category, name, quantity). payment_method
+        defaults to the Cart's, as in price_cart, or "Cash". Stock is validated and
+        decremented for all lines in one catalog write; if anything fails,
+        no stock is taken and no bill is saved.
+        Returns a dict with bill_number, lines, subtotal, discount and total.
+        """
+        if isinstance(cart, Cart):
+            lines = cart.checkout_lines()
+            payment_method = payment_method or cart.payment_method
+        else:
+            lines = [(category, name, check_quantity(qty)) for category, name, qty in cart]
+        payment_method = payment_method or "Cash"
+        if not lines:
+            raise ValueError("Cart is empty")
+
+        results = self.products.reduce_stock_batch(lines)
+        pricing = self.promotion_engine().price(
+            [(line["category"], line["name"], line["price"], line["quantity"]) for line in results],
+            payment_method)
+        for line, priced in zip(results, pricing.lines):
+            line["line_total"] = line["price"] * line["quantity"]
+            line["discount"] = priced[4]
+
+        subtotal = pricing.subtotal
+        discount = pricing.discount
+        # Promotions may give the whole basket away; keep float residue from going negative
+        total = max(pricing.total, 0.0)
+
+        try:
+            bill_number = self.bills.save_bill(total, results, payment_method, discount, cashier)
+        except Exception:
+            try:
+                self.products.restore_stock_batch(lines)
+            except Exception:
+                # The save error is the one to report, this one goes to the log
+                logger.exception("Could not restore stock after a failed checkout: %r", lines)
+            raise
+
+        for line in results:
+            self.events.publish(ChangeEvent(
+                events.STOCK_CHANGED, line["category"], line["name"],
+                Product(line["name"], line["price"], line["remaining"], line["code"])))
+
+        return {
+            "bill_number": bill_number,
+            "lines": results,
+            "subtotal": subtotal,
+            "discount": discount,
+            "total": total,
+        }
 
     def reduce_stock(self, category, name, quantity):
         """
         Reduce stock quantity of a product after purchase
         """
-        return ProductModel.reduce_stock(category, name, quantity)
+        result = self.products.reduce_stock(category, name, quantity)
+        self._product_changed(events.STOCK_CHANGED, category, name)
+        return result
 
     def add_cashier(self, username, password):
-        return UserModel.add_user(username, password)
+        result = self.users.add_user(username, password)
+        self.events.publish(ChangeEvent(events.CASHIER_ADDED, username=username))
+        return result
 
     def update_cashier(self, username, password):
-        return UserModel.update_user(username, password)
+        return self.users.update_user(username, password)
 
     def delete_cashier(self, username):
-        return UserModel.delete_user(username)
+        result = self.users.delete_user(username)
+        self.events.publish(ChangeEvent(events.CASHIER_REMOVED, username=username))
+        return result
 
     def get_all_cashiers(self):
-        return UserModel.get_all_users()
+        return self.users.get_all_users()
     def get_products_by_category(self, category):
         """
         Return list of products in category as tuples with (name, price, quantity)
         """
-        return ProductModel.get_products_by_category(category)
+        return self.products.get_products_by_category(category)
+
+    def search_products(self, query, limit=10):
+        """
+        Return up to limit (category, product) pairs whose name matches query,
+        for type-ahead search
+        """
+        return self.products.search(query, limit)
+
+    def get_products_page(self, offset=0, limit=50, sort="category"):
+        """
+        Return (total, [(category, product)]) for one page of the catalog,
+        sort being model.product.SORT_KEYS names ("-price" for descending,
+        "category,-stock" for several)
+        """
+        return self.products.get_products_page(offset, limit, sort)
+
+    def query_products(self, category=None, min_price=None, max_price=None, min_stock=None,
+                       max_stock=None, name_prefix=None, sort="category", offset=0, limit=50):
+        """
+        Return (number of matches, [(category, product)]) for one page of the
+        products in category, within the inclusive price and stock ranges and
+        whose name starts with name_prefix; filters left None are not applied
+        """
+        return self.products.query_products(category, min_price, max_price, min_stock,
+                                            max_stock, name_prefix, sort, offset, limit)
 
     def get_product(self, category, name):
         """
         Return a product info tuple (name, price, quantity) or None
         """
-        return ProductModel.get_product(category, name)
+        return self.products.get_product(category, name)
+
+    def get_product_by_code(self, code):
+        """
+        Return (category, (name, price, quantity)) for a barcode/SKU, or None
+        """
+        return self.products.get_product_by_code(code)
 
     def validate_login(self, username, password):
         """
@@ -82,12 +297,12 @@ class MainController:
             
         # First check if it's admin
         if username.lower() == "admin":
-            if UserModel.validate_user(username, password):
+            if self.users.validate_user(username, password):
                 return "admin"
             return None
             
         # Then check if it's a valid cashier
-        if UserModel.validate_user(username, password):
+        if self.users.validate_user(username, password):
             return "cashier"
             
         return None
@@ -0,0 +1,258 @@
+import os
+import json
+import uuid
+import threading
+import http.client
+from controller.cart import Cart
+from controller import events
+from controller.events import ChangeEvent, EventBus
+from controller.main_controller import MainController
+from model.product import Product
+from model.promotions import Pricing
+
+# Address of a controller.http_service server, e.g. "127.0.0.1:8765". When
+# set, the views talk to that server instead of the local data files.
+SERVER_ENV = "SMART_MART_SERVER"
+
+# Calls that change nothing, safe to send again when the answer was lost
+READS = {
+    "validate_login", "get_products_by_category", "search_products", "get_product",
+    "get_product_by_code", "get_product_price", "get_all_products", "get_products_page",
+    "query_products", "get_promotions", "price_cart", "price_items", "get_all_cashiers",
+    "get_daily_summary",
+}
+
+
+def open_controller():
+    """A RemoteController if SMART_MART_SERVER is set, else a MainController"""
+    address = os.environ.get(SERVER_ENV)
+    return RemoteController(address) if address else MainController()
+
+
+class RemoteController:
+    """
+    Same methods as MainController, run by a controller.http_service server.
+    Carts stay local; they are priced and checked out by the server at its
+    catalog prices. validate_login opens the session the other calls use,
+    and checkout records the logged in user as the cashier.
+
+    Each thread gets its own keep-alive connection, so it can be used from
+    AsyncController's pool. events only carries the changes made through
+    this controller, not those of other lanes.
+    """
+
+    PAYMENT_DISCOUNTS = MainController.PAYMENT_DISCOUNTS
+    TIMEOUT = 30
+
+    def __init__(self, address):
+        host, _, port = address.rpartition(":")
+        self.host = host or "127.0.0.1"
+        self.port = int(port)
+        self.token = None
+        self._local = threading.local()
+        self.events = EventBus()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.TIMEOUT)
+        return connection
+
+    def _request(self, method, *args, idempotency_key=None):
+        body = json.dumps({"args": args})
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+        # A kept-alive connection may have been closed by the server while
+        # idle; retry once on a fresh one. Once the request is sent the
+        # server may have run it, so only repeat it if that is harmless: a
+        # read, or a call the server de-duplicates by its idempotency key.
+        for attempt in (1, 2):
+            connection = self._connection()
+            sent = False
+            try:
+                connection.request("POST", f"/api/{method}", body, headers)
+                sent = True
+                response = connection.getresponse()
+                data = json.loads(response.read() or b"{}")
+                break
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                self._local.connection = None
+                if attempt == 2 or (sent and method not in READS and not idempotency_key):
+                    raise
+        if response.status >= 500:
+            raise RuntimeError(data.get("error", f"Server error {response.status}"))
+        if response.status >= 400:
+            raise ValueError(data.get("error", f"Request failed with status {response.status}"))
+        return data
+
+    def _call(self, method, *args):
+        return self._request(method, *args)["result"]
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def validate_login(self, username, password):
+        if not username or not password:
+            return None
+        data = self._request("validate_login", username, password)
+        self.token = data.get("token")
+        return data["result"]
+
+    def get_daily_summary(self, start=None, end=None):
+        return self._call("get_daily_summary", start and start.isoformat(), end and end.isoformat())
+
+    def add_product(self, category, name, price, quantity, code=None):
+        result = self._call("add_product", category, name, price, quantity, code)
+        self._product_changed(events.PRODUCT_ADDED, category, name)
+        return result
+
+    def update_product(self, category, name, new_price, new_quantity, new_code=None):
+        result = self._call("update_product", category, name, new_price, new_quantity, new_code)
+        self._product_changed(events.PRODUCT_UPDATED, category, name)
+        return result
+
+    def _product_changed(self, kind, category, name):
+        product = self.get_product(category, name)
+        if product is not None:
+            self.events.publish(ChangeEvent(kind, category, product.name, product))
+
+    def get_all_products(self):
+        return {category: [Product(*item) for item in items]
+                for category, items in self._call("get_all_products").items()}
+
+    def delete_product(self, category, name):
+        result = self._call("delete_product", category, name)
+        self.events.publish(ChangeEvent(events.PRODUCT_DELETED, category, name))
+        return result
+
+    def get_product_price(self, name):
+        return self._call("get_product_price", name)
+
+    def new_cart(self, payment_method="Cash"):
+        return Cart(payment_method=payment_method)
+
+    def add_to_cart(self, category, name, quantity=1, cart=None):
+        product = self.get_product(category, name)
+        if product is None:
+            raise ValueError(f"Product '{name}' not found in category '{category}'")
+
+        if cart is not None:
+            self.put_in_cart(cart, category, product, quantity)
+        else:
+            self._check_stock(None, category, product[0], quantity, product[2])
+
+        return (name, product[1], quantity)
+
+    # Local cart bookkeeping, no I/O
+    put_in_cart = MainController.put_in_cart
+    _check_stock = staticmethod(MainController._check_stock)
+
+    def add_to_cart_by_code(self, code, quantity=1, cart=None):
+        found = self.get_product_by_code(code)
+        if found is None:
+            raise ValueError(f"No product with code '{code}'")
+
+        category, (name, price, available_qty) = found
+        if cart is not None:
+            self.put_in_cart(cart, category, found[1], quantity)
+        else:
+            self._check_stock(None, category, name, quantity, available_qty)
+
+        return category, (name, price, quantity)
+
+    def set_cart_quantity(self, cart, category, name, quantity):
+        if quantity > 0:
+            product = self.get_product(category, name)
+            if product is None:
+                raise ValueError(f"Product '{name}' not found in category '{category}'")
+            if quantity > product[2]:
+                raise ValueError(f"Only {product[2]} items available for '{name}'")
+        return cart.set_quantity(category, name, quantity)
+
+    def get_promotions(self):
+        return self._call("get_promotions")
+
+    def add_promotion(self, rule):
+        return self._call("add_promotion", rule)
+
+    def delete_promotion(self, rule_id):
+        return self._call("delete_promotion", rule_id)
+
+    def price_cart(self, cart, payment_method=None, when=None):
+        """
+        Price a Cart or (name, price, quantity) items on the server, always
+        at the current time. Returns a model.promotions.Pricing.
+        """
+        if isinstance(cart, Cart):
+            data = self._call("price_cart", cart.checkout_lines(), payment_method or cart.payment_method)
+        else:
+            data = self._call("price_items", [tuple(item) for item in cart], payment_method)
+        return Pricing([tuple(line) for line in data["lines"]], data["basket_rule"], data["subtotal"],
+                       data["line_discount"], data["basket_discount"])
+
+    def calculate_total(self, cart, payment_method=None, when=None):
+        return self.price_cart(cart, payment_method, when).total
+
+    def checkout(self, cart, payment_method=None, cashier=None):
+        """As MainController.checkout; the server records the logged in user as cashier"""
+        if isinstance(cart, Cart):
+            payment_method = payment_method or cart.payment_method
+        payment_method = payment_method or "Cash"
+        lines = cart.checkout_lines() if isinstance(cart, Cart) else [tuple(line) for line in cart]
+        if not lines:
+            raise ValueError("Cart is empty")
+        # The key lets the server answer a retried checkout with the first receipt
+        receipt = self._request("checkout", lines, payment_method, idempotency_key=uuid.uuid4().hex)["result"]
+        for line in receipt["lines"]:
+            self.events.publish(ChangeEvent(
+                events.STOCK_CHANGED, line["category"], line["name"],
+                Product(line["name"], line["price"], line["remaining"], line.get("code"))))
+        return receipt
+
+    def add_cashier(self, username, password):
+        result = self._call("add_cashier", username, password)
+        self.events.publish(ChangeEvent(events.CASHIER_ADDED, username=username))
+        return result
+
+    def update_cashier(self, username, password):
+        return self._call("update_cashier", username, password)
+
+    def delete_cashier(self, username):
+        result = self._call("delete_cashier", username)
+        self.events.publish(ChangeEvent(events.CASHIER_REMOVED, username=username))
+        return result
+
+    def get_all_cashiers(self):
+        return self._call("get_all_cashiers")
+
+    def get_products_by_category(self, category):
+        return [Product(*item) for item in self._call("get_products_by_category", category)]
+
+    def search_products(self, query, limit=10):
+        return [(category, Product(*item)) for category, item in self._call("search_products", query, limit)]
+
+    def get_products_page(self, offset=0, limit=50, sort="category"):
+        total, items = self._call("get_products_page", offset, limit, sort)
+        return total, [(category, Product(*item)) for category, item in items]
+
+    def query_products(self, category=None, min_price=None, max_price=None, min_stock=None,
+                       max_stock=None, name_prefix=None, sort="category", offset=0, limit=50):
+        total, items = self._call("query_products", category, min_price, max_price, min_stock,
+                                  max_stock, name_prefix, sort, offset, limit)
+        return total, [(category, Product(*item)) for category, item in items]
+
+    def get_product(self, category, name):
+        product = self._call("get_product", category, name)
+        return Product(*product) if product is not None else None
+
+    def get_product_by_code(self, code):
+        found = self._call("get_product_by_code", code)
+        return (found[0], Product(*found[1])) if found is not None else None
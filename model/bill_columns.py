@@ -0,0 +1,175 @@
+import os
+import json
+import struct
+from array import array
+from datetime import datetime
+from model import durable
+
+# Fixed-width little-endian records appended next to the bill ledger.
+# One LINE_RECORD per sold line and one HEAD_RECORD per bill; strings
+# (product, category, cashier, payment method) are stored as ids into
+# an append-only string table.
+LINE_RECORD = struct.Struct("<IIqdIIII")   # bill, product, ts, price, qty, category, cashier, payment
+HEAD_RECORD = struct.Struct("<IIqddII")    # bill, n_lines, ts, total, discount, cashier, payment
+
+LINE_FIELDS = ("bill", "product", "ts", "price", "qty", "category", "cashier", "payment")
+HEAD_FIELDS = ("bill", "n_lines", "ts", "total", "discount", "cashier", "payment")
+
+# array typecodes matching the struct fields above
+LINE_TYPECODES = ("I", "I", "q", "d", "I", "I", "I", "I")
+HEAD_TYPECODES = ("I", "I", "q", "d", "d", "I", "I")
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def local_seconds(when):
+    """Seconds since 1970-01-01 of a naive local datetime, so ts // 86400 is the local day"""
+    return int((when - EPOCH).total_seconds())
+
+
+class StringTable:
+    """Append-only table of strings, one JSON string per line, id = line number"""
+
+    _tables = {}
+
+    def __init__(self, path):
+        self.path = path
+        self.strings = []
+        self.ids = {}
+        self._size = 0
+
+    @classmethod
+    def open(cls, path):
+        """Return the shared table for path, picking up lines appended by others"""
+        key = os.path.abspath(path)
+        table = cls._tables.get(key)
+        if table is None:
+            table = cls._tables[key] = cls(path)
+        table._refresh()
+        return table
+
+    def _refresh(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size < self._size:
+            # File was replaced, start over
+            self.strings, self.ids, self._size = [], {}, 0
+        if size == self._size:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._size)
+            data = f.read(size - self._size)
+        # Only consume complete lines
+        end = data.rfind(b"\n") + 1
+        for raw in data[:end].splitlines():
+            value = json.loads(raw)
+            self.ids.setdefault(value, len(self.strings))
+            self.strings.append(value)
+        self._size += end
+
+    def intern(self, value):
+        """Return the id of value, appending it to the table if it is new"""
+        value = value or ""
+        string_id = self.ids.get(value)
+        if string_id is not None:
+            return string_id
+        data = (json.dumps(value) + "\n").encode()
+        self._size = durable.append(self.path, data) + len(data)
+        string_id = self.ids[value] = len(self.strings)
+        self.strings.append(value)
+        return string_id
+
+
+class Columns:
+    """
+    Parallel arrays loaded from a fixed-width record file.
+    Each field is an array.array attribute; strings holds the string table
+    used to decode product/category/cashier/payment ids.
+    """
+
+    def __init__(self, fields, typecodes, strings):
+        self.fields = fields
+        self.strings = strings
+        for field, typecode in zip(fields, typecodes):
+            setattr(self, field, array(typecode))
+
+    def __len__(self):
+        return len(getattr(self, self.fields[0]))
+
+    @classmethod
+    def load(cls, paths, record, fields, typecodes, strings):
+        """Load one record file, or several (a list of paths) one after the other"""
+        columns = cls(fields, typecodes, strings)
+        arrays = [getattr(columns, field) for field in fields]
+        for path in [paths] if isinstance(paths, str) else paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            data = data[:len(data) - len(data) % record.size]
+            for values in record.iter_unpack(data):
+                for column, value in zip(arrays, values):
+                    column.append(value)
+        return columns
+
+    def decode(self, field, index):
+        """Return the string behind a string-id field for one row"""
+        return self.strings[getattr(self, field)[index]]
+
+
+def append_records(path, record, rows):
+    """Append packed rows to a record file, return the offset they start at"""
+    return durable.append(path, b"".join(record.pack(*row) for row in rows))
+
+
+def bill_records(path, record, number):
+    """
+    The records of one bill from a record file, found by binary search on
+    the bill number (records are appended in bill order): O(log n) reads
+    plus the bill's own records.
+    """
+    try:
+        count = os.path.getsize(path) // record.size
+    except OSError:
+        return []
+    rows = []
+    with open(path, "rb") as f:
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            f.seek(mid * record.size)
+            if record.unpack(f.read(record.size))[0] < number:
+                lo = mid + 1
+            else:
+                hi = mid
+        f.seek(lo * record.size)
+        for index in range(lo, count):
+            row = record.unpack(f.read(record.size))
+            if row[0] != number:
+                break
+            rows.append(row)
+    return rows
+
+
+def last_record(path, record):
+    """Unpack the final complete record of a file, or None if it is empty"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    size -= size % record.size
+    if size == 0:
+        return None
+    with open(path, "rb") as f:
+        f.seek(size - record.size)
+        return record.unpack(f.read(record.size))
+
+
+def truncate_records(path, record, count):
+    """Drop the last count records (and any partial record) from a file"""
+    size = os.path.getsize(path)
+    size -= size % record.size
+    with open(path, "r+b") as f:
+        f.truncate(max(0, size - count * record.size))
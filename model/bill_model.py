@@ -1,34 +1,509 @@
 import os
 import json
+import bisect
+import sys
 from datetime import datetime
+from model import bill_summary, durable
+from model.file_lock import file_lock
+from model.bill_segments import (
+    partition_key, load_manifest, archive, iter_segment, segments_between, segment_name,
+)
+from model.bill_columns import (
+    LINE_RECORD, HEAD_RECORD, LINE_FIELDS, HEAD_FIELDS, LINE_TYPECODES, HEAD_TYPECODES,
+    StringTable, Columns, local_seconds, append_records, last_record, truncate_records,
+    bill_records,
+)
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def read_ledger(path):
+    """
+    Yield bill records from a ledger file, one dict per bill.
+    Understands both the JSON Lines ledger and the legacy JSON array format.
+    A legacy file that does not parse raises ValueError.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        if _first_char(f) == "[":
+            try:
+                bills = json.load(f)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Bills file '{path}' is corrupt: {e}")
+            yield from bills
+            return
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def _first_char(f):
+    """Return the first non-whitespace character of an open text file and rewind it"""
+    char = ""
+    while True:
+        chunk = f.read(64)
+        if not chunk:
+            break
+        stripped = chunk.lstrip()
+        if stripped:
+            char = stripped[0]
+            break
+    f.seek(0)
+    return char
+
+
+def _last_line(path, chunk_size=4096):
+    """Return the last non-empty line of a file by reading backwards from the end"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+            stripped = data.rstrip(b"\r\n")
+            if b"\n" in stripped:
+                return stripped.rsplit(b"\n", 1)[1].decode()
+        return data.strip().decode()
+
 
 class BillModel:
     BILLS_FILE = "bills.txt"
+    # Every INDEX_EVERY-th bill gets a (date, byte offset) entry in the
+    # sparse date index so range reads can seek instead of scanning.
+    INDEX_EVERY = 256
+    # The active ledger holds one "month" (or "day") of bills; older ones are
+    # rotated into gzip segments under bills.txt.segments/. None disables it.
+    PARTITION = "month"
+    # Saved bills are appended to the summary's delta log; the summary file
+    # itself is rewritten at rotation or once the log reaches this size.
+    SUMMARY_LOG_BYTES = 1 << 20
 
-    @staticmethod
-    def save_bill(total):
-        """Save a bill with the given total"""
-        if total <= 0:
-            raise ValueError("Total must be positive")
+    @classmethod
+    def _index_file(cls):
+        return cls.BILLS_FILE + ".idx"
+
+    # Columnar side files holding bill lines and headers, see model/bill_columns.py
+    @classmethod
+    def _lines_file(cls):
+        return cls.BILLS_FILE + ".lines"
+
+    @classmethod
+    def _heads_file(cls):
+        return cls.BILLS_FILE + ".heads"
+
+    @classmethod
+    def _strings_file(cls):
+        return cls.BILLS_FILE + ".strings"
+
+    @classmethod
+    def _summary_file(cls):
+        return cls.BILLS_FILE + ".summary"
+
+    @classmethod
+    def _segments_dir(cls):
+        return cls.BILLS_FILE + ".segments"
 
+    @classmethod
+    def _is_legacy(cls):
+        if not os.path.exists(cls.BILLS_FILE):
+            return False
+        with open(cls.BILLS_FILE, "r") as f:
+            return _first_char(f) == "["
+
+    @classmethod
+    def _ensure_ledger(cls):
+        """Convert a legacy JSON array bills file to the one-bill-per-line ledger, under the bills lock"""
+        if cls._is_legacy():
+            with file_lock(cls.BILLS_FILE):
+                cls._convert_ledger()
+
+    @classmethod
+    def _convert_ledger(cls):
+        """
+        Rewrite a legacy JSON array bills file as the ledger; the caller
+        holds the bills lock. A file that does not parse raises ValueError
+        and is left as it is.
+        """
+        # Another process may have converted it before the lock was ours
+        if not cls._is_legacy():
+            return
+        path = cls.BILLS_FILE
+        bills = list(read_ledger(path))
+        durable.atomic_write(path, "".join(json.dumps(bill, separators=(",", ":")) + "\n" for bill in bills))
+        cls.rebuild_index()
+
+    @classmethod
+    def rebuild_index(cls):
+        """Regenerate the sparse date index from the ledger"""
+        entries = []
+        if os.path.exists(cls.BILLS_FILE):
+            with open(cls.BILLS_FILE, "rb") as f:
+                offset = 0
+                count = 0
+                for raw in f:
+                    if raw.strip():
+                        if count % cls.INDEX_EVERY == 0:
+                            try:
+                                entries.append((json.loads(raw)["date"], offset))
+                            except (ValueError, KeyError):
+                                pass
+                        count += 1
+                    offset += len(raw)
+        durable.atomic_write(cls._index_file(), "".join(f"{date}\t{offset}\n" for date, offset in entries))
+
+    @classmethod
+    def _load_index(cls):
+        """Return the sparse index as parallel lists of dates and offsets"""
+        dates, offsets = [], []
         try:
-            with open(BillModel.BILLS_FILE, 'r') as f:
-                bills = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            bills = []
-
-        bill_number = str(len(bills) + 1).zfill(4)  # Format as 0001, 0002, etc.
-        bill = {
-            'bill_number': bill_number,
-            'total': total,
-            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            with open(cls._index_file(), "r") as f:
+                for line in f:
+                    date, _, offset = line.rstrip("\n").partition("\t")
+                    if offset:
+                        dates.append(date)
+                        offsets.append(int(offset))
+        except (OSError, ValueError):
+            return [], []
+        return dates, offsets
+
+    @classmethod
+    def _seek_offset(cls, f, start):
+        """Byte offset of an indexed bill dated before start, 0 if unknown"""
+        dates, offsets = cls._load_index()
+        pos = bisect.bisect_left(dates, start) - 1
+        if pos < 0:
+            return 0
+        # Make sure the entry still points at the record it describes
+        f.seek(offsets[pos])
+        try:
+            if json.loads(f.readline())["date"] == dates[pos]:
+                return offsets[pos]
+        except (ValueError, KeyError):
+            pass
+        return 0
+
+    @classmethod
+    def _last_bill_number(cls):
+        """Read the bill number from the trailing ledger record, 0 if there is none"""
+        line = _last_line(cls.BILLS_FILE) if os.path.exists(cls.BILLS_FILE) else ""
+        if not line:
+            # Active segment is empty, continue from the last closed one
+            footers = load_manifest(cls._segments_dir())
+            return footers[-1]["last_bill"] if footers else 0
+        try:
+            return int(json.loads(line)["bill_number"])
+        except (ValueError, KeyError, TypeError):
+            # Damaged tail, fall back to the highest number in the ledger
+            return max((int(b["bill_number"]) for b in read_ledger(cls.BILLS_FILE)), default=0)
+
+    @classmethod
+    def _repair_tail(cls):
+        """Terminate a half-written last record so the next one starts on its own line"""
+        try:
+            with open(cls.BILLS_FILE, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                last = f.read(1)
+        except OSError:
+            return  # missing or empty file
+        if last != b"\n":
+            durable.append(cls.BILLS_FILE, b"\n")
+
+    @classmethod
+    def _archived_through(cls):
+        """Highest bill number already moved to a closed segment"""
+        footers = load_manifest(cls._segments_dir())
+        return footers[-1]["last_bill"] if footers else 0
+
+    @classmethod
+    def _rotate(cls, date):
+        """Close the active segment if date falls in a later partition than its bills"""
+        if not cls.PARTITION or not os.path.exists(cls.BILLS_FILE):
+            return
+        with open(cls.BILLS_FILE, "rb") as f:
+            first = f.readline()
+        try:
+            first_date = json.loads(first)["date"]
+        except (ValueError, KeyError):
+            return
+        if partition_key(first_date, cls.PARTITION) == partition_key(date, cls.PARTITION):
+            return
+
+        # Bills at or below the archived number are leftovers of an
+        # interrupted rotation and are already in a segment.
+        archived = cls._archived_through()
+        bills = [bill for bill in read_ledger(cls.BILLS_FILE) if int(bill["bill_number"]) > archived]
+        if bills:
+            key = partition_key(bills[0]["date"], cls.PARTITION)
+            columns = cls._archive_columns(segment_name(key, int(bills[0]["bill_number"])))
+            archive(cls._segments_dir(), key, bills, columns)
+
+        durable.atomic_write(cls.BILLS_FILE, "")
+        if os.path.exists(cls._index_file()):
+            os.remove(cls._index_file())
+        cls._fold_summary()
+
+    @classmethod
+    def _archive_columns(cls, stem):
+        """
+        Move the active .lines/.heads files next to the segment being closed,
+        as stem.lines/stem.heads. Returns the names for the segment footer.
+        """
+        directory = cls._segments_dir()
+        os.makedirs(directory, exist_ok=True)
+        columns = {}
+        for kind, path in (("lines", cls._lines_file()), ("heads", cls._heads_file())):
+            name = f"{stem}.{kind}"
+            target = os.path.join(directory, name)
+            if os.path.exists(path):
+                durable.replace(path, target)
+            # Already moved by an interrupted rotation
+            if os.path.exists(target):
+                columns[kind] = name
+        return columns
+
+    @classmethod
+    def _column_files(cls, kind):
+        """The closed segments' kind ("lines" or "heads") files, oldest first, then the active one"""
+        directory = cls._segments_dir()
+        paths = [os.path.join(directory, footer[kind]) for footer in load_manifest(directory) if kind in footer]
+        paths.append(cls._lines_file() if kind == "lines" else cls._heads_file())
+        return paths
+
+    @classmethod
+    def get_segments(cls):
+        """Footers of the closed segments: file, first/last bill and date, count, total"""
+        return load_manifest(cls._segments_dir())
+
+    @classmethod
+    def save_bill(cls, total, lines=None, payment_method=None, discount=0.0, cashier=None):
+        """
+        Save a bill with the given total.
+        lines is a list of dicts with name, category, price and quantity
+        (the per-line results of a checkout). They go to the columnar
+        .lines/.heads files; the ledger record keeps the bill header.
+        """
+        # Zero only for a sale promotions fully discounted
+        if total < 0 or (total == 0 and not discount):
+            raise ValueError("Total must be positive")
+
+        # Numbering and appending must not interleave with another lane
+        with file_lock(cls.BILLS_FILE):
+            lines = lines or []
+            now = datetime.now()
+            cls._convert_ledger()
+            number = cls._last_bill_number() + 1
+            # Before rotating, so no orphan moves into the closed segment
+            cls._drop_orphan_columns(number)
+            cls._rotate(now.strftime(DATE_FORMAT))
+            bill_number = str(number).zfill(4)  # Format as 0001, 0002, etc.
+            bill = {
+                'bill_number': bill_number,
+                'total': total,
+                'date': now.strftime(DATE_FORMAT),
+                'payment_method': payment_method,
+                'discount': discount,
+                'cashier': cashier,
+                'line_count': len(lines)
+            }
+
+            # Columns first, the ledger record is what commits the bill
+            strings = StringTable.open(cls._strings_file())
+            ts = local_seconds(now)
+            cashier_id = strings.intern(cashier)
+            payment_id = strings.intern(payment_method)
+            if lines:
+                append_records(cls._lines_file(), LINE_RECORD, [
+                    (number, strings.intern(line["name"]), ts, line["price"], line["quantity"],
+                     strings.intern(line["category"]), cashier_id, payment_id)
+                    for line in lines
+                ])
+            append_records(cls._heads_file(), HEAD_RECORD,
+                           [(number, len(lines), ts, total, discount, cashier_id, payment_id)])
+
+            cls._repair_tail()
+            offset = durable.append(cls.BILLS_FILE, (json.dumps(bill, separators=(",", ":")) + "\n").encode())
+
+            if (number - 1) % cls.INDEX_EVERY == 0:
+                with open(cls._index_file(), 'a') as f:
+                    f.write(f"{bill['date']}\t{offset}\n")
+
+            cls._update_summary(bill, lines)
+            return bill_number
+
+    @classmethod
+    def _update_summary(cls, bill, lines):
+        """Log a just-saved bill for the daily aggregates, folding the log in once it is long"""
+        bill_summary.append(cls._summary_file(), bill, [
+            (line["category"], line["price"], line["quantity"]) for line in lines
+        ])
+        if bill_summary.log_size(cls._summary_file()) >= cls.SUMMARY_LOG_BYTES \
+                or not os.path.exists(cls._summary_file()):
+            cls._fold_summary()
+
+    @classmethod
+    def _fold_summary(cls):
+        """
+        Rewrite the summary file with its delta log applied, or recomputed if
+        it is missing or out of step with the ledger. Caller holds the bills lock.
+        """
+        summary = bill_summary.load(cls._summary_file())
+        if summary is None or summary["last_bill"] != cls._last_bill_number():
+            # Missing or behind (e.g. a crash between ledger and log append)
+            summary = cls._compute_summary()
+        bill_summary.save(cls._summary_file(), summary)
+        return summary
+
+    @classmethod
+    def _compute_summary(cls):
+        """Build the daily aggregates from scratch out of the ledger and line columns"""
+        lines_by_bill = {}
+        columns = cls.load_line_columns()
+        for i, bill in enumerate(columns.bill):
+            lines_by_bill.setdefault(bill, []).append(
+                (columns.decode("category", i), columns.price[i], columns.qty[i]))
+
+        summary = bill_summary.new_summary()
+        for bill in cls.iter_bills():
+            bill_summary.add_bill(summary, bill, lines_by_bill.get(int(bill["bill_number"]), []))
+        return summary
+
+    @classmethod
+    def get_daily_summary(cls, start=None, end=None):
+        """
+        Per-day totals from the materialized aggregates, as {"YYYY-MM-DD": {...}}.
+        start/end are optional dates (inclusive).
+        """
+        summary = bill_summary.load(cls._summary_file())
+        if summary is None or summary["last_bill"] != cls._last_bill_number():
+            with file_lock(cls.BILLS_FILE):
+                summary = cls._fold_summary()
+        start_key = start.isoformat() if start else None
+        end_key = end.isoformat() if end else None
+        return {
+            day: totals for day, totals in summary["days"].items()
+            if (start_key is None or day >= start_key) and (end_key is None or day <= end_key)
         }
-        bills.append(bill)
 
-        with open(BillModel.BILLS_FILE, 'w') as f:
-            json.dump(bills, f)
+    @classmethod
+    def rebuild_summary(cls):
+        """
+        Regenerate the daily aggregates from the raw ledger and replace the
+        stored ones. Returns the list of differences found in the old file.
+        """
+        with file_lock(cls.BILLS_FILE):
+            summary = cls._compute_summary()
+            stored = bill_summary.load(cls._summary_file())
+            problems = ["summary file missing or unreadable"] if stored is None else \
+                bill_summary.differences(summary, stored)
+            bill_summary.save(cls._summary_file(), summary)
+        return problems
+
+    @classmethod
+    def _drop_orphan_columns(cls, number):
+        """Remove column records left behind by a save that never reached the ledger"""
+        for path, record in ((cls._lines_file(), LINE_RECORD), (cls._heads_file(), HEAD_RECORD)):
+            while True:
+                last = last_record(path, record)
+                if last is None or last[0] < number:
+                    break
+                truncate_records(path, record, 1)
+
+    @classmethod
+    def load_line_columns(cls):
+        """
+        Load every sold line as parallel arrays: bill, product, ts, price,
+        qty, category, cashier, payment. String fields are ids into .strings.
+        """
+        strings = StringTable.open(cls._strings_file()).strings
+        return Columns.load(cls._column_files("lines"), LINE_RECORD, LINE_FIELDS, LINE_TYPECODES, strings)
 
-        return bill_number
+    @classmethod
+    def get_bill_lines(cls, bill_number):
+        """
+        Returns the lines of one bill as (product, category, price, quantity)
+        tuples, read by binary search from the one lines file that holds it.
+        """
+        number = int(bill_number)
+        directory = cls._segments_dir()
+        # A segment's lines file never holds bills past its last one
+        footers = [footer for footer in load_manifest(directory) if "lines" in footer]
+        position = bisect.bisect_left([footer["last_bill"] for footer in footers], number)
+        path = os.path.join(directory, footers[position]["lines"]) if position < len(footers) \
+            else cls._lines_file()
+        strings = StringTable.open(cls._strings_file()).strings
+        return [
+            (strings[product], strings[category], price, qty)
+            for _, product, _, price, qty, category, _, _ in bill_records(path, LINE_RECORD, number)
+        ]
+
+    @classmethod
+    def load_head_columns(cls):
+        """Load bill headers as parallel arrays: bill, n_lines, ts, total, discount, cashier, payment"""
+        strings = StringTable.open(cls._strings_file()).strings
+        return Columns.load(cls._column_files("heads"), HEAD_RECORD, HEAD_FIELDS, HEAD_TYPECODES, strings)
+
+    @classmethod
+    def iter_bills(cls, start=None, end=None, min_total=None, max_total=None, limit=None):
+        """
+        Stream bills one dict at a time, oldest first, from the closed
+        segments overlapping the range and then the active ledger.
+        start/end are datetimes (inclusive) and min_total/max_total bound the
+        bill total. Bills are assumed to be appended in date order, which lets
+        the reader skip whole segments, seek into the active ledger via the
+        sparse index and stop after end.
+        """
+        cls._ensure_ledger()
+        if limit == 0:
+            return
+
+        start_key = start.strftime(DATE_FORMAT) if start else None
+        end_key = end.strftime(DATE_FORMAT) if end else None
+        directory = cls._segments_dir()
+        footers = load_manifest(directory)
+        archived = footers[-1]["last_bill"] if footers else 0
+
+        sources = [iter_segment(directory, footer) for footer in segments_between(footers, start_key, end_key)]
+        sources.append(cls._iter_active(start_key, archived))
+
+        count = 0
+        for source in sources:
+            for bill in source:
+                date = bill.get("date", "")
+                if start_key and date < start_key:
+                    continue
+                if end_key and date > end_key:
+                    return
+                if min_total is not None and bill["total"] < min_total:
+                    continue
+                if max_total is not None and bill["total"] > max_total:
+                    continue
+                yield bill
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+
+    @classmethod
+    def _iter_active(cls, start_key, archived):
+        """Yield bills of the active ledger, seeking towards start_key when given"""
+        if not os.path.exists(cls.BILLS_FILE):
+            return
+        with open(cls.BILLS_FILE, "rb") as f:
+            f.seek(cls._seek_offset(f, start_key) if start_key else 0)
+            for raw in f:
+                try:
+                    bill = json.loads(raw)
+                except ValueError:
+                    continue
+                if int(bill["bill_number"]) > archived:
+                    yield bill
 
     @classmethod
     def get_all_bills(cls):
@@ -36,15 +511,17 @@ class BillModel:
         Get all bills from the bills.txt file
         Returns a list of tuples: (bill_number, total)
         """
-        bills = []
-        if os.path.exists(cls.BILLS_FILE):
-            with open(cls.BILLS_FILE, "r") as f:
-                for line in f:
-                    try:
-                        bill_part, total_part = line.strip().split(":")
-                        bill_number = int(bill_part.split()[1])
-                        total = float(total_part.strip())
-                        bills.append((bill_number, total))
-                    except:
-                        continue
-        return bills
+        return [(int(bill["bill_number"]), bill["total"]) for bill in cls.iter_bills()]
+
+
+if __name__ == "__main__":
+    # Usage: python -m model.bill_model rebuild-summary [bills_file]
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild-summary":
+        print("Usage: python -m model.bill_model rebuild-summary [bills_file]")
+        sys.exit(2)
+    if len(sys.argv) > 2:
+        BillModel.BILLS_FILE = sys.argv[2]
+    mismatches = BillModel.rebuild_summary()
+    for problem in mismatches:
+        print(problem)
+    print(f"Summary rebuilt, {len(mismatches)} difference(s) found")
@@ -0,0 +1,102 @@
+import os
+import gzip
+import json
+from model import durable
+
+# Closed bill segments live in a directory next to the active ledger:
+#
+#   bills.txt                              active segment (plain JSON Lines)
+#   bills.txt.segments/2025-05-0001.jsonl.gz   closed, compressed segments
+#   bills.txt.segments/2025-05-0001.lines      its line and header columns
+#   bills.txt.segments/2025-05-0001.heads      (see model/bill_columns.py)
+#   bills.txt.segments/manifest.json       footers of every closed segment
+#
+# Each closed segment ends with a footer record {"footer": {...}} holding its
+# first/last bill number, date range, bill count and sum of totals, and the
+# names of its column files ("lines", "heads") when it has them. The
+# manifest keeps a copy of every footer so range queries can pick the
+# segments they need without opening the others.
+
+MANIFEST = "manifest.json"
+
+
+def partition_key(date, partition):
+    """Segment key of a 'YYYY-MM-DD HH:MM:SS' date: the day or the month"""
+    return date[:10] if partition == "day" else date[:7]
+
+
+def load_manifest(directory):
+    """Return the list of closed segment footers, oldest first"""
+    try:
+        with open(os.path.join(directory, MANIFEST), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def save_manifest(directory, footers):
+    durable.atomic_write(os.path.join(directory, MANIFEST), json.dumps(footers, indent=2))
+
+
+def make_footer(bills):
+    """Describe a list of bill records"""
+    return {
+        "first_bill": int(bills[0]["bill_number"]),
+        "last_bill": int(bills[-1]["bill_number"]),
+        "first_date": min(bill["date"] for bill in bills),
+        "last_date": max(bill["date"] for bill in bills),
+        "count": len(bills),
+        "total": sum(bill["total"] for bill in bills),
+    }
+
+
+def segment_name(key, first_bill):
+    """File name stem shared by a segment and its column files"""
+    return f"{key}-{str(first_bill).zfill(4)}"
+
+
+def archive(directory, key, bills, columns=None):
+    """
+    Write bills to a compressed segment ending with its footer, register it
+    in the manifest and return the footer. columns names the segment's
+    column files already moved into directory, as {"lines": ..., "heads": ...}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    footer = make_footer(bills)
+    footer["file"] = segment_name(key, footer["first_bill"]) + ".jsonl.gz"
+    footer.update(columns or {})
+
+    path = os.path.join(directory, footer["file"])
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt") as f:
+        for bill in bills:
+            f.write(json.dumps(bill, separators=(",", ":")) + "\n")
+        f.write(json.dumps({"footer": footer}, separators=(",", ":")) + "\n")
+    durable.sync(tmp_path)
+    durable.replace(tmp_path, path)
+
+    footers = [item for item in load_manifest(directory) if item["file"] != footer["file"]]
+    footers.append(footer)
+    footers.sort(key=lambda item: item["first_bill"])
+    save_manifest(directory, footers)
+    return footer
+
+
+def iter_segment(directory, footer):
+    """Yield the bill records of one closed segment"""
+    with gzip.open(os.path.join(directory, footer["file"]), "rt") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if "footer" not in record:
+                yield record
+
+
+def segments_between(footers, start=None, end=None):
+    """Footers of the segments whose date range overlaps [start, end]"""
+    return [
+        footer for footer in footers
+        if (start is None or footer["last_date"] >= start) and (end is None or footer["first_date"] <= end)
+    ]
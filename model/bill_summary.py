@@ -0,0 +1,121 @@
+import os
+import json
+from model import durable
+
+# Materialized sales aggregates kept next to the bill ledger. Everything is
+# keyed by day ("YYYY-MM-DD") so reports read O(days) instead of O(bills):
+#
+#   {"last_bill": 42,
+#    "days": {"2025-05-28": {"bills": 3, "revenue": 120.0, "discount": 2.0, "items": 9,
+#                            "categories": {"Groceries": {"revenue": 30.0, "items": 6}},
+#                            "cashiers": {"john": {"bills": 2, "revenue": 80.0}}}}}
+#
+# Saved bills are appended to a delta log next to it (<summary>.log), one
+# {"bill": {...}, "lines": [[category, price, quantity], ...]} per line, so a
+# sale costs one small append instead of rewriting the whole file. load()
+# applies the log; save() writes a summary that includes it and drops it.
+
+
+def new_summary():
+    return {"last_bill": 0, "days": {}}
+
+
+def add_bill(summary, bill, lines):
+    """Fold one bill header and its lines into the summary"""
+    day = summary["days"].setdefault(bill["date"][:10], {
+        "bills": 0, "revenue": 0.0, "discount": 0.0, "items": 0,
+        "categories": {}, "cashiers": {},
+    })
+    day["bills"] += 1
+    day["revenue"] += bill["total"]
+    day["discount"] += bill.get("discount") or 0.0
+
+    for category, price, quantity in lines:
+        totals = day["categories"].setdefault(category, {"revenue": 0.0, "items": 0})
+        totals["revenue"] += price * quantity
+        totals["items"] += quantity
+        day["items"] += quantity
+
+    cashier = day["cashiers"].setdefault(bill.get("cashier") or "", {"bills": 0, "revenue": 0.0})
+    cashier["bills"] += 1
+    cashier["revenue"] += bill["total"]
+
+    summary["last_bill"] = max(summary["last_bill"], int(bill["bill_number"]))
+
+
+def log_path(path):
+    return path + ".log"
+
+
+def log_size(path):
+    try:
+        return os.path.getsize(log_path(path))
+    except OSError:
+        return 0
+
+
+def append(path, bill, lines):
+    """Log one saved bill; load() adds it to the summary"""
+    header = {key: bill.get(key) for key in ("bill_number", "date", "total", "discount", "cashier")}
+    record = json.dumps({"bill": header, "lines": [list(line) for line in lines]}, separators=(",", ":"))
+    durable.append(log_path(path), (record + "\n").encode())
+
+
+def load(path):
+    """
+    Read a summary file and apply its delta log. None if the file is
+    missing or unreadable, or the log skips a bill.
+    """
+    try:
+        with open(path, "r") as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(summary, dict) or "days" not in summary:
+        return None
+    try:
+        f = open(log_path(path), "rb")
+    except OSError:
+        return summary
+    with f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break  # torn by a crash, that bill is not in the ledger either
+            try:
+                delta = json.loads(raw)
+            except ValueError:
+                return None
+            number = int(delta["bill"]["bill_number"])
+            if number <= summary["last_bill"]:
+                continue  # already in the file
+            if number != summary["last_bill"] + 1:
+                return None
+            add_bill(summary, delta["bill"], delta["lines"])
+    return summary
+
+
+def save(path, summary):
+    """Replace the summary file with one that includes everything logged so far"""
+    durable.atomic_write(path, json.dumps(summary, separators=(",", ":")))
+    if os.path.exists(log_path(path)):
+        os.remove(log_path(path))
+
+
+def differences(expected, actual, path="", places=2):
+    """List human-readable mismatches between two summaries (floats compared to places)"""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        found = []
+        for key in sorted(set(expected) | set(actual)):
+            where = f"{path}/{key}"
+            if key not in actual:
+                found.append(f"{where}: missing")
+            elif key not in expected:
+                found.append(f"{where}: unexpected")
+            else:
+                found.extend(differences(expected[key], actual[key], where, places))
+        return found
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        if round(expected, places) != round(actual, places):
+            return [f"{path}: expected {expected}, found {actual}"]
+        return []
+    return [] if expected == actual else [f"{path}: expected {expected!r}, found {actual!r}"]
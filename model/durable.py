@@ -0,0 +1,146 @@
+import os
+import time
+import threading
+
+# Durability settings shared by every data file writer.
+#
+# FSYNC: flush file data (and the directory entry after a rename) to disk
+#   before a write returns. Off by default, as before.
+# GROUP_COMMIT_WINDOW: seconds. When > 0, writes that arrive within the
+#   window share one flush: concurrent product mutations are applied and
+#   written together, and concurrent appends share one fsync. Callers
+#   still wait for their flush, so the window is added latency, not lost data.
+FSYNC = False
+GROUP_COMMIT_WINDOW = 0.0
+
+
+class GroupCommit:
+    """
+    Collect operations submitted by concurrent threads and hand them to
+    flush(ops) in batches. The first thread to arrive leads the batch: it
+    waits for the window, takes everything queued so far and runs flush,
+    which returns one (result, exception) pair per op. Every submitter
+    blocks until its own op has been flushed.
+    """
+
+    def __init__(self, flush):
+        self._flush = flush
+        self._cond = threading.Condition()
+        self._pending = []
+        self._leading = False
+        self.batches = 0
+
+    def submit(self, op, window):
+        entry = {"op": op, "done": False, "result": None, "error": None}
+        with self._cond:
+            self._pending.append(entry)
+            while not entry["done"] and self._leading:
+                self._cond.wait()
+            if entry["done"]:
+                return self._outcome(entry)
+            self._leading = True
+
+        batch = []
+        try:
+            time.sleep(window)
+            with self._cond:
+                batch, self._pending = self._pending, []
+            try:
+                outcomes = self._flush([item["op"] for item in batch])
+            except Exception as exc:
+                outcomes = [(None, exc)] * len(batch)
+            for item, (result, error) in zip(batch, outcomes):
+                item["result"], item["error"] = result, error
+        finally:
+            with self._cond:
+                for item in batch:
+                    item["done"] = True
+                self.batches += 1
+                self._leading = False
+                self._cond.notify_all()
+        return self._outcome(entry)
+
+    @staticmethod
+    def _outcome(entry):
+        if entry["error"] is not None:
+            raise entry["error"]
+        return entry["result"]
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_dir(path):
+    """Persist a rename by syncing the directory holding path (POSIX only)"""
+    if os.name != "posix":
+        return
+    _fsync_path(os.path.dirname(os.path.abspath(path)))
+
+
+def _flush_syncs(paths):
+    for path in dict.fromkeys(paths):
+        _fsync_path(path)
+    return [(None, None)] * len(paths)
+
+
+_sync_group = GroupCommit(_flush_syncs)
+
+
+def sync(path):
+    """fsync path now, or together with other writers when group commit is on"""
+    if not FSYNC:
+        return
+    if GROUP_COMMIT_WINDOW > 0:
+        _sync_group.submit(path, GROUP_COMMIT_WINDOW)
+    else:
+        _fsync_path(path)
+
+
+def write_temp(path, data):
+    """
+    Write data next to path in a temp file unique to this process/thread,
+    synced if FSYNC is on. Returns the temp path for replace().
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(tmp_path, mode) as f:
+        f.write(data)
+        if FSYNC:
+            f.flush()
+            os.fsync(f.fileno())
+    return tmp_path
+
+
+def replace(tmp_path, path):
+    """Atomically move a temp file over path"""
+    os.replace(tmp_path, path)
+    if FSYNC:
+        fsync_dir(path)
+
+
+def atomic_write(path, data):
+    """
+    Replace path with data so readers and crashes only ever see the old or
+    the new content, never a half-written file.
+    """
+    tmp_path = write_temp(path, data)
+    try:
+        replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def append(path, data):
+    """Append data to path and sync it per the FSYNC/group commit settings"""
+    mode = "ab" if isinstance(data, bytes) else "a"
+    with open(path, mode) as f:
+        offset = f.tell()
+        f.write(data)
+    sync(path)
+    return offset
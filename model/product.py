@@ -0,0 +1,133 @@
+from collections.abc import Sequence
+
+
+class Product:
+    """
+    One catalog entry. Behaves like the [name, price, quantity] list it
+    replaces (indexing, unpacking, comparing equal to lists and tuples) but
+    with __slots__ it takes about half the memory of that list.
+    code is the optional SKU/barcode; it is stored as a fourth list element
+    when set and is not part of the sequence.
+    Instances handed out by ProductModel are the cached records: read-only
+    for callers, they change when the catalog does.
+    """
+
+    __slots__ = ("name", "price", "quantity", "code")
+
+    def __init__(self, name, price, quantity, code=None):
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+        self.code = code or None
+
+    def __len__(self):
+        return 3
+
+    def __iter__(self):
+        return iter((self.name, self.price, self.quantity))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return (self.name, self.price, self.quantity)[index]
+        if index == 0 or index == -3:
+            return self.name
+        if index == 1 or index == -2:
+            return self.price
+        if index == 2 or index == -1:
+            return self.quantity
+        raise IndexError("Product index out of range")
+
+    def __setitem__(self, index, value):
+        if index == 0 or index == -3:
+            self.name = value
+        elif index == 1 or index == -2:
+            self.price = value
+        elif index == 2 or index == -1:
+            self.quantity = value
+        else:
+            raise IndexError("Product index out of range")
+
+    def __eq__(self, other):
+        if isinstance(other, (Product, list, tuple)):
+            return len(other) == 3 and (self.name, self.price, self.quantity) == tuple(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        if self.code:
+            return f"Product({self.name!r}, {self.price!r}, {self.quantity!r}, code={self.code!r})"
+        return f"Product({self.name!r}, {self.price!r}, {self.quantity!r})"
+
+
+class ProductsView(Sequence):
+    """Read-only view of a list of Products, without copying it"""
+
+    __slots__ = ("_items",)
+
+    def __init__(self, items):
+        self._items = items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ProductsView(self._items[index])
+        return self._items[index]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, (ProductsView, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"ProductsView({self._items!r})"
+
+
+def from_catalog(data):
+    """Turn a {category: [[name, price, quantity(, code)], ...]} dict into Product records in place"""
+    for category, items in data.items():
+        data[category] = [item if isinstance(item, Product) else Product(*item) for item in items]
+    return data
+
+
+def to_json(obj):
+    """json.dumps default= hook writing a Product as [name, price, quantity(, code)]"""
+    if isinstance(obj, Product):
+        if obj.code:
+            return [obj.name, obj.price, obj.quantity, obj.code]
+        return [obj.name, obj.price, obj.quantity]
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# Keys the catalog can be sorted by (query_products, get_products_page).
+# Ties left by the given keys are broken by name, then category, ascending;
+# "category" lists by category, then name.
+SORT_KEYS = ("category", "name", "price", "stock")
+
+
+def parse_sort(sort):
+    """
+    Parse a sort such as "price", "-price" (descending) or "category,-stock"
+    (a list of keys works too) into a list of (key, descending) pairs.
+    """
+    keys = sort.split(",") if isinstance(sort, str) else list(sort)
+    parsed = []
+    for spec in keys:
+        spec = spec.strip()
+        descending = spec.startswith("-")
+        key = spec[1:] if descending else spec
+        if key not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{spec}'")
+        if any(key == seen for seen, _ in parsed):
+            raise ValueError(f"Sort key '{key}' given twice")
+        parsed.append((key, descending))
+    if not parsed:
+        raise ValueError("No sort key given")
+    return parsed
@@ -0,0 +1,244 @@
+from bisect import bisect_left, bisect_right, insort
+from model.product import SORT_KEYS
+
+# Sorted indexes for filtered, sorted and paged catalog queries.
+#
+# The catalog is kept sorted once per model.product.SORT_KEYS key, each as
+# a list of (value, lowercased name, category) entries, so entries with an
+# equal value are already in the name, category tie order. A range filter
+# on a key (price between, stock between, name prefix, one category) is a
+# pair of bisects into that key's list, and when a query sorts by the key
+# it filters on, a page is read straight off the list: O(log n + page).
+# Filters on other keys are checked entry by entry while walking the range,
+# and a query whose sort key is not the best filter sorts the matches.
+#
+# The filtered (and, if need be, sorted) matches of the last such query are
+# kept until the next change, so paging through its results reads each page
+# off that list instead of filtering again. Likewise the groups of equal
+# first-key value that a multi-key sort re-sorts by its other keys are kept
+# for the last sort, so each is sorted once rather than on every page.
+#
+# Changes are applied with set() and remove(), a bisect and a list insert
+# or delete per key that changed.
+
+MAX_KEY = "\U0010ffff"  # sorts after any name
+# Walking the sort key's range in order is preferred unless another
+# filter's range is this many times narrower (its matches then get sorted)
+SORT_COST = 2
+
+
+class SortedIndex:
+    """
+    The catalog as sorted lists per sort key. Build it once with build(),
+    keep it current with set() and remove(), and ask it for pages with
+    query(), which returns (category, lowercased name) pairs.
+    """
+
+    def __init__(self):
+        self.values = {}   # (category, lowercased name) -> (price, quantity) as indexed
+        self.lists = {key: [] for key in SORT_KEYS}
+        self.version = 0      # bumped by every change
+        self._matches = None  # (query, version, entries) of the last filtered query
+        self._groups = None   # (entries, version, sort, {first-key value: sorted group}) of the last sort
+
+    @classmethod
+    def build(cls, products):
+        """Index a {category: [product, ...]} catalog"""
+        index = cls()
+        for category, items in products.items():
+            for item in items:
+                index.values[(category, item.name.lower())] = (item.price, item.quantity)
+        for key in SORT_KEYS:
+            index.lists[key] = sorted(index._entry(key, category, name) for category, name in index.values)
+        return index
+
+    def __len__(self):
+        return len(self.values)
+
+    def _value(self, key, category, name):
+        if key == "category":
+            return category
+        if key == "name":
+            return name
+        price, quantity = self.values[(category, name)]
+        return price if key == "price" else quantity
+
+    def _entry(self, key, category, name):
+        return (self._value(key, category, name), name, category)
+
+    def _insert(self, key, category, name):
+        insort(self.lists[key], self._entry(key, category, name))
+
+    def _delete(self, key, category, name):
+        entries = self.lists[key]
+        entry = self._entry(key, category, name)
+        position = bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    def set(self, category, item):
+        """Index a new product, or the new price and quantity of an indexed one"""
+        product = (category, item.name.lower())
+        old = self.values.get(product)
+        new = (item.price, item.quantity)
+        if old == new:
+            return
+        self.version += 1
+        if old is None:
+            self.values[product] = new
+            for key in SORT_KEYS:
+                self._insert(key, *product)
+            return
+        changed = [key for key, before, after in (("price", old[0], new[0]), ("stock", old[1], new[1]))
+                   if before != after]
+        for key in changed:
+            self._delete(key, *product)
+        self.values[product] = new
+        for key in changed:
+            self._insert(key, *product)
+
+    def remove(self, category, name):
+        product = (category, name.lower())
+        if product not in self.values:
+            return
+        self.version += 1
+        for key in SORT_KEYS:
+            self._delete(key, *product)
+        del self.values[product]
+
+    def _range(self, key, low, high):
+        """Positions lo, hi of the entries of key's list with low <= value <= high"""
+        entries = self.lists[key]
+        lo = 0 if low is None else bisect_left(entries, (low,))
+        hi = len(entries) if high is None else bisect_right(entries, (high, MAX_KEY))
+        return lo, max(lo, hi)
+
+    def query(self, sort, offset, limit, category=None, min_price=None, max_price=None,
+              min_stock=None, max_stock=None, name_prefix=None):
+        """
+        One page of the products passing every given filter (bounds are
+        inclusive), in sort order, a model.product.parse_sort list.
+        Returns (number of matches, [(category, lowercased name)]).
+        """
+        ranges = {}
+        if category is not None:
+            ranges["category"] = self._range("category", category, category)
+        if min_price is not None or max_price is not None:
+            ranges["price"] = self._range("price", min_price, max_price)
+        if min_stock is not None or max_stock is not None:
+            ranges["stock"] = self._range("stock", min_stock, max_stock)
+        if name_prefix is not None:
+            prefix = name_prefix.lower()
+            entries = self.lists["name"]
+            ranges["name"] = (bisect_left(entries, (prefix,)), bisect_left(entries, (prefix + MAX_KEY,)))
+
+        primary = sort[0][0]
+        lo, hi = ranges.get(primary, (0, len(self.values)))
+        driver = primary
+        if ranges:
+            narrowest = min(ranges, key=lambda key: ranges[key][1] - ranges[key][0])
+            width = ranges[narrowest][1] - ranges[narrowest][0]
+            if (hi - lo) > width * SORT_COST:
+                driver = narrowest
+                lo, hi = ranges[narrowest]
+
+        entries = self.lists[driver]
+        checks = self._checks(driver, category, min_price, max_price, min_stock, max_stock, name_prefix)
+        if checks or driver != primary:
+            query = (driver, sort if driver != primary else None, category, min_price, max_price,
+                     min_stock, max_stock, name_prefix)
+            if self._matches is not None and self._matches[:2] == (query, self.version):
+                entries = self._matches[2]
+            else:
+                entries = entries[lo:hi]
+                for check in checks:
+                    entries = [entry for entry in entries if check(entry)]
+                if driver != primary:
+                    # Matches are in (name, category) tie order once sorted by the
+                    # driver's value; restore that, then sort by the keys last to first
+                    entries.sort(key=lambda entry: (entry[1], entry[2]))
+                    self._sort(entries, sort)
+                self._matches = (query, self.version, entries)
+            lo, hi = 0, len(entries)
+        if driver != primary:
+            page = entries[offset:offset + limit]
+        else:
+            page = self._page(entries, lo, hi, sort, offset, limit)
+        return hi - lo, [(category, name) for _, name, category in page]
+
+    def _checks(self, driver, category, min_price, max_price, min_stock, max_stock, name_prefix):
+        """Tests for the filters the driver key's range does not already apply"""
+        values = self.values
+        checks = []
+        if category is not None and driver != "category":
+            checks.append(lambda entry: entry[2] == category)
+        if (min_price is not None or max_price is not None) and driver != "price":
+            low = float("-inf") if min_price is None else min_price
+            high = float("inf") if max_price is None else max_price
+            checks.append(lambda entry: low <= values[(entry[2], entry[1])][0] <= high)
+        if (min_stock is not None or max_stock is not None) and driver != "stock":
+            low_stock = float("-inf") if min_stock is None else min_stock
+            high_stock = float("inf") if max_stock is None else max_stock
+            checks.append(lambda entry: low_stock <= values[(entry[2], entry[1])][1] <= high_stock)
+        if name_prefix is not None and driver != "name":
+            prefix = name_prefix.lower()
+            checks.append(lambda entry: entry[1].startswith(prefix))
+        return checks
+
+    def _sort(self, entries, sort):
+        """Stable-sort entries by the (key, descending) pairs, the first one most significant"""
+        for key, descending in reversed(sort):
+            entries.sort(key=lambda entry: self._value(key, entry[2], entry[1]), reverse=descending)
+
+    def _page(self, entries, lo, hi, sort, offset, limit):
+        """
+        Rows offset.. of entries[lo:hi], which are sorted by the first sort
+        key ascending. Rows are taken group by group of equal first-key
+        value, each group found by bisect; only those groups are re-sorted
+        by the remaining keys, and kept for the next page.
+        """
+        descending = sort[0][1]
+        rest = sort[1:]
+        if offset >= hi - lo or limit <= 0:
+            return []
+        if not descending and not rest:
+            return entries[lo + offset:min(lo + offset + limit, hi)]
+        if rest:
+            spec = tuple(tuple(key) for key in sort)
+            cached = self._groups
+            if cached is None or cached[0] is not entries or cached[1:3] != (self.version, spec):
+                cached = self._groups = (entries, self.version, spec, {})
+            groups = cached[3]
+
+        if descending:
+            # Groups come last to first; find the group holding row offset
+            value = entries[hi - 1 - offset][0]
+            start, end = bisect_left(entries, (value,), lo, hi), bisect_right(entries, (value, MAX_KEY), lo, hi)
+            skip = offset - (hi - end)
+        else:
+            value = entries[lo + offset][0]
+            start, end = bisect_left(entries, (value,), lo, hi), bisect_right(entries, (value, MAX_KEY), lo, hi)
+            skip = lo + offset - start
+
+        page = []
+        while len(page) < limit:
+            if rest:
+                group = groups.get(entries[start][0])
+                if group is None:
+                    group = groups[entries[start][0]] = entries[start:end]
+                    self._sort(group, rest)
+            else:
+                group = entries[start:end]
+            page.extend(group[skip:skip + limit - len(page)])
+            skip = 0
+            if descending:
+                if start == lo:
+                    break
+                end = start
+                start = bisect_left(entries, (entries[end - 1][0],), lo, end)
+            else:
+                if end == hi:
+                    break
+                start = end
+                end = bisect_right(entries, (entries[start][0], MAX_KEY), start, hi)
+        return page
@@ -1,121 +1,1020 @@
 import os
 import json
+import time
+import shutil
+import threading
+from model import durable, product_wal, product_shards, stock_table
+from model.durable import GroupCommit
+from model.file_lock import file_lock
+from model.stock_table import StockTable
+from model.product import Product, ProductsView, from_catalog, to_json, parse_sort
+from model.product_index import SortedIndex
+from model.product_search import SearchIndex
 
 class ProductModel:
     PRODUCTS_FILE = "products.txt"
+    # With WAL on, commits append a small record to PRODUCTS_FILE + '.wal'
+    # instead of rewriting the catalog; the file itself becomes a compact
+    # snapshot refreshed in the background every CHECKPOINT_EVERY records
+    # or CHECKPOINT_INTERVAL seconds (0 disables either trigger).
+    WAL = False
+    CHECKPOINT_EVERY = 1000
+    CHECKPOINT_INTERVAL = 30.0
+    # With STOCK_TABLE on, quantities live in the memory-mapped
+    # PRODUCTS_FILE + '.stock' (see model.stock_table): sales update it in
+    # place and never rewrite the catalog, whose quantities go stale.
+    STOCK_TABLE = False
+    # With SHARDED on, each category lives in its own file under
+    # PRODUCTS_FILE + '.d' (see model.product_shards) and is loaded on
+    # first use; an edit rewrites only the shards it touches. The WAL
+    # applies to the single-file catalog and is not used with shards.
+    SHARDED = False
+
+    # Process-wide catalog cache. The parsed catalog is reused until the
+    # file on disk changes (path, mtime, ctime, size or inode) or we write it ourselves.
+    _cache = None
+    _cache_stamp = None
+    # Lookup tables over the cached catalog, keyed by lowercased name.
+    # _item_index maps category -> name -> the stored Product,
+    # _name_index maps name to a category carrying it (for get_price),
+    # _code_index maps a barcode/SKU to its (category, Product).
+    _item_index = {}
+    _name_index = {}
+    _code_index = {}
+    # Name search index, built on the first search() and kept in step with
+    # add/delete; dropped whenever the catalog is reloaded
+    _search = None
+    # Sorted indexes for query_products, built on the first query and kept
+    # in step with committed changes; dropped whenever the catalog is reloaded
+    _sorted = None
+    cache_hits = 0
+    cache_misses = 0
+    # Serializes threads of this process; other processes are kept out by
+    # the products.txt.lock file lock taken around each commit.
+    _lock = threading.RLock()
+    commit_conflicts = 0
+    _group = GroupCommit(lambda mutations: ProductModel._apply_batch(mutations))
+    # Changes noted by the mutations of the batch being applied, logged to the WAL
+    _changes = []
+    _wal_records = 0
+    _last_checkpoint = time.monotonic()
+    _checkpointer = None
+    # Sharded mode: stamps of the loaded shards, stamps of the shards read by
+    # the batch being applied (checked at commit), and the cached names and
+    # codes indexes as {file name: (stamp, index)}
+    _shard_stamps = {}
+    _read_set = {}
+    _shard_indexes = {}
+    _shards_ready = None
 
     @classmethod
-    def _load_products(cls):
-        if not os.path.exists(cls.PRODUCTS_FILE):
-            return {}
+    def _wal_file(cls):
+        return cls.PRODUCTS_FILE + ".wal"
+
+    @classmethod
+    def _stock_table(cls):
+        return StockTable.open(cls.PRODUCTS_FILE + ".stock")
+
+    @staticmethod
+    def _stat(path):
+        path = os.path.abspath(path)
         try:
+            st = os.stat(path)
+        except OSError:
+            return (path, None, None, 0, None)
+        return (path, st.st_mtime_ns, st.st_ctime_ns, st.st_size, st.st_ino)
+
+    @classmethod
+    def _file_stamp(cls):
+        """Identify the current version of the products file and its WAL"""
+        # The WAL counts with WAL off too: one left by a WAL run is replayed
+        return cls._stat(cls.PRODUCTS_FILE) + cls._stat(cls._wal_file())
+
+    @classmethod
+    def _read_products_file(cls):
+        products = {}
+        if os.path.exists(cls.PRODUCTS_FILE):
             with open(cls.PRODUCTS_FILE, "r") as f:
-                return json.loads(f.read() or "{}")
+                data = f.read()
+            try:
+                products = json.loads(data or "{}")
+            except json.JSONDecodeError as e:
+                # Never present a damaged file as an empty catalog, the next
+                # save would then wipe every product.
+                raise ValueError(f"Products file '{cls.PRODUCTS_FILE}' is corrupt: {e}")
+        from_catalog(products)
+        # Replayed whatever the WAL setting: a log left by a run with WAL on
+        # holds commits the snapshot lacks (see _commit for how it goes away)
+        try:
+            product_wal.replay(products, cls._wal_file())
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Products log '{cls._wal_file()}' is corrupt: {e}")
+        return products
+
+    @classmethod
+    def _load_products(cls):
+        """
+        Return the cached catalog, reloading it only if the file changed.
+        The returned dict is shared, callers must not modify it outside
+        of _transact.
+        """
+        if cls.SHARDED:
+            return cls._load_all_shards()
+        with ProductModel._lock:
+            stamp = cls._file_stamp()
+            if ProductModel._cache is not None and ProductModel._cache_stamp == stamp:
+                ProductModel.cache_hits += 1
+                return ProductModel._cache
+
+            ProductModel.cache_misses += 1
+            products = cls._read_products_file()
+            while cls._file_stamp() != stamp:
+                # Snapshot and WAL changed while we read them (e.g. a
+                # checkpoint in another process), read a consistent pair
+                stamp = cls._file_stamp()
+                products = cls._read_products_file()
+            ProductModel._cache = products
+            ProductModel._cache_stamp = stamp
+            cls._build_index(ProductModel._cache)
+            cls._load_stock(products)
+            return ProductModel._cache
+
+    @classmethod
+    def _transact(cls, mutate):
+        """
+        Apply mutate(products) to the catalog and persist it, safely against
+        other processes using the same file (optimistic concurrency):
+
+        1. mutate the cached catalog and encode it to a temp file, no lock held
+        2. take the file lock, check that the file is still the version we
+           loaded, and os.replace the temp file over it
+        3. if someone else committed in between, reload and start over
+
+        mutate must raise before changing anything if the change is invalid.
+        With durable.GROUP_COMMIT_WINDOW set, mutations from concurrent
+        threads are batched into one write. Returns whatever mutate returns.
+        """
+        if durable.GROUP_COMMIT_WINDOW > 0:
+            return ProductModel._group.submit(mutate, durable.GROUP_COMMIT_WINDOW)
+        result, error = cls._apply_batch([mutate])[0]
+        if error is not None:
+            raise error
+        return result
+
+    @classmethod
+    def _begin_batch(cls):
+        """Return the catalog and its stamp for a batch of mutations to work on"""
+        if not cls.SHARDED:
+            return cls._load_products(), ProductModel._cache_stamp
+        # Shards are (re)loaded as the mutations look products up
+        if ProductModel._cache is None:
+            ProductModel._cache = {}
+        ProductModel._read_set = {}
+        return ProductModel._cache, None
+
+    @classmethod
+    def _apply_batch(cls, mutations):
+        """Apply mutations in order and commit them with a single write"""
+        with ProductModel._lock:
+            while True:
+                products, stamp = cls._begin_batch()
+                outcomes = []
+                ProductModel._changes = []
+                for mutate in mutations:
+                    try:
+                        outcomes.append((mutate(products), None))
+                    except ValueError as e:
+                        outcomes.append((None, e))
+                if not any(error is None for _, error in outcomes):
+                    return outcomes  # nothing changed
+                if cls.SHARDED:
+                    committed = cls._commit_shards(products, ProductModel._changes)
+                elif cls.WAL:
+                    committed = cls._log_changes(ProductModel._changes, stamp)
+                else:
+                    committed = cls._commit(products, stamp)
+                if committed:
+                    cls._index_changes(ProductModel._changes)
+                    if cls._has_stock_table():
+                        cls._sync_stock(ProductModel._changes)
+                    return outcomes
+                ProductModel.commit_conflicts += 1
+                cls.clear_cache()
+
+    @classmethod
+    def _commit(cls, products, expected_stamp=None):
+        """
+        Atomically replace the products file with products.
+        Returns False without writing if the file no longer matches expected_stamp.
+        """
+        tmp_path = None
+        try:
+            tmp_path = durable.write_temp(cls.PRODUCTS_FILE, json.dumps(products, indent=2, default=to_json))
+            with file_lock(cls.PRODUCTS_FILE):
+                if expected_stamp is not None and cls._file_stamp() != expected_stamp:
+                    return False
+                wal = cls._wal_file()
+                leftover = os.path.exists(wal)
+                if leftover:
+                    # A log left by a WAL run, already replayed into products:
+                    # log this commit too, so that replaying it over the new
+                    # snapshot after a crash before it is removed is harmless
+                    product_wal.append(wal, cls._wal_line(ProductModel._changes))
+                durable.replace(tmp_path, cls.PRODUCTS_FILE)
+                if leftover:
+                    os.remove(wal)
+                    if durable.FSYNC:
+                        durable.fsync_dir(wal)
+                stamp = cls._file_stamp()
+        except:
+            cls.clear_cache()
+            raise
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if products is not ProductModel._cache:
+            cls._build_index(products)
+        ProductModel._cache = products
+        ProductModel._cache_stamp = stamp
+        return True
+
+    @classmethod
+    def _shard_dir(cls):
+        """The shard directory, split out of the single-file catalog on first use"""
+        directory = product_shards.shard_dir(cls.PRODUCTS_FILE)
+        if ProductModel._shards_ready == directory:
+            return directory
+        if not os.path.isdir(directory):
+            with file_lock(cls.PRODUCTS_FILE):
+                if not os.path.isdir(directory):
+                    tmp_dir = f"{directory}.{os.getpid()}.tmp"
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    product_shards.split(cls._read_products_file(), tmp_dir)
+                    os.replace(tmp_dir, directory)
+        ProductModel._shards_ready = directory
+        return directory
+
+    @classmethod
+    def _load_category(cls, category):
+        """Return the cached Products of one category, rereading its shard if it changed"""
+        with ProductModel._lock:
+            path = product_shards.shard_path(cls._shard_dir(), category)
+            stamp = cls._stat(path)
+            if ProductModel._cache is None:
+                ProductModel._cache = {}
+            cache = ProductModel._cache
+            ProductModel._read_set[category] = stamp
+            if category in ProductModel._shard_stamps and ProductModel._shard_stamps[category] == stamp:
+                ProductModel.cache_hits += 1
+                return cache.get(category)
+
+            ProductModel.cache_misses += 1
+            items = product_shards.read_shard(path)
+            cls._forget_category(category)
+            if items is None:
+                cache.pop(category, None)
+            else:
+                cache[category] = items
+                for item in items:
+                    cls._index_add(category, item)
+                cls._load_stock({category: items})
+            ProductModel._shard_stamps[category] = stamp
+            return items
+
+    @classmethod
+    def _load_all_shards(cls):
+        with ProductModel._lock:
+            present = product_shards.categories(cls._shard_dir())
+            for category in present:
+                cls._load_category(category)
+            for category in list(ProductModel._cache):
+                if category not in present:
+                    cls._forget_category(category)
+                    del ProductModel._cache[category]
+                    ProductModel._shard_stamps.pop(category, None)
+            return ProductModel._cache
+
+    @classmethod
+    def _forget_category(cls, category):
+        """Drop the index entries of a cached shard about to be reread or removed"""
+        for item in (ProductModel._cache or {}).get(category, ()):
+            cls._drop_code(item)
+        ProductModel._item_index.pop(category, None)
+        ProductModel._search = None
+        ProductModel._sorted = None
+
+    @classmethod
+    def _load_index(cls, filename):
+        """Return the cached names.idx or codes.idx of the shards"""
+        with ProductModel._lock:
+            directory = cls._shard_dir()
+            stamp = cls._stat(os.path.join(directory, filename))
+            cached = ProductModel._shard_indexes.get(filename)
+            if cached is None or cached[0] != stamp:
+                cached = ProductModel._shard_indexes[filename] = (stamp, product_shards.read_index(directory, filename))
+            return cached[1]
+
+    @classmethod
+    def _load_for(cls, category):
+        """Load what reading one category needs: its shard, or the whole catalog"""
+        if cls.SHARDED:
+            cls._load_category(category)
+            return ProductModel._cache
+        return cls._load_products()
+
+    @classmethod
+    def _commit_shards(cls, products, changes):
+        """
+        Rewrite the shards of the categories a batch changed. Returns False
+        without writing if one of them (or the names or codes index, when
+        entries were added or removed) changed on disk since the batch read it.
+        Shards are replaced one by one, so a crash can leave a multi-category
+        batch partly applied; each shard on its own is always whole.
+        """
+        directory = cls._shard_dir()
+        reset = any(change[0] == "reset" for change in changes)
+        if reset:
+            touched = set(product_shards.categories(directory)) | set(products)
+        else:
+            touched = {change[1] for change in changes}
+
+        names = cls._load_index(product_shards.NAMES)
+        codes = cls._load_index(product_shards.CODES)
+        names_stamp = ProductModel._shard_indexes[product_shards.NAMES][0]
+        codes_stamp = ProductModel._shard_indexes[product_shards.CODES][0]
+        if reset:
+            target = product_shards.build_names(products)
+            added = [(key, category) for key, categories in target.items() for category in categories]
+            removed = [
+                (key, category) for key, categories in names.items() for category in categories
+                if category not in target.get(key, ())
+            ]
+        else:
+            added, removed = [], []
+            for change in changes:
+                category = change[1]
+                key = cls._normalize(change[2].name if change[0] == "set" else change[2])
+                present = cls._find(category, key) is not None
+                if present and category not in names.get(key, ()):
+                    added.append((key, category))
+                elif not present and category in names.get(key, ()):
+                    removed.append((key, category))
+        target_codes = product_shards.build_codes(products) if reset else None
+        new_codes = {
+            change[2].code: change[1] for change in changes
+            if change[0] == "set" and change[2].code and codes.get(change[2].code) != change[1]
+        }
+        if reset:
+            new_codes = {code: category for code, category in target_codes.items() if codes.get(code) != category}
+
+        temps = {}
+        try:
+            for category in touched:
+                if category in products:
+                    path = product_shards.shard_path(directory, category)
+                    temps[category] = durable.write_temp(path, product_shards.encode_shard(products[category]))
+            with file_lock(cls.PRODUCTS_FILE):
+                names_path = os.path.join(directory, product_shards.NAMES)
+                codes_path = os.path.join(directory, product_shards.CODES)
+                if not reset:
+                    for category in touched:
+                        path = product_shards.shard_path(directory, category)
+                        if cls._stat(path) != ProductModel._read_set.get(category):
+                            return False
+                if (added or removed) and cls._stat(names_path) != names_stamp:
+                    return False
+                if (new_codes or reset) and cls._stat(codes_path) != codes_stamp:
+                    return False
+
+                # The names index stays a superset of the shards: add names
+                # before the shards are written, drop them afterwards
+                for key, category in added:
+                    if category not in names.setdefault(key, []):
+                        names[key].append(category)
+                if added:
+                    product_shards.write_names(directory, names)
+                if new_codes:
+                    codes.update(new_codes)
+                    product_shards.write_index(directory, product_shards.CODES, codes)
+                for category in touched:
+                    path = product_shards.shard_path(directory, category)
+                    if category in temps:
+                        durable.replace(temps.pop(category), path)
+                    elif os.path.exists(path):
+                        os.remove(path)
+                    ProductModel._shard_stamps[category] = ProductModel._read_set[category] = cls._stat(path)
+                for key, category in removed:
+                    names[key].remove(category)
+                    if not names[key]:
+                        del names[key]
+                if removed:
+                    product_shards.write_names(directory, names)
+                if reset and codes != target_codes:
+                    codes.clear()
+                    codes.update(target_codes)
+                    product_shards.write_index(directory, product_shards.CODES, codes)
+                ProductModel._shard_indexes[product_shards.NAMES] = (cls._stat(names_path), names)
+                ProductModel._shard_indexes[product_shards.CODES] = (cls._stat(codes_path), codes)
         except:
-            return {}
+            cls.clear_cache()
+            raise
+        finally:
+            for tmp_path in temps.values():
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        return True
+
+    @classmethod
+    def _has_stock_table(cls):
+        return cls.STOCK_TABLE or os.path.exists(cls.PRODUCTS_FILE + ".stock")
+
+    @classmethod
+    def _load_stock(cls, products):
+        """
+        Take the live quantities of freshly loaded products from the stock
+        table. A table left by a run with STOCK_TABLE on is still read (and
+        kept in step by commits, see _apply_batch) with it off, since its
+        quantities are newer than the catalog's and it would otherwise
+        override later edits once STOCK_TABLE is turned back on.
+        """
+        if cls.STOCK_TABLE:
+            cls._attach_stock(products)
+        elif cls._has_stock_table():
+            stock_table.overlay(products, cls.PRODUCTS_FILE + ".stock")
+
+    @classmethod
+    def _attach_stock(cls, products):
+        """Give every product a stock slot and load the live quantities"""
+        table = cls._stock_table()
+        table.refresh()
+        for category, items in products.items():
+            for item in items:
+                quantity = table.get(category, item.name)
+                if quantity is None:
+                    # New since the last sync (e.g. the catalog was edited by hand)
+                    table.set(category, item.name, item.quantity)
+                else:
+                    item.quantity = quantity
+
+    @classmethod
+    def _sync_stock(cls, changes):
+        """Copy quantities set by add/update/_save_products to the stock table"""
+        table = cls._stock_table()
+        for change in changes:
+            if change[0] == "set":
+                category, item = change[1], change[2]
+                table.set(category, item.name, item.quantity)
+            elif change[0] == "reset":
+                for category, items in change[1].items():
+                    for item in items:
+                        table.set(category, item.name, item.quantity)
+
+    @classmethod
+    def _live(cls, category, item):
+        """Refresh a cached item's quantity from the stock table"""
+        if cls.STOCK_TABLE:
+            quantity = cls._stock_table().get(category, item.name)
+            if quantity is not None:
+                item.quantity = quantity
+        return item
+
+    @classmethod
+    def _transact_stock(cls, lines, mutate):
+        """
+        Run a quantity-only mutation against the stock table instead of the
+        catalog: load the live quantities of the (category, name, ...) lines
+        under the stock file lock, apply mutate to the cached items and write
+        the new quantities back in place.
+        """
+        with ProductModel._lock:
+            products, _ = cls._begin_batch()
+            with cls._stock_table().locked() as table:
+                items = []
+                for category, name, _ in lines:
+                    item = cls._find(category, name)
+                    if item is not None:
+                        cls._live(category, item)
+                        items.append((category, item))
+                ProductModel._changes = []
+                result = mutate(products)
+                for category, item in items:
+                    table.set(category, item.name, item.quantity)
+                cls._index_changes(ProductModel._changes)
+            return result
 
     @classmethod
     def _save_products(cls, products):
-        with open(cls.PRODUCTS_FILE, "w") as f:
-            json.dump(products, f, indent=2)
+        """Replace the whole catalog unconditionally"""
+        def apply(current):
+            current.clear()
+            current.update(products)
+            from_catalog(current)
+            cls._build_index(current)
+            ProductModel._changes.append(("reset", current))
+
+        cls._transact(apply)
+
+    @staticmethod
+    def _wal_line(changes):
+        """Encode the changes of one commit as after-images for the WAL"""
+        records = []
+        for change in changes:
+            if change[0] == "set":
+                category, item = change[1], change[2]
+                record = ["set", category, item.name, item.price, item.quantity]
+                if item.code:
+                    record.append(item.code)
+                records.append(record)
+            else:
+                records.append(list(change))
+        return product_wal.encode(records)
 
     @classmethod
-    def add_product(cls, category, name, price, quantity):
+    def _log_changes(cls, changes, expected_stamp):
+        """
+        Append the changes of one commit to the WAL.
+        Returns False without writing if the catalog no longer matches expected_stamp.
+        """
+        line = cls._wal_line(changes)
+        try:
+            with file_lock(cls.PRODUCTS_FILE):
+                if cls._file_stamp() != expected_stamp:
+                    return False
+                product_wal.append(cls._wal_file(), line)
+                stamp = cls._file_stamp()
+        except:
+            cls.clear_cache()
+            raise
+
+        ProductModel._cache_stamp = stamp
+        ProductModel._wal_records += 1
+        cls._maybe_checkpoint()
+        return True
+
+    @classmethod
+    def _maybe_checkpoint(cls):
+        """Start a background checkpoint when the WAL is due for folding"""
+        due = (
+            (cls.CHECKPOINT_EVERY and ProductModel._wal_records >= cls.CHECKPOINT_EVERY)
+            or (cls.CHECKPOINT_INTERVAL
+                and time.monotonic() - ProductModel._last_checkpoint >= cls.CHECKPOINT_INTERVAL)
+        )
+        running = ProductModel._checkpointer is not None and ProductModel._checkpointer.is_alive()
+        if due and not running:
+            ProductModel._checkpointer = threading.Thread(target=cls.checkpoint, daemon=True)
+            ProductModel._checkpointer.start()
+
+    @classmethod
+    def checkpoint(cls):
+        """
+        Fold the WAL into a fresh snapshot:
+
+        1. encode the cached catalog, which covers the WAL up to its current size
+        2. write it to a temp file, no lock held
+        3. under the file lock, if no other checkpoint ran in between, replace
+           the snapshot and cut the covered records off the front of the WAL
+
+        Commits keep appending meanwhile; their records stay in the WAL.
+        Returns False if there was nothing to do or another process got there first.
+        """
+        if not cls.WAL or cls.SHARDED:
+            return False
+        with ProductModel._lock:
+            products = cls._load_products()
+            stamp = ProductModel._cache_stamp
+            records = ProductModel._wal_records
+            data = json.dumps(products, separators=(",", ":"), default=to_json)
+        snapshot, wal = stamp[:5], stamp[5:]
+        if not wal[3]:
+            return False  # empty WAL
+
+        tmp_path = None
+        try:
+            tmp_path = durable.write_temp(cls.PRODUCTS_FILE, data)
+            with ProductModel._lock, file_lock(cls.PRODUCTS_FILE):
+                current = cls._file_stamp()
+                if current[:5] != snapshot or current[9] != wal[4] or current[8] < wal[3]:
+                    return False
+                durable.replace(tmp_path, cls.PRODUCTS_FILE)
+                # A crash here leaves the new snapshot with the whole WAL,
+                # replaying the covered records again changes nothing.
+                product_wal.drop_prefix(cls._wal_file(), wal[3])
+                if ProductModel._cache_stamp == current:
+                    ProductModel._cache_stamp = cls._file_stamp()
+                ProductModel._wal_records = max(0, ProductModel._wal_records - records)
+                ProductModel._last_checkpoint = time.monotonic()
+        except:
+            cls.clear_cache()
+            raise
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return True
+
+    @classmethod
+    def clear_cache(cls):
+        """Drop the cached catalog so the next read goes to disk"""
+        ProductModel._cache = None
+        ProductModel._cache_stamp = None
+        ProductModel._item_index = {}
+        ProductModel._name_index = {}
+        ProductModel._code_index = {}
+        ProductModel._search = None
+        ProductModel._sorted = None
+        ProductModel._shard_stamps = {}
+        ProductModel._read_set = {}
+        ProductModel._shard_indexes = {}
+        ProductModel._shards_ready = None
+
+    @classmethod
+    def cache_info(cls):
+        """Return cache hit/miss counters"""
+        return {
+            "hits": ProductModel.cache_hits,
+            "misses": ProductModel.cache_misses,
+            "loaded": ProductModel._cache is not None,
+        }
+
+    @classmethod
+    def reset_cache_stats(cls):
+        ProductModel.cache_hits = 0
+        ProductModel.cache_misses = 0
+        ProductModel.commit_conflicts = 0
+
+    @staticmethod
+    def _normalize(name):
+        return name.lower()
+
+    @classmethod
+    def _build_index(cls, products):
+        """Rebuild the name lookup tables from a freshly loaded catalog"""
+        ProductModel._item_index = {}
+        ProductModel._name_index = {}
+        ProductModel._code_index = {}
+        ProductModel._search = None
+        ProductModel._sorted = None
+        for category, items in products.items():
+            for item in items:
+                cls._index_add(category, item)
+
+    @classmethod
+    def _index_changes(cls, changes):
+        """Apply the changes of a committed batch to the sorted indexes"""
+        index = ProductModel._sorted
+        if index is None:
+            return
+        for change in changes:
+            if change[0] == "set":
+                index.set(change[1], change[2])
+            elif change[0] == "del":
+                index.remove(change[1], change[2])
+            else:
+                ProductModel._sorted = None  # the whole catalog was replaced
+                return
+
+    @classmethod
+    def _index_add(cls, category, item):
+        key = cls._normalize(item.name)
+        ProductModel._item_index.setdefault(category, {})[key] = item
+        if not cls.SHARDED:
+            ProductModel._name_index.setdefault(key, category)
+        if item.code:
+            ProductModel._code_index[item.code] = (category, item)
+        if ProductModel._search is not None:
+            ProductModel._search.add(category, item.name)
+
+    @classmethod
+    def _index_remove(cls, category, item):
+        key = cls._normalize(item.name)
+        ProductModel._item_index.get(category, {}).pop(key, None)
+        cls._drop_code(item)
+        if ProductModel._search is not None:
+            ProductModel._search.remove(category, item.name)
+        if not cls.SHARDED and ProductModel._name_index.get(key) == category:
+            # Point the name at another category still carrying it, if any
+            del ProductModel._name_index[key]
+            for other, items in ProductModel._item_index.items():
+                if key in items:
+                    ProductModel._name_index[key] = other
+                    break
+
+    @staticmethod
+    def _drop_code(item):
+        if item.code and ProductModel._code_index.get(item.code, (None, None))[1] is item:
+            del ProductModel._code_index[item.code]
+
+    @classmethod
+    def _set_code(cls, category, item, code):
+        """Give item a new code (None clears it), keeping the code index in step"""
+        cls._drop_code(item)
+        item.code = code
+        if code:
+            ProductModel._code_index[code] = (category, item)
+
+    @staticmethod
+    def _normalize_code(code):
+        """Codes are matched exactly, as strings without surrounding blanks"""
+        if code is None:
+            return None
+        return str(code).strip() or None
+
+    @classmethod
+    def _find(cls, category, name):
+        """Return the stored Product or None"""
+        if cls.SHARDED and category not in ProductModel._read_set:
+            cls._load_category(category)
+        items = ProductModel._item_index.get(category)
+        if items is None:
+            return None
+        return items.get(cls._normalize(name))
+
+    @classmethod
+    def _find_code(cls, code):
+        """Return the (category, Product) carrying code, or None"""
+        if cls.SHARDED:
+            # codes.idx names the one shard that can hold the code
+            category = cls._load_index(product_shards.CODES).get(code)
+            if category is None:
+                return None
+            if category not in ProductModel._read_set:
+                cls._load_category(category)
+            hit = ProductModel._code_index.get(code)
+            return hit if hit is not None and hit[0] == category else None
+        return ProductModel._code_index.get(code)
+
+    @classmethod
+    def add_product(cls, category, name, price, quantity, code=None):
         if not category or not name or price <= 0 or quantity < 0:
             raise ValueError("Invalid product data")
+        code = cls._normalize_code(code)
 
-        products = cls._load_products()
-        
-        if category not in products:
-            products[category] = []
-            
-        # Check if product already exists
-        for item in products[category]:
-            if item[0].lower() == name.lower():
+        def apply(products):
+            # Check if product already exists
+            if cls._find(category, name) is not None:
                 raise ValueError(f"Product '{name}' already exists in category '{category}'")
-                
-        products[category].append([name, price, quantity])
-        cls._save_products(products)
-        return True
+            cls._check_code_free(code)
+
+            if category not in products:
+                products[category] = []
+
+            item = Product(name, price, quantity, code)
+            products[category].append(item)
+            cls._index_add(category, item)
+            ProductModel._changes.append(("set", category, item))
+            return True
+
+        return cls._transact(apply)
 
     @classmethod
-    def update_product(cls, category, name, new_price, new_quantity):
+    def update_product(cls, category, name, new_price, new_quantity, new_code=None):
+        """new_code None keeps the product's code, an empty string removes it"""
         if not category or not name or new_price <= 0 or new_quantity < 0:
             raise ValueError("Invalid product data")
+        keep_code = new_code is None
+        new_code = cls._normalize_code(new_code)
+
+        def apply(products):
+            item = cls._find(category, name)
+            if category not in products:
+                raise ValueError(f"Category '{category}' not found")
+            if item is None:
+                raise ValueError(f"Product '{name}' not found in category '{category}'")
+            if not keep_code and new_code != item.code:
+                cls._check_code_free(new_code)
+                cls._set_code(category, item, new_code)
 
-        products = cls._load_products()
-        
-        if category not in products:
-            raise ValueError(f"Category '{category}' not found")
-            
-        for item in products[category]:
-            if item[0].lower() == name.lower():
-                item[1] = new_price
-                item[2] = new_quantity
-                cls._save_products(products)
-                return True
-                
-        raise ValueError(f"Product '{name}' not found in category '{category}'")
+            item.price = new_price
+            item.quantity = new_quantity
+            ProductModel._changes.append(("set", category, item))
+            return True
+
+        return cls._transact(apply)
+
+    @classmethod
+    def _check_code_free(cls, code):
+        if code is None:
+            return
+        owner = cls._find_code(code)
+        if owner is not None:
+            raise ValueError(f"Code '{code}' is already used by '{owner[1].name}' in category '{owner[0]}'")
 
     @classmethod
     def delete_product(cls, category, name):
-        products = cls._load_products()
-        
-        if category not in products:
-            raise ValueError(f"Category '{category}' not found")
-            
-        for i, item in enumerate(products[category]):
-            if item[0].lower() == name.lower():
-                products[category].pop(i)
-                if not products[category]:  # If category is empty
-                    del products[category]
-                cls._save_products(products)
-                return True
-                
-        raise ValueError(f"Product '{name}' not found in category '{category}'")
+        def apply(products):
+            item = cls._find(category, name)
+            if category not in products:
+                raise ValueError(f"Category '{category}' not found")
+            if item is None:
+                raise ValueError(f"Product '{name}' not found in category '{category}'")
+
+            products[category].remove(item)
+            cls._index_remove(category, item)
+            ProductModel._changes.append(("del", category, item.name))
+            if not products[category]:  # If category is empty
+                del products[category]
+            return True
+
+        return cls._transact(apply)
 
     @classmethod
     def get_all_products(cls):
-        return cls._load_products()
+        with ProductModel._lock:
+            products = cls._load_products()
+            if cls.STOCK_TABLE:
+                for category, items in products.items():
+                    for item in items:
+                        cls._live(category, item)
+            return products
 
     @classmethod
     def get_products_by_category(cls, category):
-        """Get all products in a category"""
-        products = cls.get_all_products()
-        if category in products:
-            return [tuple(product) for product in products[category]]  # Convert lists to tuples
-        return []
+        """Get a read-only view of the products in a category"""
+        with ProductModel._lock:
+            products = cls._load_for(category)
+            if category in products:
+                for product in products[category]:
+                    cls._live(category, product)
+                return ProductsView(products[category])
+            return []
 
     @classmethod
     def get_product(cls, category, name):
-        """Get a specific product"""
-        products = cls.get_all_products()
-        if category in products:
-            for product in products[category]:
-                if product[0] == name:
-                    return tuple(product)  # Convert list to tuple
-        return None
+        """Get a specific product (name match is case-insensitive)"""
+        with ProductModel._lock:
+            cls._load_for(category)
+            item = cls._find(category, name)
+            if item is None:
+                return None
+            return cls._live(category, item)
+
+    @classmethod
+    def get_product_by_code(cls, code):
+        """
+        Look a product up by its barcode/SKU, e.g. for a scanner.
+        Returns (category, Product) or None.
+        """
+        code = cls._normalize_code(code)
+        if code is None:
+            return None
+        with ProductModel._lock:
+            if cls.SHARDED:
+                # Reread the shard if it changed on disk
+                category = cls._load_index(product_shards.CODES).get(code)
+                if category is not None:
+                    cls._load_category(category)
+            else:
+                cls._load_products()
+            hit = cls._find_code(code)
+            if hit is None:
+                return None
+            category, item = hit
+            return category, cls._live(category, item)
+
+    @classmethod
+    def query_products(cls, category=None, min_price=None, max_price=None, min_stock=None,
+                       max_stock=None, name_prefix=None, sort="category", offset=0, limit=50):
+        """
+        One page of the products matching every given filter: a category,
+        inclusive price and stock ranges and a name prefix (case-insensitive).
+        sort is one or more model.product.SORT_KEYS, e.g. "price" or
+        "category,-stock" (see parse_sort). Pages come off sorted indexes
+        kept up to date as products change, see model.product_index.
+        Returns (number of matching products, [(category, Product)]).
+        """
+        sort = parse_sort(sort)
+        if offset < 0 or limit < 0:
+            raise ValueError("Offset and limit must not be negative")
+        for bound in (min_price, max_price, min_stock, max_stock):
+            if bound is not None and (isinstance(bound, bool) or not isinstance(bound, (int, float))):
+                raise ValueError("Price and stock bounds must be numbers")
+        with ProductModel._lock:
+            products = cls._load_products()
+            if ProductModel._sorted is None:
+                # With STOCK_TABLE, stock filters and order follow the quantities
+                # as last loaded or changed by this process
+                ProductModel._sorted = SortedIndex.build(products)
+            total, page = ProductModel._sorted.query(sort, offset, limit, category, min_price, max_price,
+                                                     min_stock, max_stock, name_prefix)
+            items = ProductModel._item_index
+            return total, [(category, cls._live(category, items[category][name])) for category, name in page]
+
+    @classmethod
+    def get_products_page(cls, offset=0, limit=50, sort="category"):
+        """
+        One page of the whole catalog in sort order, for views that show it
+        a window at a time. Returns (total product count, [(category, Product)]).
+        """
+        return cls.query_products(sort=sort, offset=offset, limit=limit)
 
     @classmethod
     def reduce_stock(cls, category, name, quantity):
-        products = cls._load_products()
-        if category in products:
-            for item in products[category]:
-                if item[0].lower() == name.lower():
-                    if item[2] >= quantity:
-                        item[2] -= quantity
-                        cls._save_products(products)
-                        return True
-                    else:
-                        raise ValueError(f"Insufficient stock for '{name}'")
-        raise ValueError(f"Product '{name}' not found in category '{category}'")
+        def apply(products):
+            item = cls._find(category, name)
+            if item is None:
+                raise ValueError(f"Product '{name}' not found in category '{category}'")
+            if item.quantity < quantity:
+                raise ValueError(f"Insufficient stock for '{name}'")
+
+            item.quantity -= quantity
+            ProductModel._changes.append(("set", category, item))
+            return True
+
+        if cls.STOCK_TABLE:
+            return cls._transact_stock([(category, name, quantity)], apply)
+        return cls._transact(apply)
+
+    @classmethod
+    def reduce_stock_batch(cls, lines):
+        """
+        Reduce stock for several (category, name, quantity) lines at once.
+        Every line is validated before anything changes, so either all lines
+        are applied or none is. The catalog is written once.
+        Returns one dict per line with the product, price, code and remaining stock.
+        """
+        def apply(products):
+            # Validate everything first, summing repeated lines for the same product
+            needed = {}
+            resolved = []
+            for category, name, quantity in lines:
+                if quantity <= 0:
+                    raise ValueError(f"Invalid quantity for '{name}'")
+                item = cls._find(category, name)
+                if item is None:
+                    raise ValueError(f"Product '{name}' not found in category '{category}'")
+                key = (category, cls._normalize(name))
+                needed[key] = needed.get(key, 0) + quantity
+                if item.quantity < needed[key]:
+                    raise ValueError(f"Insufficient stock for '{name}'")
+                resolved.append((category, item, quantity))
+
+            results = []
+            for category, item, quantity in resolved:
+                item.quantity -= quantity
+                ProductModel._changes.append(("set", category, item))
+                results.append({
+                    "category": category,
+                    "name": item.name,
+                    "price": item.price,
+                    "quantity": quantity,
+                    "remaining": item.quantity,
+                    "code": item.code,
+                })
+            return results
+
+        if cls.STOCK_TABLE:
+            return cls._transact_stock(lines, apply)
+        return cls._transact(apply)
+
+    @classmethod
+    def restore_stock_batch(cls, lines):
+        """Put back stock taken by reduce_stock_batch, e.g. when a checkout fails"""
+        def apply(products):
+            for category, name, quantity in lines:
+                item = cls._find(category, name)
+                if item is not None:
+                    item.quantity += quantity
+                    ProductModel._changes.append(("set", category, item))
+            return True
+
+        if cls.STOCK_TABLE:
+            return cls._transact_stock(lines, apply)
+        return cls._transact(apply)
 
     @classmethod
     def get_price(cls, name):
         """Get the price of a product by name"""
-        products = cls.get_all_products()
-        for category in products.values():
-            for product in category:
-                if product[0] == name:
-                    return product[1]
-        raise ValueError(f"Product {name} not found")
+        with ProductModel._lock:
+            key = cls._normalize(name)
+            if cls.SHARDED:
+                # Only open the shards the names index points at
+                for category in cls._load_index(product_shards.NAMES).get(key, ()):
+                    cls._load_category(category)
+                    item = cls._find(category, key)
+                    if item is not None:
+                        return item.price
+                raise ValueError(f"Product {name} not found")
+
+            cls._load_products()
+            category = ProductModel._name_index.get(key)
+            if category is None:
+                raise ValueError(f"Product {name} not found")
+            return ProductModel._item_index[category][key].price
+
+    @classmethod
+    def search(cls, query, limit=10):
+        """
+        Find products by name for autocomplete: names with a word starting
+        with query first, then close spellings (typos).
+        Returns up to limit (category, Product) pairs.
+        """
+        with ProductModel._lock:
+            products = cls._load_products()
+            if ProductModel._search is None:
+                ProductModel._search = SearchIndex.build(products)
+            results = []
+            for category, name in ProductModel._search.search(query, limit):
+                item = cls._find(category, name)
+                if item is not None:
+                    results.append((category, cls._live(category, item)))
+            return results
@@ -0,0 +1,113 @@
+import os
+import json
+from urllib.parse import quote, unquote
+from model import durable
+from model.product import from_catalog, to_json
+
+# Sharded catalog layout, one file per category next to products.txt:
+#
+#   products.txt.d/Groceries.json   [[name, price, quantity], ...]
+#   products.txt.d/names.idx        {lowercased name: [categories carrying it]}
+#   products.txt.d/codes.idx        {code: category carrying it}
+#
+# Category names are percent-quoted to make safe file names. The names
+# index lets get_price find a product's shard without opening the others.
+# It may briefly list a name a shard no longer has (it is written as a
+# superset around shard rewrites), never the other way round. The codes
+# index does the same for barcode lookups; codes are only ever added to it
+# (a cleared or moved code is left pointing at a shard that no longer has
+# it), so readers check the shard and it is rebuilt on a full rewrite.
+SHARD_SUFFIX = ".json"
+NAMES = "names.idx"
+CODES = "codes.idx"
+
+
+def shard_dir(products_file):
+    return products_file + ".d"
+
+
+def shard_path(directory, category):
+    return os.path.join(directory, quote(category, safe="") + SHARD_SUFFIX)
+
+
+def categories(directory):
+    """Categories that have a shard, in file name order"""
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return []
+    return [unquote(name[:-len(SHARD_SUFFIX)]) for name in names if name.endswith(SHARD_SUFFIX)]
+
+
+def read_shard(path):
+    """Return the Products of a shard, or None if it does not exist"""
+    try:
+        with open(path, "r") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    try:
+        items = json.loads(data or "[]")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Products shard '{path}' is corrupt: {e}")
+    return from_catalog({None: items})[None]
+
+
+def encode_shard(items):
+    return json.dumps(items, separators=(",", ":"), default=to_json)
+
+
+def read_index(directory, filename):
+    """Read names.idx or codes.idx, an empty dict if it does not exist"""
+    try:
+        with open(os.path.join(directory, filename), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Products index '{filename}' in '{directory}' is corrupt: {e}")
+
+
+def write_index(directory, filename, index):
+    durable.atomic_write(os.path.join(directory, filename), json.dumps(index, separators=(",", ":")))
+
+
+def read_names(directory):
+    return read_index(directory, NAMES)
+
+
+def write_names(directory, names):
+    write_index(directory, NAMES, names)
+
+
+def build_names(products):
+    names = {}
+    for category, items in products.items():
+        for item in items:
+            categories = names.setdefault(item[0].lower(), [])
+            if category not in categories:
+                categories.append(category)
+    return names
+
+
+def build_codes(products):
+    return {item.code: category for category, items in products.items() for item in items if item.code}
+
+
+def split(products, directory):
+    """Write a whole catalog out as shards plus the names and codes indexes"""
+    os.makedirs(directory, exist_ok=True)
+    for category, items in products.items():
+        durable.atomic_write(shard_path(directory, category), encode_shard(items))
+    write_names(directory, build_names(products))
+    write_index(directory, CODES, build_codes(products))
+
+
+def read_catalog(directory):
+    """Load every shard into one {category: [Product, ...]} dict"""
+    products = {}
+    for category in categories(directory):
+        items = read_shard(shard_path(directory, category))
+        if items is not None:
+            products[category] = items
+    return products
@@ -0,0 +1,105 @@
+import os
+import json
+from model import durable
+from model.product import Product, from_catalog, to_json
+
+# Write-ahead log for the product catalog, kept next to the snapshot:
+#
+#   products.txt       snapshot, the whole catalog as compact JSON
+#   products.txt.wal   one JSON line per commit, appended after the snapshot
+#
+# A WAL line is a list of changes, each the after-image of one product:
+#
+#   ["set", category, name, price, quantity(, code)]   add or overwrite the product
+#   ["del", category, name]                            remove the product
+#   ["reset", catalog]                                 replace the whole catalog
+#
+# After-images make replay idempotent: replaying records the snapshot
+# already contains leaves it unchanged, so a crash between writing a new
+# snapshot and trimming the log loses nothing. A line without its newline
+# is a commit torn by a crash; it was never acknowledged and is ignored.
+
+
+def encode(changes):
+    """Encode one commit's changes as a WAL line"""
+    return json.dumps(changes, separators=(",", ":"), default=to_json) + "\n"
+
+
+def apply(products, changes, index=None):
+    """
+    Apply one WAL record to a catalog dict in place.
+    index maps (category, lowercased name) to stored items and is kept in step.
+    """
+    if index is None:
+        index = build_index(products)
+    for change in changes:
+        op = change[0]
+        if op == "reset":
+            products.clear()
+            products.update(from_catalog(change[1]))
+            index.clear()
+            index.update(build_index(products))
+            continue
+
+        category, name = change[1], change[2]
+        key = (category, name.lower())
+        item = index.get(key)
+        if op == "set":
+            code = change[5] if len(change) > 5 else None
+            if item is None:
+                item = index[key] = Product(name, change[3], change[4], code)
+                products.setdefault(category, []).append(item)
+            else:
+                item[0], item[1], item[2] = name, change[3], change[4]
+                item.code = code
+        elif op == "del" and item is not None:
+            del index[key]
+            products[category].remove(item)
+            if not products[category]:
+                del products[category]
+
+
+def build_index(products):
+    return {
+        (category, item[0].lower()): item
+        for category, items in products.items() for item in items
+    }
+
+
+def replay(products, path):
+    """Apply every complete record of the WAL at path to products, return the record count"""
+    if not os.path.exists(path):
+        return 0
+    index = build_index(products)
+    count = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # torn by a crash mid-append
+            apply(products, json.loads(line), index)
+            count += 1
+    return count
+
+
+def append(path, line):
+    """Append a record, first cutting off any torn record left by a crash"""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    if size:
+        with open(path, "rb+") as f:
+            f.seek(size - 1)
+            if f.read(1) != b"\n":
+                f.seek(0)
+                data = f.read()
+                f.truncate(data.rfind(b"\n") + 1)
+    return durable.append(path, line)
+
+
+def drop_prefix(path, offset):
+    """Atomically remove the first offset bytes of the WAL once a snapshot covers them"""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        tail = f.read()
+    durable.atomic_write(path, tail)
@@ -0,0 +1,58 @@
+import os
+import json
+from model import durable
+from model.file_lock import file_lock
+from model.promotions import validate_rule
+
+
+class PromotionModel:
+    PROMOTIONS_FILE = "promotions.txt"
+
+    @classmethod
+    def _load(cls):
+        if not os.path.exists(cls.PROMOTIONS_FILE):
+            return []
+        with open(cls.PROMOTIONS_FILE, "r") as f:
+            data = f.read()
+        try:
+            return json.loads(data) if data.strip() else []
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Promotions file '{cls.PROMOTIONS_FILE}' is corrupt: {e}")
+
+    @classmethod
+    def _save(cls, rules):
+        durable.atomic_write(cls.PROMOTIONS_FILE, json.dumps(rules, indent=2))
+
+    @classmethod
+    def version(cls):
+        """Changes whenever the rule set does, to tell when to recompile it"""
+        try:
+            st = os.stat(cls.PROMOTIONS_FILE)
+        except OSError:
+            return None
+        return (os.path.abspath(cls.PROMOTIONS_FILE), st.st_mtime_ns, st.st_size, st.st_ino)
+
+    @classmethod
+    def get_rules(cls):
+        return cls._load()
+
+    @classmethod
+    def add_rule(cls, rule):
+        """Store a promotion rule (see model.promotions), returns its id"""
+        rule = validate_rule(dict(rule))
+        with file_lock(cls.PROMOTIONS_FILE):
+            rules = cls._load()
+            rule["id"] = max((existing["id"] for existing in rules), default=0) + 1
+            rules.append(rule)
+            cls._save(rules)
+        return rule["id"]
+
+    @classmethod
+    def delete_rule(cls, rule_id):
+        with file_lock(cls.PROMOTIONS_FILE):
+            rules = cls._load()
+            kept = [rule for rule in rules if rule["id"] != rule_id]
+            if len(kept) == len(rules):
+                raise ValueError(f"Promotion {rule_id} not found")
+            cls._save(kept)
+        return True
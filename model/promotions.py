@@ -0,0 +1,198 @@
+from bisect import bisect_right
+from datetime import datetime
+
+# Promotion rules and the engine that prices a basket with them.
+#
+# A rule is a dict:
+#
+#   type      "percent" (value % off), "fixed" (value off each unit) or
+#             "buy_x_get_y" (for every buy + get units, get are free)
+#   scope     "product" (category + product name), "category" or "basket"
+#   value     for percent and fixed; buy and get for buy_x_get_y
+#   start, end             optional "YYYY-MM-DD[ HH:MM:SS]" window, end excluded
+#   payment_method         optional, the rule only applies to that method
+#   name                   optional label shown on receipts
+#
+# Each line gets the single best product or category deal that applies to
+# it, then the best basket deal is taken off what is left. Deals do not
+# stack, so adding a rule can never make a basket more expensive.
+#
+# PromotionEngine compiles the rules into lookup tables for one payment
+# method and one stretch of time between window boundaries: a table per
+# product and per category, each holding only the deals that can win (the
+# best percent, the best fixed and the distinct buy-x-get-y ratios). Pricing
+# then does a couple of dict lookups per line, whatever the number of rules.
+
+TYPES = ("percent", "fixed", "buy_x_get_y")
+SCOPES = ("product", "category", "basket")
+
+
+def parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid promotion time '{value}'")
+
+
+def validate_rule(rule):
+    """Check a rule dict, raising ValueError if it is malformed. Returns the rule."""
+    kind, scope = rule.get("type"), rule.get("scope")
+    if kind not in TYPES:
+        raise ValueError(f"Unknown promotion type '{kind}'")
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown promotion scope '{scope}'")
+    if scope in ("product", "category") and not rule.get("category"):
+        raise ValueError("Product and category promotions need a category")
+    if scope == "product" and not rule.get("product"):
+        raise ValueError("Product promotions need a product name")
+    if kind == "buy_x_get_y":
+        if scope == "basket":
+            raise ValueError("Buy X get Y promotions apply to a product or a category")
+        if not isinstance(rule.get("buy"), int) or not isinstance(rule.get("get"), int) \
+                or rule["buy"] < 1 or rule["get"] < 1:
+            raise ValueError("Buy X get Y promotions need whole buy and get counts")
+    else:
+        value = rule.get("value")
+        if not isinstance(value, (int, float)) or value <= 0 or (kind == "percent" and value > 100):
+            raise ValueError(f"Invalid promotion value '{value}'")
+    start = parse_time(rule["start"]) if rule.get("start") else None
+    end = parse_time(rule["end"]) if rule.get("end") else None
+    if start and end and start >= end:
+        raise ValueError("Promotion ends before it starts")
+    return rule
+
+
+def rule_discount(rule, price, quantity):
+    """Discount a line-level rule gives on quantity units at price"""
+    kind = rule["type"]
+    if kind == "percent":
+        return price * quantity * rule["value"] / 100
+    if kind == "fixed":
+        return min(rule["value"], price) * quantity
+    free = quantity // (rule["buy"] + rule["get"]) * rule["get"]
+    return free * price
+
+
+def basket_discount(rule, amount):
+    if rule["type"] == "percent":
+        return amount * rule["value"] / 100
+    return min(rule["value"], amount)
+
+
+def _prune(rules):
+    """Keep only the rules of a table that can give the best deal"""
+    best = {}
+    ratios = {}
+    for rule in rules:
+        if rule["type"] == "buy_x_get_y":
+            ratios.setdefault((rule["buy"], rule["get"]), rule)
+        elif rule["type"] not in best or rule["value"] > best[rule["type"]]["value"]:
+            best[rule["type"]] = rule
+    return tuple(best.values()) + tuple(ratios.values())
+
+
+class Tables:
+    """The rules in force for one payment method over one stretch of time"""
+
+    __slots__ = ("by_product", "by_category", "basket")
+
+    def __init__(self, rules):
+        by_product, by_category, basket = {}, {}, []
+        for rule in rules:
+            if rule["scope"] == "product":
+                by_product.setdefault((rule["category"], rule["product"].lower()), []).append(rule)
+            elif rule["scope"] == "category":
+                by_category.setdefault(rule["category"], []).append(rule)
+            else:
+                basket.append(rule)
+        self.by_product = {key: _prune(found) for key, found in by_product.items()}
+        self.by_category = {key: _prune(found) for key, found in by_category.items()}
+        self.basket = _prune(basket)
+
+
+class Pricing:
+    """A priced basket: per-line discounts, the basket deal and the totals"""
+
+    __slots__ = ("lines", "basket_rule", "subtotal", "line_discount", "basket_discount")
+
+    def __init__(self, lines, basket_rule, subtotal, line_discount, basket_discount):
+        self.lines = lines                # [(category, name, price, quantity, discount, rule)]
+        self.basket_rule = basket_rule
+        self.subtotal = subtotal
+        self.line_discount = line_discount
+        self.basket_discount = basket_discount
+
+    @property
+    def discount(self):
+        return self.line_discount + self.basket_discount
+
+    @property
+    def total(self):
+        return self.subtotal - self.discount
+
+
+class PromotionEngine:
+    """
+    Prices baskets against a fixed set of rules. Build a new engine when the
+    rules change; the lookup tables for each (payment method, time) are
+    compiled on first use and kept.
+    """
+
+    MAX_TABLES = 64
+
+    def __init__(self, rules):
+        self.rules = [validate_rule(rule) for rule in rules]
+        self._windows = []
+        boundaries = set()
+        for rule in self.rules:
+            start = parse_time(rule["start"]) if rule.get("start") else None
+            end = parse_time(rule["end"]) if rule.get("end") else None
+            self._windows.append((start, end))
+            boundaries.update(moment for moment in (start, end) if moment is not None)
+        self._boundaries = sorted(boundaries)
+        self._tables = {}
+
+    def tables(self, payment_method=None, when=None):
+        """The compiled Tables for a payment method at a time (default now)"""
+        when = when or datetime.now()
+        segment = bisect_right(self._boundaries, when)
+        key = (payment_method, segment)
+        tables = self._tables.get(key)
+        if tables is None:
+            if len(self._tables) >= self.MAX_TABLES:
+                self._tables.clear()
+            active = [
+                rule for rule, (start, end) in zip(self.rules, self._windows)
+                if (start is None or start <= when) and (end is None or when < end)
+                and rule.get("payment_method") in (None, payment_method)
+            ]
+            tables = self._tables[key] = Tables(active)
+        return tables
+
+    def price(self, lines, payment_method=None, when=None):
+        """
+        Price (category, name, price, quantity) lines; category may be None
+        for lines that only basket deals apply to. Returns a Pricing.
+        """
+        tables = self.tables(payment_method, when)
+        priced = []
+        subtotal = line_discount = 0.0
+        for category, name, price, quantity in lines:
+            best, best_rule = 0.0, None
+            for table in (tables.by_product.get((category, name.lower()), ()),
+                          tables.by_category.get(category, ())):
+                for rule in table:
+                    discount = rule_discount(rule, price, quantity)
+                    if discount > best:
+                        best, best_rule = discount, rule
+            subtotal += price * quantity
+            line_discount += best
+            priced.append((category, name, price, quantity, best, best_rule))
+
+        remaining = subtotal - line_discount
+        basket, basket_rule = 0.0, None
+        for rule in tables.basket:
+            discount = basket_discount(rule, remaining)
+            if discount > basket:
+                basket, basket_rule = discount, rule
+        return Pricing(priced, basket_rule, subtotal, line_discount, basket)
@@ -0,0 +1,216 @@
+import os
+import logging
+from datetime import date, timedelta
+from model.bill_model import BillModel
+from model.bill_columns import StringTable, LINE_FIELDS, HEAD_FIELDS, local_seconds
+
+# NumPy is listed in requirements.txt. With it the record files are
+# memory-mapped and every report is a handful of vectorized bincount/mask
+# operations, well under a second over millions of line items. Without it
+# the same reports still work over array.array columns in plain Python, but
+# row by row and many times slower (seconds at that size), so a warning is
+# logged when that fallback is used.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+EPOCH_DAY = date(1970, 1, 1)
+
+if np is not None:
+    LINE_DTYPE = np.dtype([
+        ("bill", "<u4"), ("product", "<u4"), ("ts", "<i8"), ("price", "<f8"),
+        ("qty", "<u4"), ("category", "<u4"), ("cashier", "<u4"), ("payment", "<u4"),
+    ])
+    HEAD_DTYPE = np.dtype([
+        ("bill", "<u4"), ("n_lines", "<u4"), ("ts", "<i8"), ("total", "<f8"),
+        ("discount", "<f8"), ("cashier", "<u4"), ("payment", "<u4"),
+    ])
+
+
+class SalesAnalytics:
+    """
+    Sales reports over the columnar bill files written by BillModel.save_bill.
+    Data is read lazily on first use and can be limited to a start/end
+    datetime window (inclusive). Call refresh() to pick up new bills.
+    """
+
+    def __init__(self, bill_model=BillModel, start=None, end=None):
+        if np is None:
+            logger.warning("NumPy is not installed; sales reports fall back to slow pure-Python loops")
+        self.bill_model = bill_model
+        self.start = start
+        self.end = end
+        self._lines = None
+        self._heads = None
+        self._strings = None
+
+    def refresh(self):
+        self._lines = None
+        self._heads = None
+        self._strings = None
+
+    # Loading
+
+    @property
+    def strings(self):
+        if self._strings is None:
+            self._strings = StringTable.open(self.bill_model._strings_file()).strings
+        return self._strings
+
+    @property
+    def lines(self):
+        if self._lines is None:
+            self._lines = self._load("line")
+        return self._lines
+
+    @property
+    def heads(self):
+        if self._heads is None:
+            self._heads = self._load("head")
+        return self._heads
+
+    def _load(self, kind):
+        """
+        Return a dict of field name -> column, filtered to committed bills in
+        range, over the closed segments' record files and the active one.
+        """
+        last_bill = self.bill_model._last_bill_number()
+        lo = local_seconds(self.start) if self.start else None
+        hi = local_seconds(self.end) if self.end else None
+
+        if np is not None:
+            dtype = LINE_DTYPE if kind == "line" else HEAD_DTYPE
+            parts = []
+            for path in self.bill_model._column_files(kind + "s"):
+                count = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+                if count:
+                    parts.append(np.memmap(path, dtype=dtype, mode="r", shape=(count,)))
+            if not parts:
+                return {name: np.zeros(0, dtype=dtype[name]) for name in dtype.names}
+            records = parts[0] if len(parts) == 1 else np.concatenate(parts)
+            mask = records["bill"] <= last_bill
+            if lo is not None:
+                mask &= records["ts"] >= lo
+            if hi is not None:
+                mask &= records["ts"] <= hi
+            if mask.all():
+                return {name: records[name] for name in dtype.names}
+            return {name: records[name][mask] for name in dtype.names}
+
+        if kind == "line":
+            columns = self.bill_model.load_line_columns()
+            fields = LINE_FIELDS
+        else:
+            columns = self.bill_model.load_head_columns()
+            fields = HEAD_FIELDS
+        keep = [
+            i for i, (bill, ts) in enumerate(zip(columns.bill, columns.ts))
+            if bill <= last_bill and (lo is None or ts >= lo) and (hi is None or ts <= hi)
+        ]
+        return {name: [getattr(columns, name)[i] for i in keep] for name in fields}
+
+    # Aggregation helpers
+
+    @staticmethod
+    def _group_sum(keys, weights, size=0):
+        """Sum weights per integer key, returns a sequence indexed by key"""
+        if np is not None:
+            return np.bincount(np.asarray(keys, dtype=np.int64), weights=weights, minlength=size)
+        totals = [0.0] * max(size, (max(keys) + 1) if keys else 0)
+        for key, weight in zip(keys, weights):
+            totals[key] += weight
+        return totals
+
+    @staticmethod
+    def _sum(column):
+        if np is not None:
+            return float(np.sum(column))
+        return float(sum(column))
+
+    @staticmethod
+    def _revenue(lines):
+        if np is not None:
+            return lines["price"] * lines["qty"]
+        return [price * qty for price, qty in zip(lines["price"], lines["qty"])]
+
+    def _named(self, totals):
+        """Map non-zero per-id totals back to their strings"""
+        return {self.strings[i]: float(value) for i, value in enumerate(totals) if value}
+
+    # Reports
+
+    def daily_revenue(self):
+        """Revenue (bill totals after discount) per calendar day, as {date: amount}"""
+        heads = self.heads
+        if not len(heads["ts"]):
+            return {}
+        if np is not None:
+            days = heads["ts"] // 86400
+            first = int(days.min())
+            totals = self._group_sum(days - first, heads["total"])
+        else:
+            days = [ts // 86400 for ts in heads["ts"]]
+            first = min(days)
+            totals = self._group_sum([d - first for d in days], heads["total"])
+        return {
+            EPOCH_DAY + timedelta(days=first + offset): float(value)
+            for offset, value in enumerate(totals) if value
+        }
+
+    def hourly_revenue(self):
+        """Revenue per hour of day (0-23) across the period, as a list of 24 amounts"""
+        heads = self.heads
+        if np is not None:
+            hours = (heads["ts"] // 3600) % 24
+        else:
+            hours = [(ts // 3600) % 24 for ts in heads["ts"]]
+        return [float(value) for value in self._group_sum(hours, heads["total"], 24)]
+
+    def top_products(self, n=10, by="revenue"):
+        """The n best sellers as (product, value) pairs, by 'revenue' or 'quantity'"""
+        lines = self.lines
+        weights = self._revenue(lines) if by == "revenue" else lines["qty"]
+        if np is not None:
+            weights = np.asarray(weights, dtype=np.float64)
+        totals = self._group_sum(lines["product"], weights, len(self.strings))
+        if np is not None:
+            order = np.argsort(totals)[::-1][:n]
+        else:
+            order = sorted(range(len(totals)), key=totals.__getitem__, reverse=True)[:n]
+        return [(self.strings[i], float(totals[i])) for i in order if totals[i]]
+
+    def category_mix(self):
+        """Share of line revenue per category, as {category: fraction}"""
+        lines = self.lines
+        totals = self._group_sum(lines["category"], self._revenue(lines), len(self.strings))
+        overall = self._sum(totals)
+        if not overall:
+            return {}
+        return {name: value / overall for name, value in self._named(totals).items()}
+
+    def average_basket_size(self):
+        """Average lines and items (units) per bill"""
+        bills = len(self.heads["bill"])
+        if not bills:
+            return {"lines": 0.0, "items": 0.0}
+        return {
+            "lines": self._sum(self.heads["n_lines"]) / bills,
+            "items": self._sum(self.lines["qty"]) / bills,
+        }
+
+    def payment_split(self):
+        """Bill count and revenue per payment method"""
+        heads = self.heads
+        size = len(self.strings)
+        if np is not None:
+            counts = self._group_sum(heads["payment"], None, size)
+        else:
+            counts = self._group_sum(heads["payment"], [1] * len(heads["payment"]), size)
+        revenue = self._group_sum(heads["payment"], heads["total"], size)
+        return {
+            self.strings[i] or "Unknown": {"bills": int(counts[i]), "revenue": float(revenue[i])}
+            for i in range(len(counts)) if counts[i]
+        }
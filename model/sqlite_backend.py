@@ -0,0 +1,715 @@
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from model import product_shards, product_wal, stock_table
+from model.bill_model import BillModel
+from model.product import Product, from_catalog, parse_sort
+from model.product_index import MAX_KEY
+from model.promotions import validate_rule
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_key TEXT NOT NULL,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL,
+    code TEXT,
+    UNIQUE (category, name_key)
+);
+CREATE INDEX IF NOT EXISTS idx_products_name_key ON products (name_key);
+
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL DEFAULT 'cashier'
+);
+
+CREATE TABLE IF NOT EXISTS bills (
+    bill_number INTEGER PRIMARY KEY,
+    total REAL NOT NULL,
+    date TEXT NOT NULL,
+    payment_method TEXT,
+    discount REAL NOT NULL DEFAULT 0,
+    cashier TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_bills_date ON bills (date);
+
+CREATE TABLE IF NOT EXISTS bill_lines (
+    bill_number INTEGER NOT NULL REFERENCES bills (bill_number),
+    product TEXT NOT NULL,
+    category TEXT NOT NULL,
+    price REAL NOT NULL,
+    quantity INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bill_lines_bill ON bill_lines (bill_number);
+
+CREATE TABLE IF NOT EXISTS promotions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rule TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS daily_sales (
+    day TEXT PRIMARY KEY,
+    bills INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    discount REAL NOT NULL,
+    items INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_category_sales (
+    day TEXT NOT NULL,
+    category TEXT NOT NULL,
+    revenue REAL NOT NULL,
+    items INTEGER NOT NULL,
+    PRIMARY KEY (day, category)
+);
+CREATE TABLE IF NOT EXISTS daily_cashier_sales (
+    day TEXT NOT NULL,
+    cashier TEXT NOT NULL,
+    bills INTEGER NOT NULL,
+    revenue REAL NOT NULL,
+    PRIMARY KEY (day, cashier)
+);
+"""
+
+# Statements that fold one bill into the daily aggregate tables
+SUMMARY_UPSERTS = (
+    """INSERT INTO daily_sales (day, bills, revenue, discount, items) VALUES (:day, 1, :total, :discount, :items)
+       ON CONFLICT (day) DO UPDATE SET bills = bills + 1, revenue = revenue + :total,
+           discount = discount + :discount, items = items + :items""",
+    """INSERT INTO daily_cashier_sales (day, cashier, bills, revenue) VALUES (:day, :cashier, 1, :total)
+       ON CONFLICT (day, cashier) DO UPDATE SET bills = bills + 1, revenue = revenue + :total""",
+)
+CATEGORY_UPSERT = """
+    INSERT INTO daily_category_sales (day, category, revenue, items) VALUES (?, ?, ?, ?)
+    ON CONFLICT (day, category) DO UPDATE SET revenue = revenue + excluded.revenue, items = items + excluded.items
+"""
+
+# Columns added after the first release, applied to older databases on open
+UPGRADES = {
+    "products": [
+        ("code", "TEXT"),
+    ],
+    "bills": [
+        ("payment_method", "TEXT"),
+        ("discount", "REAL NOT NULL DEFAULT 0"),
+        ("cashier", "TEXT"),
+    ],
+}
+# Indexes over upgraded columns, created once the columns exist
+UPGRADE_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_products_code ON products (code);
+CREATE INDEX IF NOT EXISTS idx_products_price ON products (price, name_key);
+CREATE INDEX IF NOT EXISTS idx_products_quantity ON products (quantity, name_key);
+"""
+
+
+class SqliteDatabase:
+    """Shared SQLite connection used by the SQLite product/user/bill models"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        # The connection is shared by threads (see controller.async_controller),
+        # a transaction must not interleave with another thread's statements
+        self.lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        for table, columns in UPGRADES.items():
+            existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            for column, definition in columns:
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        self.conn.executescript(UPGRADE_INDEXES)
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements in one write transaction"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    @contextmanager
+    def read(self):
+        """
+        Run the enclosed reads between other threads' transactions, so they
+        never see another thread's uncommitted rows; fetch results inside
+        """
+        with self.lock:
+            yield self.conn
+
+    def close(self):
+        self.conn.close()
+
+
+class SqliteProductModel:
+    """Product storage in SQLite with the same surface as ProductModel"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def _normalize(name):
+        return name.lower()
+
+    @staticmethod
+    def _normalize_code(code):
+        if code is None:
+            return None
+        return str(code).strip() or None
+
+    def _raise_code_taken(self, conn, code):
+        row = conn.execute("SELECT category, name FROM products WHERE code = ?", (code,)).fetchone()
+        raise ValueError(f"Code '{code}' is already used by '{row[1]}' in category '{row[0]}'")
+
+    def add_product(self, category, name, price, quantity, code=None):
+        if not category or not name or price <= 0 or quantity < 0:
+            raise ValueError("Invalid product data")
+        code = self._normalize_code(code)
+
+        with self.db.transaction() as conn:
+            if code is not None and conn.execute("SELECT 1 FROM products WHERE code = ?", (code,)).fetchone():
+                self._raise_code_taken(conn, code)
+            try:
+                conn.execute(
+                    "INSERT INTO products (category, name, name_key, price, quantity, code) VALUES (?, ?, ?, ?, ?, ?)",
+                    (category, name, self._normalize(name), price, quantity, code))
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Product '{name}' already exists in category '{category}'")
+        return True
+
+    def update_product(self, category, name, new_price, new_quantity, new_code=None):
+        """new_code None keeps the product's code, an empty string removes it"""
+        if not category or not name or new_price <= 0 or new_quantity < 0:
+            raise ValueError("Invalid product data")
+
+        with self.db.transaction() as conn:
+            if new_code is None:
+                cur = conn.execute(
+                    "UPDATE products SET price = ?, quantity = ? WHERE category = ? AND name_key = ?",
+                    (new_price, new_quantity, category, self._normalize(name)))
+            else:
+                code = self._normalize_code(new_code)
+                try:
+                    cur = conn.execute(
+                        "UPDATE products SET price = ?, quantity = ?, code = ? WHERE category = ? AND name_key = ?",
+                        (new_price, new_quantity, code, category, self._normalize(name)))
+                except sqlite3.IntegrityError:
+                    self._raise_code_taken(conn, code)
+            if cur.rowcount == 0:
+                self._raise_missing(conn, category, name)
+        return True
+
+    def delete_product(self, category, name):
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                "DELETE FROM products WHERE category = ? AND name_key = ?",
+                (category, self._normalize(name)))
+            if cur.rowcount == 0:
+                self._raise_missing(conn, category, name)
+        return True
+
+    def _raise_missing(self, conn, category, name):
+        row = conn.execute("SELECT 1 FROM products WHERE category = ? LIMIT 1", (category,)).fetchone()
+        if row is None:
+            raise ValueError(f"Category '{category}' not found")
+        raise ValueError(f"Product '{name}' not found in category '{category}'")
+
+    def get_all_products(self):
+        products = {}
+        with self.db.read() as conn:
+            rows = conn.execute("SELECT category, name, price, quantity, code FROM products ORDER BY id").fetchall()
+        for category, name, price, quantity, code in rows:
+            products.setdefault(category, []).append(Product(name, price, quantity, code))
+        return products
+
+    SORT_COLUMNS = {"category": "category", "name": "name_key", "price": "price", "stock": "quantity"}
+
+    def query_products(self, category=None, min_price=None, max_price=None, min_stock=None,
+                       max_stock=None, name_prefix=None, sort="category", offset=0, limit=50):
+        """
+        One page of the products matching every given filter, in sort order,
+        like ProductModel.query_products. The price and quantity indexes
+        serve the range filters and sorts.
+        Returns (number of matching products, [(category, Product)]).
+        """
+        sort = parse_sort(sort)
+        if offset < 0 or limit < 0:
+            raise ValueError("Offset and limit must not be negative")
+        where, params = [], []
+        for condition, value in (("category = ?", category), ("price >= ?", min_price),
+                                 ("price <= ?", max_price), ("quantity >= ?", min_stock),
+                                 ("quantity <= ?", max_stock)):
+            if value is not None:
+                where.append(condition)
+                params.append(value)
+        if name_prefix is not None:
+            # A range rather than LIKE, so the name_key index is used
+            prefix = self._normalize(name_prefix)
+            where.append("name_key >= ? AND name_key < ?")
+            params += [prefix, prefix + MAX_KEY]
+        where = f" WHERE {' AND '.join(where)}" if where else ""
+        keys = sort + [(key, False) for key in ("name", "category") if key not in dict(sort)]
+        order = ", ".join(self.SORT_COLUMNS[key] + (" DESC" if descending else "") for key, descending in keys)
+        with self.db.read() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM products{where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT category, name, price, quantity, code FROM products{where} "
+                f"ORDER BY {order} LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+        return total, [(row[0], Product(*row[1:])) for row in rows]
+
+    def get_products_page(self, offset=0, limit=50, sort="category"):
+        """One page of the whole catalog in sort order, returns (total product count, [(category, Product)])"""
+        return self.query_products(sort=sort, offset=offset, limit=limit)
+
+    def get_products_by_category(self, category):
+        """Get all products in a category"""
+        with self.db.read() as conn:
+            rows = conn.execute(
+                "SELECT name, price, quantity, code FROM products WHERE category = ? ORDER BY id",
+                (category,)).fetchall()
+        return [Product(*row) for row in rows]
+
+    def get_product(self, category, name):
+        """Get a specific product (name match is case-insensitive)"""
+        with self.db.read() as conn:
+            row = conn.execute(
+                "SELECT name, price, quantity, code FROM products WHERE category = ? AND name_key = ?",
+                (category, self._normalize(name))).fetchone()
+        return Product(*row) if row else None
+
+    def get_product_by_code(self, code):
+        """Look a product up by its barcode/SKU, returns (category, Product) or None"""
+        code = self._normalize_code(code)
+        if code is None:
+            return None
+        with self.db.read() as conn:
+            row = conn.execute(
+                "SELECT category, name, price, quantity, code FROM products WHERE code = ?", (code,)).fetchone()
+        return (row[0], Product(*row[1:])) if row else None
+
+    def reduce_stock(self, category, name, quantity):
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                "UPDATE products SET quantity = quantity - ? "
+                "WHERE category = ? AND name_key = ? AND quantity >= ?",
+                (quantity, category, self._normalize(name), quantity))
+            if cur.rowcount == 0:
+                row = conn.execute(
+                    "SELECT 1 FROM products WHERE category = ? AND name_key = ?",
+                    (category, self._normalize(name))).fetchone()
+                if row is None:
+                    raise ValueError(f"Product '{name}' not found in category '{category}'")
+                raise ValueError(f"Insufficient stock for '{name}'")
+        return True
+
+    def reduce_stock_batch(self, lines):
+        """
+        Reduce stock for several (category, name, quantity) lines in one
+        transaction. Any failing line rolls back the whole batch.
+        """
+        results = []
+        with self.db.transaction() as conn:
+            for category, name, quantity in lines:
+                if quantity <= 0:
+                    raise ValueError(f"Invalid quantity for '{name}'")
+                key = self._normalize(name)
+                cur = conn.execute(
+                    "UPDATE products SET quantity = quantity - ? "
+                    "WHERE category = ? AND name_key = ? AND quantity >= ?",
+                    (quantity, category, key, quantity))
+                row = conn.execute(
+                    "SELECT name, price, quantity, code FROM products WHERE category = ? AND name_key = ?",
+                    (category, key)).fetchone()
+                if row is None:
+                    raise ValueError(f"Product '{name}' not found in category '{category}'")
+                if cur.rowcount == 0:
+                    raise ValueError(f"Insufficient stock for '{name}'")
+                results.append({
+                    "category": category,
+                    "name": row[0],
+                    "price": row[1],
+                    "quantity": quantity,
+                    "remaining": row[2],
+                    "code": row[3],
+                })
+        return results
+
+    def restore_stock_batch(self, lines):
+        """Put back stock taken by reduce_stock_batch, e.g. when a checkout fails"""
+        with self.db.transaction() as conn:
+            for category, name, quantity in lines:
+                conn.execute(
+                    "UPDATE products SET quantity = quantity + ? WHERE category = ? AND name_key = ?",
+                    (quantity, category, self._normalize(name)))
+        return True
+
+    def get_price(self, name):
+        """Get the price of a product by name"""
+        with self.db.read() as conn:
+            row = conn.execute(
+                "SELECT price FROM products WHERE name_key = ? ORDER BY id LIMIT 1",
+                (self._normalize(name),)).fetchone()
+        if row is None:
+            raise ValueError(f"Product {name} not found")
+        return row[0]
+
+    def search(self, query, limit=10):
+        """
+        Find products by name: names starting with query (via the name_key
+        index), then names with a later word starting with it.
+        Returns up to limit (category, Product) pairs.
+        """
+        key = self._normalize(query.strip())
+        if not key or limit <= 0:
+            return []
+        with self.db.read() as conn:
+            rows = conn.execute(
+                "SELECT id, category, name, price, quantity, code FROM products "
+                "WHERE name_key >= ? AND name_key < ? ORDER BY name_key LIMIT ?",
+                (key, key + "\uffff", limit)).fetchall()
+            if len(rows) < limit:
+                # Names like "milk milkshake" match both ways, skip the ones already found
+                found = [row[0] for row in rows]
+                pattern = "% " + key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                rows += conn.execute(
+                    "SELECT id, category, name, price, quantity, code FROM products "
+                    f"WHERE name_key LIKE ? ESCAPE '\\' AND id NOT IN ({', '.join('?' * len(found))}) "
+                    "ORDER BY name_key LIMIT ?",
+                    (pattern, *found, limit - len(rows))).fetchall()
+        return [(row[1], Product(*row[2:])) for row in rows]
+
+
+class SqliteUserModel:
+    """Admin and cashier accounts in SQLite with the same surface as UserModel"""
+
+    DEFAULT_ADMIN = {
+        "username": "admin",
+        "password": hashlib.sha256("admin123".encode()).hexdigest()
+    }
+
+    def __init__(self, db):
+        self.db = db
+
+    def create_initial_admin(self):
+        """Create initial admin account if it doesn't exist"""
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, 'admin')",
+                (self.DEFAULT_ADMIN["username"], self.DEFAULT_ADMIN["password"]))
+
+    def add_user(self, username, password):
+        if not username or not password:
+            raise ValueError("Username and password are required")
+
+        if username.lower() == "admin":
+            raise ValueError("Cannot create user with username 'admin'")
+
+        hashed_password = hashlib.sha256(password.encode()).hexdigest()
+        try:
+            with self.db.transaction() as conn:
+                conn.execute(
+                    "INSERT INTO users (username, password, role) VALUES (?, ?, 'cashier')",
+                    (username, hashed_password))
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Username '{username}' already exists")
+        return True
+
+    def update_user(self, username, new_password):
+        if not username or not new_password:
+            raise ValueError("Username and new password are required")
+
+        if username.lower() == "admin":
+            raise ValueError("Cannot update admin password through this method")
+
+        hashed_password = hashlib.sha256(new_password.encode()).hexdigest()
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                "UPDATE users SET password = ? WHERE username = ? AND role = 'cashier'",
+                (hashed_password, username))
+            if cur.rowcount == 0:
+                raise ValueError(f"Username '{username}' not found")
+        return True
+
+    def delete_user(self, username):
+        if not username:
+            raise ValueError("Username is required")
+
+        if username.lower() == "admin":
+            raise ValueError("Cannot delete admin user")
+
+        with self.db.transaction() as conn:
+            cur = conn.execute("DELETE FROM users WHERE username = ? AND role = 'cashier'", (username,))
+            if cur.rowcount == 0:
+                raise ValueError(f"Username '{username}' not found")
+        return True
+
+    def get_all_users(self):
+        with self.db.read() as conn:
+            rows = conn.execute("SELECT username FROM users WHERE role = 'cashier' ORDER BY rowid").fetchall()
+        return [row[0] for row in rows]
+
+    def validate_user(self, username, password):
+        """
+        Validate user credentials for both admin and cashiers
+        Returns True if credentials are valid, False otherwise
+        """
+        self.create_initial_admin()
+        hashed_password = hashlib.sha256(password.encode()).hexdigest()
+        role = "admin" if username.lower() == "admin" else "cashier"
+        with self.db.read() as conn:
+            row = conn.execute(
+                "SELECT password FROM users WHERE username = ? AND role = ?",
+                ("admin" if role == "admin" else username, role)).fetchone()
+        return row is not None and row[0] == hashed_password
+
+
+class SqliteBillModel:
+    """Bill storage in SQLite with the same surface as BillModel"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def save_bill(self, total, lines=None, payment_method=None, discount=0.0, cashier=None):
+        """Save a bill with the given total and its lines"""
+        # Zero only for a sale promotions fully discounted
+        if total < 0 or (total == 0 and not discount):
+            raise ValueError("Total must be positive")
+
+        lines = lines or []
+        date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self.db.transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO bills (total, date, payment_method, discount, cashier) VALUES (?, ?, ?, ?, ?)",
+                (total, date, payment_method, discount, cashier))
+            bill_number = cur.lastrowid
+            conn.executemany(
+                "INSERT INTO bill_lines (bill_number, product, category, price, quantity) VALUES (?, ?, ?, ?, ?)",
+                [(bill_number, line["name"], line["category"], line["price"], line["quantity"])
+                 for line in lines])
+
+            # Keep the daily aggregates current in the same transaction
+            params = {
+                "day": date[:10], "total": total, "discount": discount or 0.0,
+                "items": sum(line["quantity"] for line in lines), "cashier": cashier or "",
+            }
+            for statement in SUMMARY_UPSERTS:
+                conn.execute(statement, params)
+            conn.executemany(CATEGORY_UPSERT, [
+                (date[:10], line["category"], line["price"] * line["quantity"], line["quantity"])
+                for line in lines
+            ])
+        return str(bill_number).zfill(4)
+
+    def get_daily_summary(self, start=None, end=None):
+        """Per-day totals from the aggregate tables, same shape as BillModel.get_daily_summary"""
+        where = "WHERE day >= ? AND day <= ?"
+        bounds = (start.isoformat() if start else "", end.isoformat() if end else "9999")
+        with self.db.read() as conn:
+            totals = conn.execute(
+                f"SELECT day, bills, revenue, discount, items FROM daily_sales {where} ORDER BY day", bounds).fetchall()
+            categories = conn.execute(
+                f"SELECT day, category, revenue, items FROM daily_category_sales {where}", bounds).fetchall()
+            cashiers = conn.execute(
+                f"SELECT day, cashier, bills, revenue FROM daily_cashier_sales {where}", bounds).fetchall()
+        days = {}
+        for day, bills, revenue, discount, items in totals:
+            days[day] = {"bills": bills, "revenue": revenue, "discount": discount, "items": items,
+                         "categories": {}, "cashiers": {}}
+        for day, category, revenue, items in categories:
+            days[day]["categories"][category] = {"revenue": revenue, "items": items}
+        for day, cashier, bills, revenue in cashiers:
+            days[day]["cashiers"][cashier] = {"bills": bills, "revenue": revenue}
+        return days
+
+    def rebuild_summary(self):
+        """
+        Regenerate the aggregate tables from bills and bill_lines.
+        Returns the list of differences found in the old aggregates.
+        """
+        from model import bill_summary
+        before = self.get_daily_summary()
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM daily_sales")
+            conn.execute("DELETE FROM daily_category_sales")
+            conn.execute("DELETE FROM daily_cashier_sales")
+            conn.execute("""
+                INSERT INTO daily_sales (day, bills, revenue, discount, items)
+                SELECT substr(b.date, 1, 10), COUNT(*), SUM(b.total), SUM(b.discount),
+                       COALESCE(SUM((SELECT SUM(quantity) FROM bill_lines l WHERE l.bill_number = b.bill_number)), 0)
+                FROM bills b GROUP BY substr(b.date, 1, 10)""")
+            conn.execute("""
+                INSERT INTO daily_category_sales (day, category, revenue, items)
+                SELECT substr(b.date, 1, 10), l.category, SUM(l.price * l.quantity), SUM(l.quantity)
+                FROM bill_lines l JOIN bills b ON b.bill_number = l.bill_number
+                GROUP BY substr(b.date, 1, 10), l.category""")
+            conn.execute("""
+                INSERT INTO daily_cashier_sales (day, cashier, bills, revenue)
+                SELECT substr(date, 1, 10), COALESCE(cashier, ''), COUNT(*), SUM(total)
+                FROM bills GROUP BY substr(date, 1, 10), COALESCE(cashier, '')""")
+        return bill_summary.differences(self.get_daily_summary(), before)
+
+    def get_bill_lines(self, bill_number):
+        """Returns the lines of one bill as (product, category, price, quantity) tuples"""
+        with self.db.read() as conn:
+            rows = conn.execute(
+                "SELECT product, category, price, quantity FROM bill_lines WHERE bill_number = ? ORDER BY rowid",
+                (int(bill_number),)).fetchall()
+        return [tuple(row) for row in rows]
+
+    def get_all_bills(self):
+        """Returns a list of tuples: (bill_number, total)"""
+        with self.db.read() as conn:
+            rows = conn.execute("SELECT bill_number, total FROM bills ORDER BY bill_number").fetchall()
+        return [tuple(row) for row in rows]
+
+
+class SqlitePromotionModel:
+    """Promotion rules in SQLite with the same surface as PromotionModel"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def version(self):
+        # Ids are never reused, so adds and deletes always change this pair
+        with self.db.read() as conn:
+            return tuple(conn.execute("SELECT COUNT(*), MAX(id) FROM promotions").fetchone())
+
+    def get_rules(self):
+        with self.db.read() as conn:
+            rows = conn.execute("SELECT id, rule FROM promotions ORDER BY id").fetchall()
+        rules = []
+        for rule_id, data in rows:
+            rule = json.loads(data)
+            rule["id"] = rule_id
+            rules.append(rule)
+        return rules
+
+    def add_rule(self, rule):
+        rule = validate_rule(dict(rule))
+        rule.pop("id", None)
+        with self.db.transaction() as conn:
+            cur = conn.execute("INSERT INTO promotions (rule) VALUES (?)", (json.dumps(rule),))
+        return cur.lastrowid
+
+    def delete_rule(self, rule_id):
+        with self.db.transaction() as conn:
+            cur = conn.execute("DELETE FROM promotions WHERE id = ?", (rule_id,))
+            if cur.rowcount == 0:
+                raise ValueError(f"Promotion {rule_id} not found")
+        return True
+
+
+class SqliteBackend:
+    """Storage backend that keeps products, users and bills in one SQLite file"""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.db = SqliteDatabase(path)
+        self.products = SqliteProductModel(self.db)
+        self.users = SqliteUserModel(self.db)
+        self.bills = SqliteBillModel(self.db)
+        self.promotions = SqlitePromotionModel(self.db)
+
+    def close(self):
+        self.db.close()
+
+
+def migrate_from_json(db, products_file="products.txt", cashiers_file="cashiers.txt",
+                      admin_file="admin.txt", bills_file="bills.txt", promotions_file="promotions.txt"):
+    """
+    Import the JSON text files into a SQLite database in one transaction.
+    Rows that already exist are left untouched, so running it twice is harmless.
+    Returns a dict with the number of rows read per table.
+    """
+    def read_json(path, default):
+        if not os.path.exists(path):
+            return default
+        with open(path, "r") as f:
+            data = f.read()
+        return json.loads(data) if data.strip() else default
+
+    if os.path.isdir(product_shards.shard_dir(products_file)):
+        products = product_shards.read_catalog(product_shards.shard_dir(products_file))
+    else:
+        products = from_catalog(read_json(products_file, {}))
+        product_wal.replay(products, products_file + ".wal")
+    stock_table.overlay(products, products_file + ".stock")
+    cashiers = read_json(cashiers_file, {})
+    admin = read_json(admin_file, None)
+    promotions = read_json(promotions_file, [])
+    class Ledger(BillModel):
+        BILLS_FILE = bills_file
+
+    bills = list(Ledger.iter_bills())
+
+    with db.transaction() as conn:
+        for category, items in products.items():
+            for item in items:
+                conn.execute(
+                    "INSERT OR IGNORE INTO products (category, name, name_key, price, quantity, code) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (category, item.name, item.name.lower(), item.price, item.quantity, item.code))
+        for username, password in cashiers.items():
+            conn.execute(
+                "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, 'cashier')",
+                (username, password))
+        if admin:
+            conn.execute(
+                "INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, 'admin')",
+                (admin["username"], admin["password"]))
+        for rule in promotions:
+            rule = dict(rule)
+            conn.execute("INSERT OR IGNORE INTO promotions (id, rule) VALUES (?, ?)",
+                         (rule.pop("id", None), json.dumps(rule)))
+        lines_by_bill = {}
+        columns = Ledger.load_line_columns()
+        for i, number in enumerate(columns.bill):
+            lines_by_bill.setdefault(number, []).append(
+                (number, columns.decode("product", i), columns.decode("category", i),
+                 columns.price[i], columns.qty[i]))
+        for bill in bills:
+            number = int(bill["bill_number"])
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO bills (bill_number, total, date, payment_method, discount, cashier) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (number, bill["total"], bill["date"], bill.get("payment_method"),
+                 bill.get("discount", 0), bill.get("cashier")))
+            if cur.rowcount:
+                conn.executemany(
+                    "INSERT INTO bill_lines (bill_number, product, category, price, quantity) VALUES (?, ?, ?, ?, ?)",
+                    lines_by_bill.get(number, []))
+
+    SqliteBillModel(db).rebuild_summary()
+    return {
+        "products": sum(len(items) for items in products.values()),
+        "users": len(cashiers) + (1 if admin else 0),
+        "bills": len(bills),
+        "promotions": len(promotions),
+    }
+
+
+if __name__ == "__main__":
+    # Usage: python -m model.sqlite_backend [database_path]
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "smart_mart.db"
+    database = SqliteDatabase(db_path)
+    counts = migrate_from_json(database)
+    database.close()
+    print(f"Imported {counts['products']} products, {counts['users']} users"
+          f", {counts['bills']} bills and {counts['promotions']} promotions into {db_path}")
@@ -0,0 +1,134 @@
+import os
+import mmap
+import struct
+import hashlib
+from contextlib import contextmanager, nullcontext
+from model import durable
+from model.file_lock import file_lock
+
+# Live stock quantities, kept out of the catalog file in a fixed-width
+# record file (products.txt.stock) that every process memory-maps:
+#
+#   slot i at offset i * RECORD.size: quantity (int64), product key (16 bytes)
+#
+# The key is a digest of the category and lowercased name, so any process
+# can find a product's slot by scanning the keys once; after that a read
+# or a sale is an 8-byte access at a fixed offset. Slots are only ever
+# appended, never reused, so a slot number stays valid for good.
+RECORD = struct.Struct("<q16s")
+QUANTITY = struct.Struct("<q")
+
+
+def product_key(category, name):
+    return hashlib.blake2b(f"{category}\0{name.lower()}".encode(), digest_size=16).digest()
+
+
+class StockTable:
+    """Memory-mapped view of a stock file, shared per path within a process"""
+
+    _tables = {}
+
+    def __init__(self, path):
+        self.path = path
+        self.slots = {}     # product key -> slot
+        self._names = {}    # (category, lowercased name) -> slot
+        self._map = None
+        self._size = 0
+        self._ino = None
+        self._held = False
+
+    @classmethod
+    def open(cls, path):
+        key = os.path.abspath(path)
+        table = cls._tables.get(key)
+        if table is None:
+            table = cls._tables[key] = cls(path)
+            table.refresh()
+        return table
+
+    def refresh(self):
+        """Map records appended by other processes since the last look"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None
+        size = st.st_size - st.st_size % RECORD.size if st else 0
+        ino = st.st_ino if st else None
+        if ino != self._ino or size < self._size:
+            # File replaced or truncated, start over
+            self.close()
+            self.slots, self._names, self._size, self._ino = {}, {}, 0, ino
+        if size == self._size:
+            return
+        if self._map is not None:
+            self._map.close()
+        with open(self.path, "r+b") as f:
+            self._map = mmap.mmap(f.fileno(), size)
+        for slot in range(self._size // RECORD.size, size // RECORD.size):
+            self.slots.setdefault(RECORD.unpack_from(self._map, slot * RECORD.size)[1], slot)
+        self._size = size
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    @contextmanager
+    def locked(self):
+        """Hold the stock file lock, for read-check-write sequences across processes"""
+        with file_lock(self.path):
+            self._held = True
+            try:
+                self.refresh()
+                yield self
+            finally:
+                self._held = False
+
+    def slot(self, category, name):
+        """Return the slot of a product, or None if it has none yet"""
+        name_key = (category, name.lower())
+        slot = self._names.get(name_key)
+        if slot is None:
+            slot = self.slots.get(product_key(category, name))
+            if slot is None:
+                self.refresh()
+                slot = self.slots.get(product_key(category, name))
+            if slot is not None:
+                self._names[name_key] = slot
+        return slot
+
+    def get(self, category, name):
+        """Live quantity of a product, or None if it has no slot"""
+        slot = self.slot(category, name)
+        if slot is None:
+            return None
+        return QUANTITY.unpack_from(self._map, slot * RECORD.size)[0]
+
+    def set(self, category, name, quantity):
+        """Write a quantity in place, appending a slot for a new product"""
+        slot = self.slot(category, name)
+        if slot is None:
+            with nullcontext() if self._held else file_lock(self.path):
+                slot = self.slot(category, name)
+                if slot is None:
+                    durable.append(self.path, RECORD.pack(quantity, product_key(category, name)))
+                    self.refresh()
+                    return
+        QUANTITY.pack_into(self._map, slot * RECORD.size, quantity)
+        if durable.FSYNC:
+            self._map.flush()
+
+
+def overlay(products, path):
+    """Replace the quantities of a catalog dict with the live ones from a stock file"""
+    if not os.path.exists(path):
+        return products
+    table = StockTable(path)
+    table.refresh()
+    for category, items in products.items():
+        for item in items:
+            quantity = table.get(category, item[0])
+            if quantity is not None:
+                item[2] = quantity
+    table.close()
+    return products
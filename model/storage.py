@@ -0,0 +1,49 @@
+import os
+from model.product_model import ProductModel
+from model.user_model import UserModel
+from model.bill_model import BillModel
+from model.promotion_model import PromotionModel
+
+# Backend selection, overridable from the environment:
+#   SMART_MART_BACKEND=json|sqlite   SMART_MART_DB=path/to/smart_mart.db
+#   SMART_MART_WAL=1   json backend: log catalog changes instead of rewriting products.txt
+#   SMART_MART_STOCK_TABLE=1   json backend: keep quantities in a memory-mapped stock file
+#   SMART_MART_SHARDED=1   json backend: one products file per category, loaded on demand
+DEFAULT_BACKEND = "json"
+DEFAULT_DB_PATH = "smart_mart.db"
+
+
+class JsonBackend:
+    """Storage backend using the JSON text files (products.txt, cashiers.txt, ...)"""
+
+    name = "json"
+
+    def __init__(self):
+        self.products = ProductModel
+        self.users = UserModel
+        self.bills = BillModel
+        self.promotions = PromotionModel
+
+    def close(self):
+        pass
+
+
+def open_backend(name=None, db_path=None):
+    """
+    Return a storage backend exposing .products, .users, .bills and .promotions.
+    Every backend offers the same methods as ProductModel, UserModel,
+    BillModel and PromotionModel.
+    """
+    name = (name or os.environ.get("SMART_MART_BACKEND") or DEFAULT_BACKEND).lower()
+    if name == "json":
+        if os.environ.get("SMART_MART_WAL") == "1":
+            ProductModel.WAL = True
+        if os.environ.get("SMART_MART_STOCK_TABLE") == "1":
+            ProductModel.STOCK_TABLE = True
+        if os.environ.get("SMART_MART_SHARDED") == "1":
+            ProductModel.SHARDED = True
+        return JsonBackend()
+    if name == "sqlite":
+        from model.sqlite_backend import SqliteBackend
+        return SqliteBackend(db_path or os.environ.get("SMART_MART_DB") or DEFAULT_DB_PATH)
+    raise ValueError(f"Unknown storage backend '{name}'")
@@ -1,6 +1,7 @@
 import os
 import json
 import hashlib
+from model import durable
 
 class UserModel:
     CASHIERS_FILE = "cashiers.txt"
@@ -16,29 +17,27 @@ class UserModel:
     def _init_admin(cls):
         """Initialize admin.txt with default credentials if it doesn't exist"""
         if not os.path.exists(cls.ADMIN_FILE):
-            with open(cls.ADMIN_FILE, "w") as f:
-                json.dump(cls.DEFAULT_ADMIN, f, indent=2)
+            durable.atomic_write(cls.ADMIN_FILE, json.dumps(cls.DEFAULT_ADMIN, indent=2))
 
     @classmethod
     def _load_cashiers(cls):
         """Load cashiers from file, create file if doesn't exist"""
         if not os.path.exists(cls.CASHIERS_FILE):
             # Create empty cashiers file
-            with open(cls.CASHIERS_FILE, "w") as f:
-                json.dump({}, f)
+            durable.atomic_write(cls.CASHIERS_FILE, json.dumps({}))
             return {}
+        with open(cls.CASHIERS_FILE, "r") as f:
+            data = f.read()
         try:
-            with open(cls.CASHIERS_FILE, "r") as f:
-                data = f.read()
-                return json.loads(data) if data else {}
-        except:
-            return {}
+            return json.loads(data) if data else {}
+        except json.JSONDecodeError as e:
+            # Don't treat a damaged file as "no cashiers", saving would erase them
+            raise ValueError(f"Cashiers file '{cls.CASHIERS_FILE}' is corrupt: {e}")
 
     @classmethod
     def _save_cashiers(cls, cashiers):
         """Save cashiers to file"""
-        with open(cls.CASHIERS_FILE, "w") as f:
-            json.dump(cashiers, f, indent=2)
+        durable.atomic_write(cls.CASHIERS_FILE, json.dumps(cashiers, indent=2))
 
     @classmethod
     def add_user(cls, username, password):
@@ -15,7 +15,8 @@ def setup_test_files(tmp_path):
         'products': 'products.txt',
         'cashiers': 'cashiers.txt',
         'admin': 'admin.txt',
-        'bills': 'bills.txt'
+        'bills': 'bills.txt',
+        'promotions': 'promotions.txt'
     }
     
     # Create test files in temporary directory
@@ -31,7 +32,7 @@ def setup_test_files(tmp_path):
             data = {}
         elif key == 'admin':
             data = {"username": "admin", "password": "240be518fabd2724ddb6f04eeb1da5967448d7e831c08c8fa822809f74c720a9"}  # admin123
-        elif key == 'bills':
+        elif key in ('bills', 'promotions'):
             data = []
             
         with open(test_path, 'w') as f:
@@ -41,11 +42,13 @@ def setup_test_files(tmp_path):
     from model.product_model import ProductModel
     from model.user_model import UserModel
     from model.bill_model import BillModel
+    from model.promotion_model import PromotionModel
     
     ProductModel.PRODUCTS_FILE = test_files['products']
     UserModel.CASHIERS_FILE = test_files['cashiers']
     UserModel.ADMIN_FILE = test_files['admin']
     BillModel.BILLS_FILE = test_files['bills']
+    PromotionModel.PROMOTIONS_FILE = test_files['promotions']
     
     yield test_files
     
@@ -0,0 +1,121 @@
+import time
+import threading
+from controller.async_controller import AsyncController
+from controller.events import EventBus
+
+class FakeRoot:
+    """Stands in for tk.Tk: after() callbacks run when pump() is called"""
+    def __init__(self):
+        self.scheduled = []
+        self.reported = []
+        self.thread = threading.get_ident()
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def report_callback_exception(self, kind, error, tb):
+        self.reported.append(error)
+
+    def pump(self, until, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not until():
+            assert time.monotonic() < deadline, "timed out"
+            scheduled, self.scheduled = self.scheduled, []
+            for callback in scheduled:
+                callback()
+            time.sleep(0.005)
+
+class SlowController:
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calls = []
+
+    def checkout(self, lines):
+        self.gate.wait(5)
+        self.calls.append(lines)
+        return {"bill_number": len(self.calls)}
+
+    def search_products(self, query):
+        if query == "sl":
+            self.gate.wait(5)
+        return [query]
+
+    def fail(self):
+        raise ValueError("boom")
+
+class Button:
+    def __init__(self):
+        self.state = "normal"
+
+    def configure(self, state):
+        self.state = state
+
+def test_results_are_delivered_on_the_tk_thread():
+    """Test that callbacks run from root.after, with busy and widget state around them"""
+    root, controller = FakeRoot(), SlowController()
+    busy, results = [], []
+    tasks = AsyncController(controller, root, on_busy=busy.append)
+    button = Button()
+
+    tasks.call("checkout", ["line"], widgets=[button],
+               on_done=lambda receipt: results.append((threading.get_ident(), receipt)))
+    assert busy == [True] and tasks.busy and button.state == "disabled"
+    controller.gate.set()
+    root.pump(lambda: results)
+
+    assert results == [(root.thread, {"bill_number": 1})]
+    assert busy == [True, False] and not tasks.busy and button.state == "normal"
+    tasks.shutdown()
+
+def test_duplicates_are_joined_or_replaced():
+    """Test that a repeat joins the running call, or replaces it and drops the stale result"""
+    root, controller = FakeRoot(), SlowController()
+    tasks = AsyncController(controller, root, max_workers=3)
+    paid, shown = [], []
+
+    first = tasks.call("checkout", ["line"], key="checkout", on_done=paid.append)
+    assert tasks.call("checkout", ["line"], key="checkout", on_done=paid.append) is first
+
+    tasks.call("search_products", "sl", key="search", policy="replace", on_done=shown.append)
+    tasks.call("search_products", "slo", key="search", policy="replace", on_done=shown.append)
+    root.pump(lambda: shown)
+    controller.gate.set()
+    root.pump(lambda: paid and not tasks.busy)
+
+    assert paid == [{"bill_number": 1}] and controller.calls == [["line"]]
+    assert shown == [["slo"]]
+    tasks.shutdown()
+
+def test_errors_go_to_on_error_or_tk():
+    """Test error delivery"""
+    root = FakeRoot()
+    tasks = AsyncController(SlowController(), root)
+    errors = []
+    tasks.call("fail", on_error=errors.append)
+    tasks.call("fail")
+    root.pump(lambda: not tasks.busy)
+    assert [str(e) for e in errors] == ["boom"]
+    assert [str(e) for e in root.reported] == ["boom"]
+    tasks.shutdown()
+
+def test_events_are_handled_on_the_tk_thread_before_on_done():
+    """Test that listen() hands worker-thread events to the Tk thread ahead of the call's result"""
+    root = FakeRoot()
+    bus = EventBus()
+    controller = SlowController()
+    controller.publish = lambda: (bus.publish("changed"), "done")[1]
+    tasks = AsyncController(controller, root)
+    order = []
+    unlisten = tasks.listen(bus, lambda event: order.append((event, threading.get_ident())))
+
+    tasks.call("publish", on_done=lambda result: order.append((result, threading.get_ident())))
+    root.pump(lambda: not tasks.busy)
+    assert order == [("changed", root.thread), ("done", root.thread)]
+
+    # Published on the Tk thread itself: handled right away
+    bus.publish("local")
+    assert order[-1] == ("local", root.thread)
+    unlisten()
+    bus.publish("ignored")
+    assert len(order) == 3
+    tasks.shutdown()
@@ -1,7 +1,8 @@
 import pytest
 from model.bill_model import BillModel
 import json
-from datetime import datetime
+import multiprocessing
+from datetime import datetime, timedelta
 
 def test_save_bill(setup_test_files):
     """Test saving a new bill"""
@@ -11,7 +12,7 @@ def test_save_bill(setup_test_files):
     
     # Verify bill was saved
     with open(BillModel.BILLS_FILE, 'r') as f:
-        bills = json.load(f)
+        bills = [json.loads(line) for line in f]
     
     assert len(bills) == 1
     bill = bills[0]
@@ -39,7 +40,7 @@ def test_save_multiple_bills(setup_test_files):
     
     # Verify bills were saved
     with open(BillModel.BILLS_FILE, 'r') as f:
-        bills = json.load(f)
+        bills = [json.loads(line) for line in f]
     
     assert len(bills) == len(totals)
     
@@ -80,8 +81,310 @@ def test_bill_persistence(setup_test_files):
     
     # Verify both bills exist
     with open(BillModel.BILLS_FILE, 'r') as f:
-        bills = json.load(f)
+        bills = [json.loads(line) for line in f]
     
     assert len(bills) == 2
     assert any(b['bill_number'] == bill_number1 and b['total'] == total1 for b in bills)
-    assert any(b['bill_number'] == bill_number2 and b['total'] == total2 for b in bills) 
\ No newline at end of file
+    assert any(b['bill_number'] == bill_number2 and b['total'] == total2 for b in bills) 
+def test_legacy_bills_file_is_migrated(setup_test_files, monkeypatch):
+    """Test that a JSON array bills file is converted to the line ledger"""
+    # Keep the old bills in the active ledger instead of rotating them out
+    monkeypatch.setattr(BillModel, "PARTITION", None)
+    legacy = [
+        {"bill_number": "0001", "total": 2.7, "date": "2025-05-28 19:27:09"},
+        {"bill_number": "0002", "total": 620.0, "date": "2025-05-28 20:42:16"}
+    ]
+    with open(BillModel.BILLS_FILE, 'w') as f:
+        json.dump(legacy, f)
+
+    assert BillModel.save_bill(10.0) == "0003"
+
+    with open(BillModel.BILLS_FILE, 'r') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 3
+    assert json.loads(lines[0]) == legacy[0]
+    assert json.loads(lines[2])['bill_number'] == "0003"
+
+def test_corrupt_legacy_bills_file_is_kept(setup_test_files):
+    """Test that a legacy bills file that does not parse is reported, not replaced"""
+    damaged = '[{"bill_number": "0001", "total": 2.7, "date": "2025-05-28 19:27:09"}, {"bill_'
+    with open(BillModel.BILLS_FILE, 'w') as f:
+        f.write(damaged)
+
+    with pytest.raises(ValueError, match="corrupt"):
+        BillModel.get_all_bills()
+    with pytest.raises(ValueError, match="corrupt"):
+        BillModel.save_bill(10.0)
+    with open(BillModel.BILLS_FILE, 'r') as f:
+        assert f.read() == damaged
+
+def test_bill_number_from_trailer(setup_test_files):
+    """Test that numbering continues from the last ledger record"""
+    with open(BillModel.BILLS_FILE, 'w') as f:
+        f.write(json.dumps({"bill_number": "0999", "total": 1.0, "date": "2025-05-28 19:27:09"}) + "\n")
+
+    assert BillModel.save_bill(5.0) == "1000"
+    assert BillModel.save_bill(5.0) == "1001"
+
+def _write_ledger(count):
+    """Write count bills, one per hour starting 2025-01-01, and index them"""
+    with open(BillModel.BILLS_FILE, 'w') as f:
+        for i in range(count):
+            date = datetime(2025, 1, 1) + timedelta(hours=i)
+            bill = {"bill_number": str(i + 1).zfill(4), "total": float(i % 50 + 1),
+                    "date": date.strftime('%Y-%m-%d %H:%M:%S')}
+            f.write(json.dumps(bill) + "\n")
+    BillModel.rebuild_index()
+
+def test_get_all_bills(setup_test_files):
+    """Test that get_all_bills reads the real storage format"""
+    BillModel.save_bill(10.5)
+    BillModel.save_bill(20.0)
+    assert BillModel.get_all_bills() == [(1, 10.5), (2, 20.0)]
+
+def test_iter_bills_filters(setup_test_files, monkeypatch):
+    """Test date, total and limit filters of the streaming reader"""
+    monkeypatch.setattr(BillModel, "INDEX_EVERY", 16)
+    _write_ledger(1000)
+
+    start = datetime(2025, 1, 10)
+    end = datetime(2025, 1, 10, 23, 59, 59)
+    bills = list(BillModel.iter_bills(start=start, end=end))
+    assert len(bills) == 24
+    assert all(b["date"].startswith("2025-01-10") for b in bills)
+
+    bills = list(BillModel.iter_bills(start=start, end=end, min_total=10, max_total=20))
+    assert bills and all(10 <= b["total"] <= 20 for b in bills)
+
+    bills = list(BillModel.iter_bills(start=start, limit=5))
+    assert [b["bill_number"] for b in bills] == ["0217", "0218", "0219", "0220", "0221"]
+
+def test_iter_bills_seeks_with_index(setup_test_files, monkeypatch):
+    """Test that a range read starts near the first bill instead of the file start"""
+    monkeypatch.setattr(BillModel, "INDEX_EVERY", 16)
+    _write_ledger(1000)
+
+    with open(BillModel.BILLS_FILE, 'rb') as f:
+        offset = BillModel._seek_offset(f, "2025-02-01 00:00:00")
+        f.seek(offset)
+        first = json.loads(f.readline())
+    assert offset > 0
+    assert first["date"] < "2025-02-01 00:00:00"
+    assert int(first["bill_number"]) >= 745 - 16  # 2025-02-01 00:00 is bill 745
+
+def test_save_bill_with_lines(setup_test_files):
+    """Test that bill lines and payment details are stored in columns"""
+    lines = [
+        {"name": "Laptop", "category": "Electronics", "price": 999.99, "quantity": 1},
+        {"name": "Bread", "category": "Groceries", "price": 2.5, "quantity": 4},
+    ]
+    bill_number = BillModel.save_bill(909.99, lines, "Card", 101.11, "john")
+    BillModel.save_bill(5.0, lines[1:], "Cash", 0.0, "mary")
+
+    with open(BillModel.BILLS_FILE, 'r') as f:
+        header = json.loads(f.readline())
+    assert header['payment_method'] == "Card"
+    assert header['cashier'] == "john"
+    assert header['line_count'] == 2
+
+    assert BillModel.get_bill_lines(bill_number) == [
+        ("Laptop", "Electronics", 999.99, 1), ("Bread", "Groceries", 2.5, 4)]
+
+    columns = BillModel.load_line_columns()
+    assert len(columns) == 3
+    assert list(columns.bill) == [1, 1, 2]
+    assert list(columns.qty) == [1, 4, 4]
+    assert [columns.decode("product", i) for i in range(3)] == ["Laptop", "Bread", "Bread"]
+    assert columns.decode("payment", 2) == "Cash"
+
+    heads = BillModel.load_head_columns()
+    assert list(heads.n_lines) == [2, 1]
+    assert list(heads.discount) == [101.11, 0.0]
+
+def test_orphan_columns_are_dropped(setup_test_files):
+    """Test that lines written by a save that never reached the ledger are discarded"""
+    lines = [{"name": "Bread", "category": "Groceries", "price": 2.5, "quantity": 4}]
+    BillModel.save_bill(10.0, lines, "Cash")
+
+    # Simulate a crash after the columns were written but before the ledger record
+    with open(BillModel.BILLS_FILE, 'r') as f:
+        ledger = f.read()
+    BillModel.save_bill(10.0, lines, "Cash")
+    with open(BillModel.BILLS_FILE, 'w') as f:
+        f.write(ledger)
+
+    BillModel.save_bill(20.0, lines * 2, "Card")
+    columns = BillModel.load_line_columns()
+    assert list(columns.bill) == [1, 2, 2]
+    assert list(BillModel.load_head_columns().total) == [10.0, 20.0]
+
+def test_daily_summary_is_maintained(setup_test_files):
+    """Test that save_bill keeps the per-day aggregates current"""
+    bread = {"name": "Bread", "category": "Groceries", "price": 2.5, "quantity": 4}
+    laptop = {"name": "Laptop", "category": "Electronics", "price": 1000.0, "quantity": 1}
+    BillModel.save_bill(1010.0, [bread, laptop], "Cash", 0.0, "john")
+    BillModel.save_bill(9.0, [bread], "Card", 1.0, "mary")
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    day = BillModel.get_daily_summary()[today]
+    assert day["bills"] == 2
+    assert day["revenue"] == pytest.approx(1019.0)
+    assert day["discount"] == pytest.approx(1.0)
+    assert day["items"] == 9
+    assert day["categories"]["Groceries"] == {"revenue": 20.0, "items": 8}
+    assert day["cashiers"]["mary"] == {"bills": 1, "revenue": 9.0}
+
+    assert BillModel.get_daily_summary(end=datetime(2000, 1, 1).date()) == {}
+
+def test_rebuild_summary(setup_test_files):
+    """Test that rebuilding detects and repairs a damaged summary"""
+    bread = {"name": "Bread", "category": "Groceries", "price": 2.5, "quantity": 4}
+    BillModel.save_bill(10.0, [bread], "Cash", 0.0, "john")
+    BillModel.save_bill(10.0, [bread], "Cash", 0.0, "john")
+    assert BillModel.rebuild_summary() == []
+
+    with open(BillModel._summary_file(), 'r') as f:
+        summary = json.load(f)
+    day = next(iter(summary["days"].values()))
+    day["revenue"] = 5.0
+    with open(BillModel._summary_file(), 'w') as f:
+        json.dump(summary, f)
+
+    problems = BillModel.rebuild_summary()
+    assert len(problems) == 1 and "revenue" in problems[0]
+    assert next(iter(BillModel.get_daily_summary().values()))["revenue"] == 20.0
+
+def test_segment_rotation(setup_test_files):
+    """Test that bills from an earlier month are rotated into a gzip segment"""
+    _write_ledger(1000)  # 2025-01-01 .. 2025-02-11, all in the active ledger
+    bill_number = BillModel.save_bill(50.0)
+
+    # First save of this month closes the old bills into one segment
+    segments = BillModel.get_segments()
+    assert len(segments) == 1
+    footer = segments[0]
+    assert (footer["first_bill"], footer["last_bill"], footer["count"]) == (1, 1000, 1000)
+    assert footer["first_date"] == "2025-01-01 00:00:00"
+    assert footer["total"] == sum(float(i % 50 + 1) for i in range(1000))
+    assert footer["file"].endswith(".jsonl.gz")
+
+    with open(BillModel.BILLS_FILE, 'r') as f:
+        assert [json.loads(line)["bill_number"] for line in f] == [bill_number]
+    assert bill_number == "1001"
+
+    # Readers see archived and active bills together
+    assert len(BillModel.get_all_bills()) == 1001
+    bills = list(BillModel.iter_bills(start=datetime(2025, 1, 10), end=datetime(2025, 1, 10, 23, 59, 59)))
+    assert len(bills) == 24
+    assert list(BillModel.iter_bills(start=datetime.now().replace(day=1, hour=0, minute=0, second=0))) \
+        [-1]["bill_number"] == "1001"
+
+def test_range_query_skips_segments(setup_test_files, monkeypatch):
+    """Test daily rotation and that a range read opens only overlapping segments"""
+    from model import bill_segments
+    monkeypatch.setattr(BillModel, "PARTITION", "day")
+
+    clock = {"now": datetime(2025, 3, 1, 9, 0, 0)}
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock["now"]
+    monkeypatch.setattr("model.bill_model.datetime", FakeDatetime)
+
+    for day in (1, 2, 3, 4):
+        for hour in (9, 17):
+            clock["now"] = datetime(2025, 3, day, hour, 0, 0)
+            BillModel.save_bill(float(day))
+
+    segments = BillModel.get_segments()
+    assert [s["file"] for s in segments] == [
+        "2025-03-01-0001.jsonl.gz", "2025-03-02-0003.jsonl.gz", "2025-03-03-0005.jsonl.gz"]
+    assert [s["total"] for s in segments] == [2.0, 4.0, 6.0]
+
+    opened = []
+    original = bill_segments.iter_segment
+    def tracking(directory, footer):
+        opened.append(footer["file"])
+        return original(directory, footer)
+    monkeypatch.setattr("model.bill_model.iter_segment", tracking)
+
+    bills = list(BillModel.iter_bills(start=datetime(2025, 3, 2), end=datetime(2025, 3, 2, 23, 59, 59)))
+    assert [b["bill_number"] for b in bills] == ["0003", "0004"]
+    assert opened == ["2025-03-02-0003.jsonl.gz"]
+
+    # Active segment holds only day 4
+    assert [n for n, _ in BillModel.get_all_bills()][-2:] == [7, 8]
+    with open(BillModel.BILLS_FILE, 'r') as f:
+        assert len(f.readlines()) == 2
+
+def test_columns_rotate_with_segments(setup_test_files, monkeypatch):
+    """Test that line and header columns move into the segments and stay readable"""
+    import os
+    monkeypatch.setattr(BillModel, "PARTITION", "day")
+    clock = {"now": datetime(2025, 3, 1, 9, 0, 0)}
+    class FakeDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return clock["now"]
+    monkeypatch.setattr("model.bill_model.datetime", FakeDatetime)
+
+    for day in (1, 2, 3):
+        for quantity in (1, 2):
+            clock["now"] = datetime(2025, 3, day, 9 + quantity, 0, 0)
+            line = {"name": f"Item {day}", "category": "Groceries", "price": 1.0, "quantity": quantity}
+            BillModel.save_bill(float(quantity), [line], "Cash")
+
+    segments = BillModel.get_segments()
+    assert [(s["lines"], s["heads"]) for s in segments] == [
+        ("2025-03-01-0001.lines", "2025-03-01-0001.heads"),
+        ("2025-03-02-0003.lines", "2025-03-02-0003.heads")]
+    assert os.path.getsize(BillModel._lines_file()) == 2 * 40  # day 3 only
+
+    assert BillModel.get_bill_lines("0002") == [("Item 1", "Groceries", 1.0, 2)]
+    assert BillModel.get_bill_lines("0003") == [("Item 2", "Groceries", 1.0, 1)]
+    assert BillModel.get_bill_lines("0006") == [("Item 3", "Groceries", 1.0, 2)]
+    assert BillModel.get_bill_lines("0007") == []
+    assert list(BillModel.load_line_columns().bill) == [1, 2, 3, 4, 5, 6]
+    assert list(BillModel.load_head_columns().total) == [1.0, 2.0] * 3
+    assert BillModel.get_daily_summary()["2025-03-02"]["items"] == 3
+
+def test_summary_log_is_appended(setup_test_files, monkeypatch):
+    """Test that saving a bill appends to the summary log instead of rewriting the summary"""
+    import os
+    bread = {"name": "Bread", "category": "Groceries", "price": 2.5, "quantity": 4}
+    BillModel.save_bill(10.0, [bread], "Cash", 0.0, "john")
+    with open(BillModel._summary_file(), 'r') as f:
+        base = f.read()
+    BillModel.save_bill(10.0, [bread], "Cash", 0.0, "john")
+    BillModel.save_bill(10.0, [bread], "Cash", 0.0, "john")
+
+    with open(BillModel._summary_file(), 'r') as f:
+        assert f.read() == base
+    with open(BillModel._summary_file() + ".log", 'r') as f:
+        assert len(f.readlines()) == 2
+    assert next(iter(BillModel.get_daily_summary().values()))["revenue"] == 30.0
+
+    # A long log is folded into the summary file
+    monkeypatch.setattr(BillModel, "SUMMARY_LOG_BYTES", 1)
+    BillModel.save_bill(10.0, [bread], "Cash", 0.0, "john")
+    assert not os.path.exists(BillModel._summary_file() + ".log")
+    with open(BillModel._summary_file(), 'r') as f:
+        assert json.load(f)["last_bill"] == 4
+
+
+def _save_bills(path, count):
+    """Worker for the concurrent numbering test"""
+    BillModel.BILLS_FILE = path
+    for _ in range(count):
+        BillModel.save_bill(1.0)
+
+def test_concurrent_bill_numbers_are_unique(setup_test_files):
+    """Test that lanes saving bills at the same time never share a number"""
+    workers = [multiprocessing.Process(target=_save_bills, args=(BillModel.BILLS_FILE, 50)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    numbers = [number for number, _ in BillModel.get_all_bills()]
+    assert sorted(numbers) == list(range(1, 201))
@@ -0,0 +1,103 @@
+import pytest
+from controller.cart import Cart
+from controller.main_controller import MainController
+
+def test_cart_merges_lines_and_keeps_totals():
+    """Test that repeated products share a line and the subtotal follows every change"""
+    cart = Cart()
+    cart.add("Groceries", "Bread", 2.50, 2)
+    cart.add("Electronics", "Laptop", 1000.0)
+    cart.add("Groceries", "bread", 2.50, 1)
+
+    assert len(cart) == 2
+    assert cart[0] == ("Bread", 2.50, 3)
+    assert cart.line("Groceries", "BREAD").category == "Groceries"
+    assert cart.subtotal == pytest.approx(1007.50)
+
+    cart.set_quantity("Electronics", "Laptop", 2)
+    assert cart.subtotal == pytest.approx(2007.50)
+    cart.set_quantity("Groceries", "Bread", 0)
+    assert cart.checkout_lines() == [("Electronics", "Laptop", 2)]
+    cart.remove("Electronics", "Laptop")
+    assert not cart and cart.subtotal == 0
+
+    with pytest.raises(ValueError):
+        cart.remove("Electronics", "Laptop")
+    with pytest.raises(ValueError):
+        cart.add("Groceries", "Milk", 3.99, 0)
+    for quantity in (1.5, True, "2"):
+        with pytest.raises(ValueError, match="whole number"):
+            cart.add("Groceries", "Milk", 3.99, quantity)
+    cart.add("Groceries", "Milk", 3.99, 1)
+    with pytest.raises(ValueError, match="whole number"):
+        cart.set_quantity("Groceries", "Milk", 0.5)
+
+def test_cart_line_follows_price_change():
+    """Test that a line re-added at a new price is priced at the new price"""
+    cart = Cart()
+    cart.add("Groceries", "Milk", 4.00, 2)
+    cart.add("Groceries", "Milk", 3.50, 1)
+    assert cart[0] == ("Milk", 3.50, 3)
+    assert cart.subtotal == pytest.approx(10.50)
+
+def test_remove_checked_out_lines():
+    """Test that only the checked-out quantities leave the cart"""
+    cart = Cart()
+    cart.add("Groceries", "Bread", 2.50, 2)
+    cart.add("Groceries", "Milk", 3.99, 1)
+    sold = cart.checkout_lines()
+    snapshot = cart.copy()
+
+    # Scanned while the checkout was running
+    cart.add("Groceries", "Bread", 2.50, 1)
+    cart.add("Books", "Novel", 12.0, 1)
+    cart.remove_lines(sold)
+    assert cart.checkout_lines() == [("Groceries", "Bread", 1), ("Books", "Novel", 1)]
+    assert cart.subtotal == pytest.approx(14.50)
+    assert snapshot.checkout_lines() == sold
+
+def test_checkout_uses_the_cart_payment_method(setup_test_files):
+    """Test that a Card cart is charged the total it was priced at"""
+    controller = MainController()
+    controller.add_product("Groceries", "Bread", 2.50, 10)
+    cart = controller.new_cart("Card")
+    controller.add_to_cart("Groceries", "Bread", 8, cart=cart)
+    assert controller.calculate_total(cart) == pytest.approx(18.0)
+
+    receipt = controller.checkout(cart)
+    assert receipt["total"] == pytest.approx(18.0)
+    assert controller.checkout([("Groceries", "Bread", 1)])["total"] == pytest.approx(2.5)
+    assert [bill["payment_method"] for bill in controller.bills.iter_bills()] == ["Card", "Cash"]
+
+def test_controller_cart(setup_test_files):
+    """Test that the controller checks stock against the merged line and checks out a Cart"""
+    controller = MainController()
+    controller.add_product("Groceries", "Bread", 2.50, 5, code="111")
+    controller.add_product("Electronics", "Laptop", 1000.0, 2)
+    cart = controller.new_cart("Card")
+
+    controller.add_to_cart("Groceries", "bread", 3, cart=cart)
+    controller.add_to_cart_by_code("111", cart=cart)
+    with pytest.raises(ValueError) as exc:
+        controller.add_to_cart_by_code("111", 2, cart=cart)
+    assert "Only 5 items available" in str(exc.value)
+    with pytest.raises(ValueError):
+        controller.set_cart_quantity(cart, "Groceries", "Bread", 6)
+    controller.set_cart_quantity(cart, "Groceries", "Bread", 5)
+    controller.add_to_cart("Electronics", "Laptop", 1, cart=cart)
+
+    assert cart.subtotal == pytest.approx(1012.50)
+    assert controller.calculate_total(cart) == pytest.approx(911.25)  # Card 10%
+    receipt = controller.checkout(cart, "Card")
+    assert receipt["total"] == pytest.approx(911.25)
+    assert controller.get_product("Groceries", "Bread")[2] == 0
+    assert controller.get_product("Electronics", "Laptop")[2] == 1
+
+    # Fractional or boolean quantities, e.g. from a JSON client, are refused
+    with pytest.raises(ValueError, match="whole number"):
+        controller.add_to_cart("Electronics", "Laptop", 0.5)
+    with pytest.raises(ValueError, match="whole number"):
+        controller.set_cart_quantity(controller.new_cart(), "Electronics", "Laptop", True)
+    with pytest.raises(ValueError, match="whole number"):
+        controller.checkout([("Electronics", "Laptop", 0.5)], "Cash")
+    assert controller.get_product("Electronics", "Laptop")[2] == 1
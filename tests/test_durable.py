@@ -0,0 +1,129 @@
+import pytest
+import os
+import json
+import threading
+from model import durable
+from model.durable import GroupCommit, atomic_write
+from model.product_model import ProductModel
+from model.user_model import UserModel
+from model.bill_model import BillModel
+
+def test_atomic_write(tmp_path):
+    """Test that atomic_write replaces the file and leaves no temp files"""
+    directory = tmp_path / "durable"
+    directory.mkdir()
+    path = str(directory / "data.txt")
+    atomic_write(path, "old")
+    atomic_write(path, "new")
+
+    with open(path) as f:
+        assert f.read() == "new"
+    assert os.listdir(directory) == ["data.txt"]
+
+def test_atomic_write_failure_keeps_old_content(tmp_path, monkeypatch):
+    """Test that a failed replace leaves the previous content intact"""
+    directory = tmp_path / "durable"
+    directory.mkdir()
+    path = str(directory / "data.txt")
+    atomic_write(path, "old")
+
+    def crash(src, dst):
+        raise OSError("simulated crash")
+    monkeypatch.setattr(durable.os, "replace", crash)
+
+    with pytest.raises(OSError):
+        atomic_write(path, "new")
+    with open(path) as f:
+        assert f.read() == "old"
+    assert os.listdir(directory) == ["data.txt"]
+
+def test_fsync_mode(tmp_path, monkeypatch):
+    """Test that FSYNC syncs both appends and replaced files"""
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(durable, "FSYNC", True)
+    monkeypatch.setattr(durable.os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+
+    path = str(tmp_path / "ledger.txt")
+    durable.append(path, "one\n")
+    atomic_write(path, "two\n")
+    assert len(synced) == 3  # append, temp file, directory
+
+def test_group_commit_batches_concurrent_ops():
+    """Test that ops submitted together are flushed in one batch"""
+    flushed = []
+    def flush(ops):
+        flushed.append(list(ops))
+        return [(op * 2, None) for op in ops]
+    group = GroupCommit(flush)
+
+    results = {}
+    def worker(n):
+        results[n] = group.submit(n, 0.05)
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {n: n * 2 for n in range(8)}
+    assert len(flushed) < 8
+    assert sorted(op for batch in flushed for op in batch) == list(range(8))
+
+def test_group_commit_errors_are_per_op():
+    """Test that one failing op does not fail the rest of its batch"""
+    def flush(ops):
+        return [(None, ValueError("bad")) if op < 0 else (op, None) for op in ops]
+    group = GroupCommit(flush)
+
+    assert group.submit(3, 0) == 3
+    with pytest.raises(ValueError):
+        group.submit(-1, 0)
+
+def test_product_group_commit(setup_test_files, monkeypatch):
+    """Test concurrent product mutations sharing writes"""
+    monkeypatch.setattr(durable, "GROUP_COMMIT_WINDOW", 0.01)
+    ProductModel.add_product("Groceries", "Bread", 2.99, 100)
+    batches_before = ProductModel._group.batches
+
+    errors = []
+    def sell():
+        for _ in range(10):
+            ProductModel.reduce_stock("Groceries", "Bread", 1)
+    def oversell():
+        try:
+            ProductModel.reduce_stock("Groceries", "Bread", 1000)
+        except ValueError as e:
+            errors.append(e)
+    threads = [threading.Thread(target=sell) for _ in range(5)] + [threading.Thread(target=oversell)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 1
+    assert ProductModel._group.batches - batches_before < 51
+    with open(ProductModel.PRODUCTS_FILE) as f:
+        assert json.load(f)["Groceries"][0][2] == 50
+
+def test_corrupt_files_are_reported(setup_test_files):
+    """Test that damaged data files raise instead of looking empty"""
+    with open(ProductModel.PRODUCTS_FILE, 'w') as f:
+        f.write('{"Electronics": [["Lap')
+    with pytest.raises(ValueError) as exc:
+        ProductModel.get_all_products()
+    assert "corrupt" in str(exc.value)
+
+    with open(UserModel.CASHIERS_FILE, 'w') as f:
+        f.write('{"john": ')
+    with pytest.raises(ValueError):
+        UserModel.add_user("mary", "password123")
+
+def test_half_written_bill_is_isolated(setup_test_files):
+    """Test that a torn last ledger record does not swallow the next bill"""
+    BillModel.save_bill(10.0)
+    with open(BillModel.BILLS_FILE, 'a') as f:
+        f.write('{"bill_number": "0002", "tot')
+
+    assert BillModel.save_bill(20.0) == "0002"
+    assert BillModel.get_all_bills() == [(1, 10.0), (2, 20.0)]
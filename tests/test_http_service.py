@@ -0,0 +1,219 @@
+import json
+import socket
+import http.client
+import asyncio
+import threading
+from datetime import date
+import pytest
+from controller.main_controller import MainController
+from controller.http_service import ControllerService
+from controller.remote_controller import RemoteController, open_controller
+
+@pytest.fixture
+def server():
+    """A ControllerService on a free localhost port, run by a background event loop"""
+    service = ControllerService(MainController())
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    running = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        running["server"] = loop.run_until_complete(service.start("127.0.0.1", 0))
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert started.wait(5)
+    port = running["server"].sockets[0].getsockname()[1]
+    yield service, f"127.0.0.1:{port}"
+
+    asyncio.run_coroutine_threadsafe(service.shutdown(running["server"]), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+    service.close()
+
+def raw_request(method, args, token=None, connection="keep-alive", key=None):
+    body = json.dumps({"args": args}).encode()
+    auth = f"Authorization: Bearer {token}\r\n" if token else ""
+    if key:
+        auth += f"Idempotency-Key: {key}\r\n"
+    return (f"POST /api/{method} HTTP/1.1\r\nHost: localhost\r\n{auth}"
+            f"Connection: {connection}\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+def read_responses(sock):
+    """Read until the server closes, return [(status, payload)]"""
+    data = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    responses = []
+    while data:
+        head, _, rest = data.partition(b"\r\n\r\n")
+        lines = head.decode().split("\r\n")
+        headers = dict(line.split(": ", 1) for line in lines[1:])
+        length = int(headers["Content-Length"])
+        responses.append((int(lines[0].split()[1]), json.loads(rest[:length])))
+        data = rest[length:]
+    return responses
+
+def test_remote_controller_round_trip(server):
+    """Test that a lane can log in, look up, price and check out through the server"""
+    service, address = server
+    admin = RemoteController(address)
+    assert admin.validate_login("admin", "admin123") == "admin"
+    admin.add_product("Electronics", "Laptop", 1000.0, 5, "4006381333931")
+    admin.add_product("Groceries", "Apple", 0.5, 100)
+    admin.add_cashier("john", "secret")
+    assert admin.get_all_cashiers() == ["john"]
+    assert admin.get_all_products()["Electronics"][0].code == "4006381333931"
+
+    lane = RemoteController(address)
+    assert lane.validate_login("john", "wrong") is None
+    assert lane.validate_login("john", "secret") == "cashier"
+    assert lane.search_products("lap") == [("Electronics", ("Laptop", 1000.0, 5))]
+    assert lane.get_product("Groceries", "apple") == ("Apple", 0.5, 100)
+    assert lane.get_product_by_code("4006381333931") == ("Electronics", ("Laptop", 1000.0, 5))
+
+    assert lane.get_products_page(1, 5, "-price") == (2, [("Groceries", ("Apple", 0.5, 100))])
+    assert lane.query_products(max_price=10, sort=["-stock"]) == (1, [("Groceries", ("Apple", 0.5, 100))])
+
+    cart = lane.new_cart("Card")
+    lane.add_to_cart_by_code("4006381333931", 1, cart)
+    lane.add_to_cart("Groceries", "Apple", 10, cart)
+    with pytest.raises(ValueError, match="Only 5 items"):
+        lane.add_to_cart("Electronics", "Laptop", 5, cart)
+    pricing = lane.price_cart(cart)
+    assert pricing.subtotal == 1005.0
+    assert pricing.total == pytest.approx(904.5)
+
+    bill = lane.checkout(cart, "Card", cashier="someone else")
+    assert bill["total"] == pytest.approx(904.5)
+    assert lane.get_product("Electronics", "Laptop")[2] == 4
+    (day,) = admin.get_daily_summary(date.today(), date.today()).values()
+    assert list(day["cashiers"]) == ["john"]
+
+def test_login_and_roles_are_enforced(server):
+    """Test that calls need a session and management calls need an admin one"""
+    _, address = server
+    lane = RemoteController(address)
+    with pytest.raises(ValueError, match="Login required"):
+        lane.get_product("Electronics", "Laptop")
+
+    admin = RemoteController(address)
+    admin.validate_login("admin", "admin123")
+    admin.add_cashier("john", "secret")
+    lane.validate_login("john", "secret")
+    with pytest.raises(ValueError, match="admin"):
+        lane.add_product("Electronics", "Laptop", 1000.0, 5)
+
+    # Invalid input comes back as the controller's ValueError
+    with pytest.raises(ValueError, match="Cart is empty"):
+        admin._call("checkout", [], "Cash")
+    with pytest.raises(ValueError, match="not found"):
+        admin.delete_product("Electronics", "Missing")
+
+def test_pipelined_requests_are_answered_in_order(server):
+    """Test that requests sent back to back on one connection get answers in request order"""
+    _, address = server
+    admin = RemoteController(address)
+    admin.validate_login("admin", "admin123")
+    for i in range(20):
+        admin.add_product("Groceries", f"Item {i}", 1.0 + i, 10)
+
+    host, port = address.split(":")
+    with socket.create_connection((host, int(port)), timeout=5) as sock:
+        sock.sendall(b"".join(
+            [raw_request("get_product", ["Groceries", f"Item {i}"], admin.token) for i in range(20)]
+            + [raw_request("no_such_method", [], admin.token),
+               raw_request("get_product", ["Groceries", "Item 3"], connection="close")]))
+        responses = read_responses(sock)
+
+    assert [payload["result"][0] for _, payload in responses[:20]] == [f"Item {i}" for i in range(20)]
+    assert responses[20][0] == 404
+    assert responses[21] == (401, {"error": "Login required"})
+
+def test_checkout_with_idempotency_key_runs_once(server):
+    """Test that a repeated checkout with the same key gets the first receipt"""
+    _, address = server
+    admin = RemoteController(address)
+    admin.validate_login("admin", "admin123")
+    admin.add_product("Groceries", "Apple", 0.5, 100)
+
+    host, port = address.split(":")
+    checkout = raw_request("checkout", [[["Groceries", "Apple", 3]], "Cash"], admin.token, key="k1")
+    with socket.create_connection((host, int(port)), timeout=5) as sock:
+        sock.sendall(checkout + checkout + raw_request("get_product", ["Groceries", "Apple"], admin.token,
+                                                       connection="close"))
+        first, second, product = read_responses(sock)
+    assert first == second and first[0] == 200
+    assert product[1]["result"][2] == 97
+
+def test_lost_answers_are_retried_only_when_safe(server, monkeypatch):
+    """Test that a call whose answer was lost is sent again only if repeating it is harmless"""
+    _, address = server
+    admin = RemoteController(address)
+    admin.validate_login("admin", "admin123")
+    admin.add_product("Groceries", "Apple", 0.5, 100)
+
+    # The server runs each call, then the connection drops before the answer
+    lost = {"count": 0}
+    original = http.client.HTTPConnection.getresponse
+    def drop_first(connection):
+        response = original(connection)
+        if lost["count"] == 0:
+            lost["count"] += 1
+            response.read()
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        return response
+    monkeypatch.setattr(http.client.HTTPConnection, "getresponse", drop_first)
+
+    cart = admin.new_cart()
+    admin.add_to_cart("Groceries", "Apple", 2, cart)  # a read, retried
+    assert lost["count"] == 1
+    lost["count"] = 0
+    admin.checkout(cart, "Cash")  # retried, the server answers from the first run
+    assert admin.get_product("Groceries", "apple")[2] == 98
+
+    lost["count"] = 0
+    with pytest.raises(http.client.RemoteDisconnected):
+        admin.update_product("Groceries", "Apple", 0.6, 98)
+
+def test_sessions_expire(server):
+    """Test that a session unused for SESSION_TTL seconds needs a new login"""
+    service, address = server
+    lane = RemoteController(address)
+    lane.validate_login("admin", "admin123")
+    service.sessions[lane.token] = service.sessions[lane.token][:2] + (0,)
+    with pytest.raises(ValueError, match="Session expired"):
+        lane.get_all_cashiers()
+    with pytest.raises(ValueError, match="Login required"):
+        lane.get_all_cashiers()
+
+def test_controller_type_errors_are_server_errors(server, monkeypatch):
+    """Test that bad arguments answer 400 but a TypeError inside the controller answers 500"""
+    service, address = server
+    admin = RemoteController(address)
+    admin.validate_login("admin", "admin123")
+    with pytest.raises(ValueError, match="Bad arguments"):
+        admin._call("get_product", "Groceries")
+
+    def broken(category, name):
+        return None + 1
+    monkeypatch.setattr(service.controller, "get_product", broken)
+    with pytest.raises(RuntimeError, match="TypeError"):
+        admin.get_product("Groceries", "Apple")
+
+def test_open_controller_picks_the_server(monkeypatch, server):
+    """Test that SMART_MART_SERVER switches the views to a RemoteController"""
+    _, address = server
+    monkeypatch.delenv("SMART_MART_SERVER", raising=False)
+    assert isinstance(open_controller(), MainController)
+    monkeypatch.setenv("SMART_MART_SERVER", address)
+    controller = open_controller()
+    assert isinstance(controller, RemoteController)
+    assert controller.validate_login("admin", "admin123") == "admin"
@@ -24,7 +24,7 @@ def test_save_bill(controller, setup_test_files):
     
     # Verify bill was saved
     with open(controller.BillModel.BILLS_FILE, 'r') as f:
-        bills = json.load(f)
+        bills = [json.loads(line) for line in f]
     
     assert len(bills) == 1
     assert bills[0]['total'] == total
@@ -88,6 +88,21 @@ def test_cart_operations(controller, setup_test_files):
     product = controller.get_product("Electronics", "Laptop")
     assert product[2] == 3  # Original 5 - 2
 
+def test_scan_to_cart(controller, setup_test_files):
+    """Test adding to the cart by barcode (timed in benchmarks/barcode_scan.py)"""
+    catalog = {"Groceries": [[f"Item {i}", 1.0 + i % 7, 5, f"{4000000000000 + i}"] for i in range(100)]}
+    with open(setup_test_files['products'], 'w') as f:
+        json.dump(catalog, f)
+
+    assert controller.add_to_cart_by_code("4000000000042", 2) == ("Groceries", ("Item 42", 1.0, 2))
+    assert controller.get_product_by_code("4000000000042") == ("Groceries", ("Item 42", 1.0, 5))
+    with pytest.raises(ValueError) as exc:
+        controller.add_to_cart_by_code("4000000000042", 6)
+    assert "Only 5 items available" in str(exc.value)
+    with pytest.raises(ValueError) as exc:
+        controller.add_to_cart_by_code("123")
+    assert "No product with code" in str(exc.value)
+
 def test_product_queries(controller, setup_test_files, sample_products):
     """Test product query methods"""
     # Add sample products
@@ -108,6 +123,10 @@ def test_product_queries(controller, setup_test_files, sample_products):
     price = controller.get_product_price("Laptop")
     assert price == 999.99
 
+    # Test search_products
+    assert controller.search_products("smart") == [("Electronics", ("Smartphone", 599.99, 10))]
+    assert [p[0] for _, p in controller.search_products("brad")] == ["Bread"]
+
 def test_login_validation(controller, setup_test_files):
     """Test login validation through controller"""
     # Test admin login
@@ -149,4 +168,97 @@ def test_error_handling(controller, setup_test_files):
         controller.add_to_cart("Electronics", "NonexistentProduct", 1)
     
     with pytest.raises(ValueError):
-        controller.reduce_stock("Electronics", "NonexistentProduct", 1) 
\ No newline at end of file
+        controller.reduce_stock("Electronics", "NonexistentProduct", 1) 
+def test_checkout(controller, setup_test_files):
+    """Test selling a whole cart in one step"""
+    controller.add_product("Electronics", "Laptop", 1000.0, 5)
+    controller.add_product("Groceries", "Bread", 2.5, 20)
+
+    receipt = controller.checkout([("Electronics", "Laptop", 2), ("Groceries", "Bread", 4)], "Card")
+
+    assert receipt["bill_number"] == "0001"
+    assert receipt["subtotal"] == 2010.0
+    assert receipt["discount"] == pytest.approx(201.0)
+    assert receipt["total"] == pytest.approx(1809.0)
+    assert [(l["name"], l["quantity"], l["remaining"]) for l in receipt["lines"]] == [
+        ("Laptop", 2, 3), ("Bread", 4, 16)]
+
+    with open(setup_test_files['bills'], 'r') as f:
+        bills = [json.loads(line) for line in f]
+    assert bills[0]['total'] == pytest.approx(1809.0)
+
+def test_checkout_is_all_or_nothing(controller, setup_test_files):
+    """Test that a failing line leaves stock and bills untouched"""
+    controller.add_product("Electronics", "Laptop", 1000.0, 5)
+    controller.add_product("Groceries", "Bread", 2.5, 1)
+
+    with pytest.raises(ValueError) as exc:
+        controller.checkout([("Electronics", "Laptop", 2), ("Groceries", "Bread", 3)], "Cash")
+    assert "Insufficient stock" in str(exc.value)
+
+    assert controller.get_product("Electronics", "Laptop")[2] == 5
+    with open(setup_test_files['bills'], 'r') as f:
+        assert f.read().strip() in ("", "[]")
+
+def test_checkout_fully_discounted(controller, setup_test_files):
+    """Test that a basket promotions give away entirely is still sold and recorded"""
+    controller.add_product("Groceries", "Bread", 2.5, 10)
+    controller.add_promotion({"type": "percent", "scope": "product", "category": "Groceries",
+                              "product": "Bread", "value": 100})
+
+    receipt = controller.checkout([("Groceries", "Bread", 2)], "Cash")
+    assert receipt["total"] == 0 and receipt["discount"] == pytest.approx(5.0)
+    assert controller.get_product("Groceries", "Bread")[2] == 8
+    assert controller.bills.get_all_bills() == [(1, 0)]
+
+def test_checkout_reports_the_save_error(controller, setup_test_files, monkeypatch):
+    """Test that a failing stock restore does not hide why the bill was not saved"""
+    controller.add_product("Groceries", "Bread", 2.5, 10)
+    def save_bill(*args):
+        raise OSError("disk full")
+    def restore_stock_batch(lines):
+        raise RuntimeError("restore failed")
+    monkeypatch.setattr(controller.bills, "save_bill", save_bill)
+    monkeypatch.setattr(controller.products, "restore_stock_batch", restore_stock_batch)
+
+    with pytest.raises(OSError, match="disk full"):
+        controller.checkout([("Groceries", "Bread", 2)], "Cash")
+
+def test_checkout_records_lines(controller, setup_test_files):
+    """Test that checkout stores the sold lines with the bill"""
+    controller.add_product("Electronics", "Laptop", 1000.0, 5)
+    receipt = controller.checkout([("Electronics", "laptop", 2)], "Cash", "john")
+
+    assert controller.bills.get_bill_lines(receipt["bill_number"]) == [
+        ("Laptop", "Electronics", 1000.0, 2)]
+
+def test_change_events(controller, setup_test_files):
+    """Test that successful changes publish one event each, failed ones none"""
+    seen = []
+    unsubscribe = controller.events.subscribe(seen.append)
+
+    controller.add_product("Electronics", "Laptop", 1000.0, 5, " 123 ")
+    controller.update_product("Electronics", "laptop", 900.0, 4)
+    controller.checkout([("Electronics", "Laptop", 1)], "Cash")
+    with pytest.raises(ValueError):
+        controller.add_product("Electronics", "Laptop", 1.0, 1)
+    controller.add_cashier("john", "secret")
+    controller.delete_cashier("john")
+    controller.delete_product("Electronics", "Laptop")
+
+    assert [(e.kind, e.category, e.name, e.username) for e in seen] == [
+        ("product_added", "Electronics", "Laptop", None),
+        ("product_updated", "Electronics", "Laptop", None),
+        ("stock_changed", "Electronics", "Laptop", None),
+        ("cashier_added", None, None, "john"),
+        ("cashier_removed", None, None, "john"),
+        ("product_deleted", "Electronics", "Laptop", None),
+    ]
+    assert seen[0].product == ("Laptop", 1000.0, 5) and seen[0].product.code == "123"
+    # Events hold snapshots, not the live catalog records
+    assert seen[1].product == ("Laptop", 900.0, 4) and seen[1].product.code == "123"
+    assert seen[2].product[2] == 3 and seen[2].product.code == "123"
+
+    unsubscribe()
+    controller.add_cashier("jane", "secret")
+    assert len(seen) == 6
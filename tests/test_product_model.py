@@ -1,6 +1,13 @@
 import pytest
 from model.product_model import ProductModel
+import os
 import json
+import multiprocessing
+from model.stock_table import StockTable, RECORD
+from model.product import Product, to_json
+from model.product_search import SearchIndex
+from model.product_index import SortedIndex
+import random
 
 def test_add_product(setup_test_files):
     """Test adding a new product"""
@@ -170,4 +177,684 @@ def test_get_price(setup_test_files):
     
     # Test non-existent product
     with pytest.raises(ValueError):
-        ProductModel.get_price("NonexistentProduct") 
\ No newline at end of file
+        ProductModel.get_price("NonexistentProduct") 
+
+def test_catalog_cache_hits(setup_test_files):
+    """Test that repeated reads are served from the cache"""
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+    ProductModel.reset_cache_stats()
+
+    for _ in range(10):
+        ProductModel.get_products_by_category("Electronics")
+        ProductModel.get_price("Laptop")
+
+    info = ProductModel.cache_info()
+    assert info["misses"] == 0
+    assert info["hits"] == 20
+
+def test_catalog_cache_invalidated_by_external_write(setup_test_files):
+    """Test that the cache reloads when the file changes on disk"""
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+    ProductModel.get_all_products()
+    ProductModel.reset_cache_stats()
+
+    # Simulate another process rewriting the catalog
+    with open(ProductModel.PRODUCTS_FILE, 'w') as f:
+        json.dump({"Electronics": [["Laptop", 899.99, 5], ["Tablet", 299.99, 2]]}, f)
+
+    assert ProductModel.get_product("Electronics", "Tablet") == ("Tablet", 299.99, 2)
+    assert ProductModel.cache_info()["misses"] == 1
+
+def test_lookup_is_case_insensitive(setup_test_files):
+    """Test that reads and writes agree on case-insensitive names"""
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+
+    assert ProductModel.get_product("Electronics", "laptop") == ("Laptop", 999.99, 5)
+    assert ProductModel.get_price("LAPTOP") == 999.99
+
+    with pytest.raises(ValueError):
+        ProductModel.add_product("Electronics", "LAPTOP", 899.99, 1)
+
+def test_index_follows_mutations(setup_test_files):
+    """Test that the lookup index stays consistent across add/update/delete"""
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+    ProductModel.add_product("Groceries", "Bread", 2.99, 20)
+
+    ProductModel.update_product("Electronics", "laptop", 899.99, 7)
+    assert ProductModel.get_price("Laptop") == 899.99
+
+    ProductModel.delete_product("Electronics", "Laptop")
+    assert ProductModel.get_product("Electronics", "Laptop") is None
+    with pytest.raises(ValueError):
+        ProductModel.get_price("Laptop")
+
+    # Re-adding after delete must work and be found again
+    ProductModel.add_product("Electronics", "Laptop", 949.99, 1)
+    assert ProductModel.get_price("laptop") == 949.99
+    assert ProductModel.get_price("bread") == 2.99
+
+def test_reduce_stock_batch(setup_test_files):
+    """Test batch stock reduction with repeated lines"""
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+
+    # Two lines for the same product must be checked against the combined quantity
+    with pytest.raises(ValueError):
+        ProductModel.reduce_stock_batch([("Electronics", "Laptop", 3), ("Electronics", "laptop", 3)])
+    assert ProductModel.get_product("Electronics", "Laptop")[2] == 5
+
+    results = ProductModel.reduce_stock_batch([("Electronics", "Laptop", 3), ("Electronics", "laptop", 2)])
+    assert [r["remaining"] for r in results] == [2, 0]
+
+    with open(ProductModel.PRODUCTS_FILE, 'r') as f:
+        products = json.load(f)
+    assert products["Electronics"][0] == ["Laptop", 999.99, 0]
+
+
+def _sell_one_at_a_time(path, count, mode=None):
+    """Worker for the multi-lane stress test"""
+    ProductModel.PRODUCTS_FILE = path
+    ProductModel.WAL = mode == "wal"
+    ProductModel.STOCK_TABLE = mode == "stock"
+    ProductModel.SHARDED = mode == "sharded"
+    ProductModel.CHECKPOINT_EVERY = 100
+    ProductModel.CHECKPOINT_INTERVAL = 0
+    ProductModel.clear_cache()
+    for _ in range(count):
+        ProductModel.reduce_stock("Groceries", "Bread", 1)
+
+@pytest.mark.parametrize("mode", [None, "wal", "stock", "sharded"])
+def test_concurrent_stock_decrements(setup_test_files, monkeypatch, mode):
+    """Test that several processes decrementing the same stock lose no updates"""
+    monkeypatch.setattr(ProductModel, "WAL", mode == "wal")
+    monkeypatch.setattr(ProductModel, "STOCK_TABLE", mode == "stock")
+    monkeypatch.setattr(ProductModel, "SHARDED", mode == "sharded")
+    ProductModel.clear_cache()
+    lanes, sales = 4, 500
+    ProductModel.add_product("Groceries", "Bread", 2.99, lanes * sales + 10)
+    ProductModel.add_product("Groceries", "Milk", 3.99, 7)
+
+    workers = [
+        multiprocessing.Process(target=_sell_one_at_a_time, args=(ProductModel.PRODUCTS_FILE, sales, mode))
+        for _ in range(lanes)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    ProductModel.clear_cache()
+    assert ProductModel.get_product("Groceries", "Bread")[2] == 10
+    assert ProductModel.get_product("Groceries", "Milk")[2] == 7
+
+
+@pytest.fixture
+def wal_mode(monkeypatch):
+    monkeypatch.setattr(ProductModel, "WAL", True)
+    monkeypatch.setattr(ProductModel, "CHECKPOINT_EVERY", 0)
+    monkeypatch.setattr(ProductModel, "CHECKPOINT_INTERVAL", 0)
+    ProductModel.clear_cache()
+    yield
+    ProductModel.clear_cache()
+
+def _wal_lines():
+    with open(ProductModel.PRODUCTS_FILE + ".wal") as f:
+        return f.readlines()
+
+def test_wal_logs_changes_instead_of_rewriting(setup_test_files, wal_mode):
+    """Test that commits append to the WAL and a checkpoint folds it into the snapshot"""
+    with open(ProductModel.PRODUCTS_FILE) as f:
+        snapshot = f.read()
+
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+    ProductModel.add_product("Groceries", "Bread", 2.99, 20)
+    ProductModel.reduce_stock("Groceries", "bread", 3)
+    ProductModel.delete_product("Electronics", "Laptop")
+
+    with open(ProductModel.PRODUCTS_FILE) as f:
+        assert f.read() == snapshot
+    assert len(_wal_lines()) == 4
+
+    ProductModel.clear_cache()
+    assert ProductModel.get_product("Groceries", "Bread") == ("Bread", 2.99, 17)
+    assert ProductModel.get_product("Electronics", "Laptop") is None
+
+    assert ProductModel.checkpoint()
+    assert _wal_lines() == []
+    with open(ProductModel.PRODUCTS_FILE) as f:
+        assert json.load(f)["Groceries"] == [["Bread", 2.99, 17]]
+    assert ProductModel.cache_info()["loaded"]
+
+def test_wal_left_by_a_wal_run_is_not_lost(setup_test_files, wal_mode, monkeypatch):
+    """Test that turning WAL off and on again neither loses nor replays stale commits"""
+    ProductModel.add_product("Groceries", "Bread", 2.99, 20)
+
+    monkeypatch.setattr(ProductModel, "WAL", False)
+    ProductModel.clear_cache()
+    assert ProductModel.get_product("Groceries", "Bread") == ("Bread", 2.99, 20)
+    ProductModel.update_product("Groceries", "Bread", 3.5, 10)
+    ProductModel.add_product("Groceries", "Milk", 1.99, 5)
+    assert not os.path.exists(ProductModel.PRODUCTS_FILE + ".wal")
+
+    monkeypatch.setattr(ProductModel, "WAL", True)
+    ProductModel.clear_cache()
+    assert ProductModel.get_product("Groceries", "Bread") == ("Bread", 3.5, 10)
+    assert ProductModel.get_product("Groceries", "Milk") == ("Milk", 1.99, 5)
+
+def test_wal_background_checkpoint(setup_test_files, wal_mode, monkeypatch):
+    """Test that a checkpoint runs in the background every CHECKPOINT_EVERY records"""
+    monkeypatch.setattr(ProductModel, "CHECKPOINT_EVERY", 5)
+    ProductModel.add_product("Groceries", "Bread", 2.99, 20)
+    for _ in range(11):
+        ProductModel.reduce_stock("Groceries", "Bread", 1)
+        ProductModel._checkpointer and ProductModel._checkpointer.join()
+
+    assert len(_wal_lines()) < 12
+    ProductModel.clear_cache()
+    assert ProductModel.get_product("Groceries", "Bread")[2] == 9
+
+
+class Crash(Exception):
+    pass
+
+def _crash_at(monkeypatch, step):
+    """Make the step-th write of the durable layer die half way through"""
+    from model import durable
+    calls = {"count": 0}
+    real_append, real_write_temp, real_replace = durable.append, durable.write_temp, durable.replace
+
+    def tick():
+        calls["count"] += 1
+        return calls["count"] == step
+
+    def append(path, data):
+        if tick():
+            real_append(path, data[:len(data) // 2])
+            raise Crash()
+        return real_append(path, data)
+
+    def write_temp(path, data):
+        if tick():
+            real_write_temp(path, data[:len(data) // 2])
+            raise Crash()
+        return real_write_temp(path, data)
+
+    def replace(tmp_path, path):
+        if tick():
+            raise Crash()
+        return real_replace(tmp_path, path)
+
+    monkeypatch.setattr(durable, "append", append)
+    monkeypatch.setattr(durable, "write_temp", write_temp)
+    monkeypatch.setattr(durable, "replace", replace)
+    return calls
+
+WAL_SCRIPT = [
+    lambda: ProductModel.add_product("Electronics", "Laptop", 999.99, 5),
+    lambda: ProductModel.add_product("Groceries", "Bread", 2.99, 20),
+    lambda: ProductModel.reduce_stock("Groceries", "Bread", 3),
+    ProductModel.checkpoint,
+    lambda: ProductModel.update_product("Electronics", "Laptop", 899.99, 7),
+    lambda: ProductModel.reduce_stock_batch([("Electronics", "Laptop", 2), ("Groceries", "Bread", 1)]),
+    lambda: ProductModel.delete_product("Electronics", "Laptop"),
+    lambda: ProductModel.add_product("Electronics", "Laptop", 949.99, 1),
+    ProductModel.checkpoint,
+    lambda: ProductModel.restore_stock_batch([("Groceries", "Bread", 4)]),
+    lambda: ProductModel._save_products({"Books": [["Atlas", 25.0, 2]], "Groceries": [["Bread", 2.99, 1]]}),
+    lambda: ProductModel.add_product("Books", "Novel", 12.5, 3),
+]
+
+def test_wal_recovers_from_crash_at_every_step(setup_test_files, wal_mode, monkeypatch):
+    """Test that a crash at any write leaves the catalog at the last or the in-flight commit"""
+    with open(ProductModel.PRODUCTS_FILE) as f:
+        initial = f.read()
+
+    def reset_files():
+        with open(ProductModel.PRODUCTS_FILE, "w") as f:
+            f.write(initial)
+        if os.path.exists(ProductModel.PRODUCTS_FILE + ".wal"):
+            os.remove(ProductModel.PRODUCTS_FILE + ".wal")
+        ProductModel.clear_cache()
+
+    def catalog():
+        ProductModel.clear_cache()
+        return json.loads(json.dumps(ProductModel.get_all_products(), default=to_json))
+
+    # States after each step of a run without crashes
+    reset_files()
+    states = [catalog()]
+    for step in WAL_SCRIPT:
+        step()
+        states.append(catalog())
+
+    crash_point = 1
+    while True:
+        reset_files()
+        with monkeypatch.context() as patch:
+            calls = _crash_at(patch, crash_point)
+            done = 0
+            try:
+                for step in WAL_SCRIPT:
+                    step()
+                    done += 1
+            except Crash:
+                pass
+        if done == len(WAL_SCRIPT):
+            break
+
+        # "Restart": drop all in-memory state and recover from disk
+        recovered = catalog()
+        assert recovered in (states[done], states[done + 1]), f"crash at write {crash_point}"
+
+        # The recovered files must accept new commits
+        ProductModel.add_product("Clothing", "Scarf", 9.99, 1)
+        assert catalog()["Clothing"] == [["Scarf", 9.99, 1]]
+        crash_point += 1
+
+    assert crash_point > len(WAL_SCRIPT)
+
+
+@pytest.fixture
+def stock_table(monkeypatch):
+    monkeypatch.setattr(ProductModel, "STOCK_TABLE", True)
+    ProductModel.clear_cache()
+    yield
+    ProductModel.clear_cache()
+
+def test_stock_table_updates_in_place(setup_test_files, stock_table):
+    """Test that sales only touch the stock file, not the catalog"""
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+    ProductModel.add_product("Groceries", "Bread", 2.99, 20)
+    with open(ProductModel.PRODUCTS_FILE) as f:
+        catalog = f.read()
+    stock_file = ProductModel.PRODUCTS_FILE + ".stock"
+    assert os.path.getsize(stock_file) == 2 * RECORD.size
+
+    ProductModel.reduce_stock("Groceries", "bread", 3)
+    ProductModel.reduce_stock_batch([("Groceries", "Bread", 2), ("Electronics", "Laptop", 1)])
+    with pytest.raises(ValueError):
+        ProductModel.reduce_stock_batch([("Groceries", "Bread", 1), ("Electronics", "Laptop", 5)])
+    ProductModel.restore_stock_batch([("Electronics", "Laptop", 1)])
+
+    with open(ProductModel.PRODUCTS_FILE) as f:
+        assert f.read() == catalog
+    assert ProductModel.get_product("Groceries", "Bread") == ("Bread", 2.99, 15)
+    assert ProductModel.get_products_by_category("Electronics") == [("Laptop", 999.99, 5)]
+
+    # Another process only needs the stock file to read live quantities
+    reader = StockTable(stock_file)
+    reader.refresh()
+    assert reader.get("Groceries", "BREAD") == 15
+    ProductModel.reduce_stock("Groceries", "Bread", 1)
+    assert reader.get("Groceries", "Bread") == 14
+    reader.close()
+
+def test_stock_table_follows_catalog_edits(setup_test_files, stock_table):
+    """Test that updates, deletes and re-adds keep the stock table in step"""
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+    ProductModel.update_product("Electronics", "Laptop", 899.99, 8)
+    ProductModel.reduce_stock("Electronics", "Laptop", 2)
+    assert ProductModel.get_product("Electronics", "Laptop") == ("Laptop", 899.99, 6)
+
+    ProductModel.delete_product("Electronics", "Laptop")
+    ProductModel.add_product("Electronics", "Laptop", 949.99, 3)
+    ProductModel.clear_cache()
+    assert ProductModel.get_all_products()["Electronics"] == [["Laptop", 949.99, 3]]
+    # The re-added product keeps its slot
+    assert os.path.getsize(ProductModel.PRODUCTS_FILE + ".stock") == RECORD.size
+
+def test_stock_table_left_by_a_stock_table_run(setup_test_files, stock_table, monkeypatch):
+    """Test that turning STOCK_TABLE off and on again keeps the newest quantities"""
+    ProductModel.add_product("Groceries", "Bread", 2.99, 20)
+    ProductModel.reduce_stock("Groceries", "Bread", 5)
+
+    monkeypatch.setattr(ProductModel, "STOCK_TABLE", False)
+    ProductModel.clear_cache()
+    assert ProductModel.get_product("Groceries", "Bread")[2] == 15
+    ProductModel.update_product("Groceries", "Bread", 2.99, 40)
+    ProductModel.reduce_stock("Groceries", "Bread", 1)
+
+    monkeypatch.setattr(ProductModel, "STOCK_TABLE", True)
+    ProductModel.clear_cache()
+    assert ProductModel.get_product("Groceries", "Bread")[2] == 39
+
+def test_stock_table_adopts_existing_catalog(setup_test_files, stock_table):
+    """Test that quantities of a catalog written without the stock table are picked up"""
+    with open(ProductModel.PRODUCTS_FILE, 'w') as f:
+        json.dump({"Groceries": [["Bread", 2.99, 20], ["Milk", 3.99, 15]]}, f)
+
+    ProductModel.reduce_stock("Groceries", "Milk", 5)
+    assert ProductModel.get_product("Groceries", "Milk")[2] == 10
+    assert ProductModel.get_product("Groceries", "Bread")[2] == 20
+
+def test_product_record_acts_like_a_list():
+    """Test that Product supports the list operations callers relied on"""
+    product = Product("Laptop", 999.99, 5)
+    name, price, quantity = product
+    assert (name, price, quantity) == ("Laptop", 999.99, 5)
+    assert product == ["Laptop", 999.99, 5] and product == ("Laptop", 999.99, 5)
+    assert product[-1] == 5 and product[:2] == ("Laptop", 999.99)
+    product[2] -= 1
+    assert product.quantity == 4
+    assert not hasattr(product, "__dict__")
+
+def test_category_listing_is_a_view(setup_test_files):
+    """Test that listing a category hands out the cached records instead of copies"""
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+    ProductModel.add_product("Electronics", "Tablet", 299.99, 2)
+
+    products = ProductModel.get_products_by_category("Electronics")
+    assert products == [("Laptop", 999.99, 5), ("Tablet", 299.99, 2)]
+    assert products[0] is ProductModel.get_product("Electronics", "Laptop")
+    assert not hasattr(products, "append")
+    assert [p.name for p in products] == ["Laptop", "Tablet"]
+
+
+@pytest.fixture
+def sharded(monkeypatch):
+    monkeypatch.setattr(ProductModel, "SHARDED", True)
+    with open(ProductModel.PRODUCTS_FILE, 'w') as f:
+        json.dump({
+            "Electronics": [["Laptop", 999.99, 5], ["Tablet", 299.99, 2]],
+            "Groceries": [["Bread", 2.99, 20], ["Milk", 3.99, 15]],
+        }, f)
+    ProductModel.clear_cache()
+    yield ProductModel.PRODUCTS_FILE + ".d"
+    ProductModel.clear_cache()
+
+def test_sharded_catalog_loads_categories_on_demand(setup_test_files, sharded):
+    """Test that reading one category only opens its shard"""
+    assert ProductModel.get_products_by_category("Groceries") == [("Bread", 2.99, 20), ("Milk", 3.99, 15)]
+    assert list(ProductModel._cache) == ["Groceries"]
+    assert sorted(os.listdir(sharded)) == ["Electronics.json", "Groceries.json", "codes.idx", "names.idx"]
+
+    # get_price goes through the names index to the one shard it needs
+    ProductModel.clear_cache()
+    assert ProductModel.get_price("tablet") == 299.99
+    assert list(ProductModel._cache) == ["Electronics"]
+    with pytest.raises(ValueError):
+        ProductModel.get_price("Scarf")
+
+def test_sharded_edit_rewrites_one_shard(setup_test_files, sharded):
+    """Test that an edit in one category leaves the other shards alone"""
+    ProductModel.get_all_products()
+    electronics = os.path.join(sharded, "Electronics.json")
+    before = os.stat(electronics).st_mtime_ns, os.stat(electronics).st_ino
+
+    ProductModel.reduce_stock("Groceries", "Bread", 3)
+    ProductModel.update_product("Groceries", "Milk", 4.29, 10)
+
+    assert (os.stat(electronics).st_mtime_ns, os.stat(electronics).st_ino) == before
+    with open(os.path.join(sharded, "Groceries.json")) as f:
+        assert json.load(f) == [["Bread", 2.99, 17], ["Milk", 4.29, 10]]
+
+def test_sharded_names_follow_adds_and_deletes(setup_test_files, sharded):
+    """Test that the names index and shard files track added and removed products"""
+    ProductModel.add_product("Books", "Atlas", 25.0, 2)
+    ProductModel.add_product("Groceries", "Atlas", 1.5, 9)
+    ProductModel.delete_product("Electronics", "Laptop")
+    ProductModel.delete_product("Electronics", "Tablet")
+
+    assert not os.path.exists(os.path.join(sharded, "Electronics.json"))
+    with open(os.path.join(sharded, "names.idx")) as f:
+        names = json.load(f)
+    assert names["atlas"] == ["Books", "Groceries"]
+    assert "laptop" not in names
+
+    ProductModel.clear_cache()
+    assert ProductModel.get_price("Atlas") == 25.0
+    assert sorted(ProductModel.get_all_products()) == ["Books", "Groceries"]
+    with pytest.raises(ValueError) as exc:
+        ProductModel.update_product("Electronics", "Laptop", 1.0, 1)
+    assert "not found" in str(exc.value)
+
+def test_sharded_cache_sees_other_writers(setup_test_files, sharded):
+    """Test that a shard rewritten by another process is reloaded on its own"""
+    ProductModel.get_all_products()
+    with open(os.path.join(sharded, "Groceries.json"), 'w') as f:
+        json.dump([["Bread", 2.49, 7]], f)
+    ProductModel.reset_cache_stats()
+
+    assert ProductModel.get_product("Groceries", "bread") == ("Bread", 2.49, 7)
+    assert ProductModel.get_product("Electronics", "Laptop")[2] == 5
+    assert ProductModel.cache_info()["misses"] == 1
+
+def test_search_prefix_and_typos(setup_test_files):
+    """Test that search finds word prefixes first, then close spellings"""
+    ProductModel.add_product("Groceries", "Milk", 3.99, 15)
+    ProductModel.add_product("Groceries", "Whole Milk", 4.49, 8)
+    ProductModel.add_product("Groceries", "Mint Tea", 2.50, 10)
+    ProductModel.add_product("Groceries", "Chocolate", 1.99, 30)
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+
+    assert [p.name for _, p in ProductModel.search("mil")] == ["Milk", "Whole Milk"]
+    assert [p.name for _, p in ProductModel.search("MI", limit=2)] == ["Milk", "Whole Milk"]
+    assert ProductModel.search("choclate") == [("Groceries", ("Chocolate", 1.99, 30))]
+    assert ProductModel.search("zzz") == []
+    assert ProductModel.search("  ") == []
+
+def test_search_follows_catalog_changes(setup_test_files):
+    """Test that the search index is updated on add/delete and rebuilt on reload"""
+    ProductModel.add_product("Groceries", "Bread", 2.99, 20)
+    assert ProductModel.search("bre") == [("Groceries", ("Bread", 2.99, 20))]
+
+    ProductModel.add_product("Groceries", "Brie", 6.50, 4)
+    ProductModel.update_product("Groceries", "Bread", 2.49, 20)
+    assert ProductModel.search("br") == [("Groceries", ("Bread", 2.49, 20)), ("Groceries", ("Brie", 6.50, 4))]
+
+    ProductModel.delete_product("Groceries", "Bread")
+    assert [p.name for _, p in ProductModel.search("br")] == ["Brie"]
+
+    # Another process adds a product
+    with open(ProductModel.PRODUCTS_FILE, 'w') as f:
+        json.dump({"Groceries": [["Brie", 6.50, 4], ["Brioche", 3.10, 6]]}, f)
+    assert [p.name for _, p in ProductModel.search("bri")] == ["Brie", "Brioche"]
+
+def test_search_index_tombstones_are_compacted():
+    """Test that removed names stop matching and the index compacts itself"""
+    index = SearchIndex.build({"Books": [("Atlas",), ("Novel",), ("Notebook",)]})
+    index.remove("Books", "Novel")
+    assert index.search("no") == [("Books", "Notebook")]
+
+    index.remove("Books", "Notebook")
+    index.add("Books", "Notes")
+    assert len(index) == 2
+    assert index.search("no") == [("Books", "Notes")]
+    assert index.search("atlsa") == []
+    assert index.search("atla") == [("Books", "Atlas")]
+
+def test_product_codes(setup_test_files):
+    """Test barcode lookup, uniqueness and changing or clearing a code"""
+    ProductModel.add_product("Groceries", "Bread", 2.99, 20, code="4006381333931")
+    ProductModel.add_product("Groceries", "Milk", 3.99, 15, code=" 5000112637922 ")
+    ProductModel.add_product("Electronics", "Laptop", 999.99, 5)
+
+    assert ProductModel.get_product_by_code("4006381333931") == ("Groceries", ("Bread", 2.99, 20))
+    assert ProductModel.get_product_by_code(5000112637922)[1].name == "Milk"
+    assert ProductModel.get_product_by_code("0000") is None
+    assert ProductModel.get_product_by_code("") is None
+    with pytest.raises(ValueError) as exc:
+        ProductModel.add_product("Electronics", "Tablet", 299.99, 2, code="4006381333931")
+    assert "already used" in str(exc.value)
+    with pytest.raises(ValueError):
+        ProductModel.update_product("Electronics", "Laptop", 999.99, 5, new_code="5000112637922")
+
+    ProductModel.update_product("Groceries", "Bread", 2.49, 20)
+    assert ProductModel.get_product_by_code("4006381333931")[1].price == 2.49
+    ProductModel.update_product("Groceries", "Bread", 2.49, 20, new_code="111")
+    assert ProductModel.get_product_by_code("4006381333931") is None
+    ProductModel.update_product("Groceries", "Milk", 3.99, 15, new_code="")
+    ProductModel.delete_product("Groceries", "Bread")
+    assert ProductModel.get_product_by_code("111") is None
+    assert ProductModel.get_product_by_code("5000112637922") is None
+
+    with open(ProductModel.PRODUCTS_FILE) as f:
+        assert json.load(f)["Groceries"] == [["Milk", 3.99, 15]]
+    ProductModel.add_product("Electronics", "Tablet", 299.99, 2, code="4006381333931")
+    ProductModel.clear_cache()
+    assert ProductModel.get_product_by_code("4006381333931")[1].name == "Tablet"
+
+def test_product_codes_in_wal(setup_test_files, wal_mode):
+    """Test that codes survive WAL replay and checkpoints"""
+    ProductModel.add_product("Groceries", "Bread", 2.99, 20, code="123")
+    ProductModel.reduce_stock("Groceries", "Bread", 1)
+    ProductModel.clear_cache()
+    assert ProductModel.get_product_by_code("123") == ("Groceries", ("Bread", 2.99, 19))
+
+    ProductModel.update_product("Groceries", "Bread", 2.99, 19, new_code="")
+    assert ProductModel.checkpoint()
+    ProductModel.clear_cache()
+    assert ProductModel.get_product_by_code("123") is None
+
+def test_sharded_product_codes(setup_test_files, sharded):
+    """Test that a code lookup opens only the shard the codes index points at"""
+    ProductModel.add_product("Groceries", "Eggs", 4.10, 12, code="777")
+    ProductModel.update_product("Electronics", "Tablet", 299.99, 2, new_code="888")
+    ProductModel.clear_cache()
+
+    assert ProductModel.get_product_by_code("777") == ("Groceries", ("Eggs", 4.10, 12))
+    assert list(ProductModel._cache) == ["Groceries"]
+    with pytest.raises(ValueError):
+        ProductModel.add_product("Groceries", "Ham", 5.0, 3, code="888")
+
+    # A moved code leaves a stale codes.idx entry that lookups see through
+    ProductModel.update_product("Electronics", "Tablet", 299.99, 2, new_code="")
+    ProductModel.update_product("Groceries", "Milk", 3.99, 15, new_code="888")
+    ProductModel.update_product("Groceries", "Milk", 3.99, 15, new_code="")
+    ProductModel.clear_cache()
+    assert ProductModel.get_product_by_code("888") is None
+    with open(os.path.join(sharded, "codes.idx")) as f:
+        assert json.load(f) == {"777": "Groceries", "888": "Groceries"}
+
+def test_products_page(setup_test_files):
+    """Test sorted pages of the catalog and that they follow changes"""
+    ProductModel.add_product("Groceries", "bread", 2.99, 20)
+    ProductModel.add_product("Books", "Novel", 12.0, 3)
+    ProductModel.add_product("Groceries", "Apple", 0.5, 100)
+    ProductModel.add_product("Electronics", "Cable", 5.0, 3)
+
+    total, page = ProductModel.get_products_page(0, 3)
+    assert total == 4
+    assert [(c, p.name) for c, p in page] == [("Books", "Novel"), ("Electronics", "Cable"), ("Groceries", "Apple")]
+    assert [p.name for _, p in ProductModel.get_products_page(3, 3)[1]] == ["bread"]
+    assert [p.name for _, p in ProductModel.get_products_page(0, 10, "name")[1]] == ["Apple", "bread", "Cable", "Novel"]
+    # Equal stock is ordered by name
+    assert [p.name for _, p in ProductModel.get_products_page(0, 2, "stock")[1]] == ["Cable", "Novel"]
+    assert [p.name for _, p in ProductModel.get_products_page(1, 2, "-price")[1]] == ["Cable", "bread"]
+    assert ProductModel.get_products_page(10, 5) == (4, [])
+
+    ProductModel.reduce_stock("Groceries", "Apple", 99)
+    ProductModel.delete_product("Books", "Novel")
+    assert [p.name for _, p in ProductModel.get_products_page(0, 10, "stock")[1]] == ["Apple", "Cable", "bread"]
+
+    with pytest.raises(ValueError):
+        ProductModel.get_products_page(0, 10, "colour")
+    with pytest.raises(ValueError):
+        ProductModel.get_products_page(-1, 10)
+
+def test_query_products(setup_test_files):
+    """Test filtered, multi-key sorted pages and that they follow changes"""
+    ProductModel.add_product("Groceries", "bread", 2.99, 20)
+    ProductModel.add_product("Groceries", "Butter", 4.5, 3)
+    ProductModel.add_product("Groceries", "Apple", 0.5, 100)
+    ProductModel.add_product("Books", "Novel", 12.0, 3)
+    ProductModel.add_product("Electronics", "Battery", 4.5, 40)
+
+    def names(**kwargs):
+        total, page = ProductModel.query_products(**kwargs)
+        return total, [p.name for _, p in page]
+
+    assert names(max_price=5, sort="stock") == (4, ["Butter", "bread", "Battery", "Apple"])
+    assert names(max_price=5, sort="-stock", offset=2, limit=1) == (4, ["bread"])
+    assert names(category="Groceries", name_prefix="b", sort="name") == (2, ["bread", "Butter"])
+    assert names(min_price=4.5, max_price=4.5, sort="-category") == (2, ["Butter", "Battery"])
+    assert names(min_stock=3, max_stock=3, sort="price") == (2, ["Butter", "Novel"])
+    assert names(sort="price,-stock") == (5, ["Apple", "bread", "Battery", "Butter", "Novel"])
+    assert names(sort=["-stock", "-price"], limit=3) == (5, ["Apple", "Battery", "bread"])
+    assert names(category="Toys") == (0, [])
+
+    ProductModel.update_product("Groceries", "Butter", 1.0, 50)
+    ProductModel.reduce_stock_batch([("Groceries", "Apple", 95)])
+    ProductModel.delete_product("Books", "Novel")
+    ProductModel.add_product("Books", "Atlas", 3.0, 7)
+    assert names(max_price=5, sort="stock") == (5, ["Apple", "Atlas", "bread", "Battery", "Butter"])
+    assert names(name_prefix="n") == (0, [])
+
+    for bad in ({"sort": "colour"}, {"sort": "price,price"}, {"offset": -1}, {"min_price": "5"}):
+        with pytest.raises(ValueError):
+            ProductModel.query_products(**bad)
+
+def test_sorted_index_matches_brute_force():
+    """Test SortedIndex pages against sorting and filtering the whole catalog, across changes"""
+    rng = random.Random(7)
+    categories = ["A", "B", "C"]
+    products = {category: [] for category in categories}
+    for i in range(300):
+        products[rng.choice(categories)].append(Product(f"P{i % 120} {i}", rng.randint(1, 20) / 2, rng.randint(0, 9)))
+    index = SortedIndex.build(products)
+    for i in range(100):
+        category = rng.choice(categories)
+        if products[category] and rng.random() < 0.3:
+            item = products[category].pop(rng.randrange(len(products[category])))
+            index.remove(category, item.name)
+        else:
+            item = rng.choice(products[category]) if products[category] else None
+            if item is None or rng.random() < 0.3:
+                item = Product(f"New {i}", 1.0, 0)
+                products[category].append(item)
+            item.price, item.quantity = rng.randint(1, 20) / 2, rng.randint(0, 9)
+            index.set(category, item)
+
+    def value(key, category, item):
+        return {"category": category, "name": item.name.lower(), "price": item.price, "stock": item.quantity}[key]
+
+    everything = [(category, item) for category, items in products.items() for item in items]
+    for _ in range(200):
+        keys = rng.sample(["category", "name", "price", "stock"], rng.randint(1, 3))
+        sort = [(key, rng.random() < 0.5) for key in keys]
+        filters = {}
+        if rng.random() < 0.4:
+            filters["category"] = rng.choice(categories)
+        if rng.random() < 0.4:
+            filters["min_price"] = rng.randint(1, 10) / 2
+        if rng.random() < 0.4:
+            filters["max_stock"] = rng.randint(0, 9)
+        if rng.random() < 0.3:
+            filters["name_prefix"] = rng.choice(["p1", "P2", "new", "p"])
+        expected = [(c, item) for c, item in everything
+                    if filters.get("category", c) == c
+                    and item.price >= filters.get("min_price", 0)
+                    and item.quantity <= filters.get("max_stock", 99)
+                    and item.name.lower().startswith(filters.get("name_prefix", "").lower())]
+        expected.sort(key=lambda pair: (pair[1].name.lower(), pair[0]))
+        for key, descending in reversed(sort):
+            expected.sort(key=lambda pair: value(key, *pair), reverse=descending)
+        offset, limit = rng.randint(0, 40), rng.randint(1, 30)
+        total, page = index.query(sort, offset, limit, **filters)
+        assert total == len(expected)
+        assert page == [(c, item.name.lower()) for c, item in expected[offset:offset + limit]]
+
+def test_sorted_index_sorts_each_group_once(monkeypatch):
+    """Test that paging a multi-key sort re-sorts a group of equal first keys only once per change"""
+    products = {"A": [Product(f"P{i}", 1.0, i % 7) for i in range(50)],
+                "B": [Product(f"Q{i}", 2.0, i % 5) for i in range(50)]}
+    index = SortedIndex.build(products)
+    sorts = []
+    original = index._sort
+    monkeypatch.setattr(index, "_sort", lambda entries, sort: sorts.append(len(entries)) or original(entries, sort))
+
+    sort = [("category", False), ("stock", True)]
+    expected = sorted(((category, item) for category, items in products.items() for item in items),
+                      key=lambda pair: (pair[0], -pair[1].quantity, pair[1].name.lower()))
+    expected = [(category, item.name.lower()) for category, item in expected]
+    assert index.query(sort, 0, 10)[1] == expected[:10]
+    assert index.query(sort, 10, 10)[1] == expected[10:20]
+    assert sorts == [50]
+    assert index.query(sort, 45, 10)[1] == expected[45:55]
+    assert sorts == [50, 50]
+    assert index.query(sort, 0, 10)[1] == expected[:10] and sorts == [50, 50]
+
+    products["A"][6].quantity = 9
+    index.set("A", products["A"][6])
+    assert index.query(sort, 0, 1)[1] == [("A", "p6")]
+    assert sorts == [50, 50, 50]
@@ -0,0 +1,99 @@
+import pytest
+from datetime import datetime
+from model.promotions import PromotionEngine, validate_rule
+from model.promotion_model import PromotionModel
+from model.sqlite_backend import SqliteBackend
+from controller.main_controller import MainController
+
+NOON = datetime(2025, 6, 1, 12, 0)
+
+def test_line_deals_pick_the_best_rule():
+    """Test percent, fixed and buy-x-get-y deals, best single deal per line"""
+    engine = PromotionEngine([
+        {"type": "percent", "scope": "category", "category": "Groceries", "value": 10},
+        {"type": "fixed", "scope": "product", "category": "Groceries", "product": "Milk", "value": 1.0},
+        {"type": "buy_x_get_y", "scope": "product", "category": "Groceries", "product": "bread", "buy": 2, "get": 1},
+        {"type": "fixed", "scope": "product", "category": "Books", "product": "Atlas", "value": 50},
+    ])
+    pricing = engine.price([
+        ("Groceries", "Milk", 4.0, 2),      # fixed 2.00 beats 10% = 0.80
+        ("Groceries", "Bread", 3.0, 7),     # 2 free = 6.00 beats 10% = 2.10
+        ("Groceries", "Eggs", 5.0, 1),      # category 10%
+        ("Books", "Atlas", 20.0, 1),        # fixed capped at the price
+        ("Clothing", "Scarf", 15.0, 1),     # nothing
+    ], when=NOON)
+
+    assert [line[4] for line in pricing.lines] == pytest.approx([2.0, 6.0, 0.5, 20.0, 0.0])
+    assert pricing.subtotal == pytest.approx(69.0)
+    assert pricing.total == pytest.approx(40.5)
+    assert pricing.basket_rule is None
+
+def test_basket_payment_and_time_window_rules():
+    """Test that basket deals apply after line deals and respect payment method and windows"""
+    engine = PromotionEngine([
+        {"type": "percent", "scope": "category", "category": "Groceries", "value": 50,
+         "start": "2025-06-01", "end": "2025-06-02"},
+        {"type": "percent", "scope": "basket", "value": 10, "payment_method": "Card"},
+        {"type": "fixed", "scope": "basket", "value": 5},
+    ])
+    lines = [("Groceries", "Milk", 4.0, 5)]
+
+    during = engine.price(lines, "Cash", NOON)
+    assert during.line_discount == pytest.approx(10.0)
+    assert during.basket_discount == pytest.approx(5.0)
+
+    card = engine.price(lines, "Card", datetime(2025, 6, 2))  # window is over
+    assert card.line_discount == 0
+    assert card.basket_discount == pytest.approx(5.0)  # 5 fixed beats 10% of 20
+
+    assert engine.price(lines, "Card", datetime(2025, 5, 31)).total == pytest.approx(15.0)
+    assert engine.price([(None, "Milk", 4.0, 100)], "Card", NOON).total == pytest.approx(360.0)
+
+def test_invalid_rules_are_rejected():
+    """Test rule validation"""
+    for rule in [
+        {"type": "percent", "scope": "basket", "value": 120},
+        {"type": "fixed", "scope": "category", "value": 1},
+        {"type": "buy_x_get_y", "scope": "basket", "buy": 2, "get": 1},
+        {"type": "buy_x_get_y", "scope": "category", "category": "Books", "buy": 0, "get": 1},
+        {"type": "percent", "scope": "basket", "value": 5, "start": "2025-06-02", "end": "2025-06-01"},
+        {"type": "bogus", "scope": "basket", "value": 5},
+    ]:
+        with pytest.raises(ValueError):
+            validate_rule(rule)
+
+def test_promotion_storage(setup_test_files, tmp_path):
+    """Test adding and deleting rules in both backends"""
+    rule = {"type": "percent", "scope": "category", "category": "Books", "value": 20, "name": "Book week"}
+    for store in (PromotionModel, SqliteBackend(str(tmp_path / "promotions.db")).promotions):
+        before = store.version()
+        rule_id = store.add_rule(rule)
+        assert store.version() != before
+        assert store.get_rules() == [dict(rule, id=rule_id)]
+        with pytest.raises(ValueError):
+            store.add_rule({"type": "percent", "scope": "basket"})
+        store.delete_rule(rule_id)
+        assert store.get_rules() == []
+        with pytest.raises(ValueError):
+            store.delete_rule(rule_id)
+
+def test_controller_prices_with_promotions(setup_test_files):
+    """Test that totals and checkout use the stored promotions, recompiled when they change"""
+    controller = MainController()
+    controller.add_product("Groceries", "Bread", 3.0, 10)
+    cart = controller.new_cart()
+    controller.add_to_cart("Groceries", "Bread", 3, cart=cart)
+    assert controller.calculate_total(cart) == pytest.approx(9.0)
+
+    engine = controller.promotion_engine()
+    assert controller.promotion_engine() is engine
+    controller.add_promotion({"type": "buy_x_get_y", "scope": "product", "category": "Groceries",
+                              "product": "Bread", "buy": 2, "get": 1})
+    assert controller.promotion_engine() is not engine
+    assert controller.calculate_total(cart) == pytest.approx(6.0)
+    assert controller.calculate_total(cart, "Card") == pytest.approx(5.4)
+
+    receipt = controller.checkout(cart, "Card")
+    assert receipt["subtotal"] == pytest.approx(9.0)
+    assert receipt["discount"] == pytest.approx(3.6)
+    assert receipt["lines"][0]["discount"] == pytest.approx(3.0)
@@ -0,0 +1,66 @@
+import pytest
+from datetime import datetime
+from model.bill_model import BillModel
+from model import sales_analytics
+from model.sales_analytics import SalesAnalytics
+
+LAPTOP = {"name": "Laptop", "category": "Electronics", "price": 1000.0, "quantity": 1}
+BREAD = {"name": "Bread", "category": "Groceries", "price": 2.5, "quantity": 4}
+MILK = {"name": "Milk", "category": "Groceries", "price": 4.0, "quantity": 2}
+
+@pytest.fixture(params=["numpy", "python"])
+def analytics(request, monkeypatch, setup_test_files):
+    """SalesAnalytics over three bills, run with and without NumPy"""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(sales_analytics, "np", None)
+
+    BillModel.save_bill(1018.0, [LAPTOP, BREAD, MILK], "Cash", 0.0, "john")
+    BillModel.save_bill(9.0, [BREAD], "Card", 1.0, "mary")
+    BillModel.save_bill(8.0, [MILK], "Cash", 0.0, "john")
+    return SalesAnalytics()
+
+def test_daily_and_hourly_revenue(analytics):
+    """Test revenue grouped by day and by hour of day"""
+    today = datetime.now().date()
+    assert analytics.daily_revenue() == {today: pytest.approx(1035.0)}
+
+    hourly = analytics.hourly_revenue()
+    assert len(hourly) == 24
+    assert sum(hourly) == pytest.approx(1035.0)
+
+def test_top_products(analytics):
+    """Test best sellers by revenue and by quantity"""
+    assert analytics.top_products(2) == [("Laptop", 1000.0), ("Bread", 20.0)]
+    assert analytics.top_products(1, by="quantity") == [("Bread", 8.0)]
+
+def test_category_mix_and_baskets(analytics):
+    """Test category revenue share and average basket size"""
+    mix = analytics.category_mix()
+    assert mix["Electronics"] == pytest.approx(1000.0 / 1036.0)
+    assert mix["Groceries"] == pytest.approx(36.0 / 1036.0)
+
+    basket = analytics.average_basket_size()
+    assert basket["lines"] == pytest.approx(5 / 3)
+    assert basket["items"] == pytest.approx(13 / 3)
+
+def test_payment_split(analytics):
+    """Test bill counts and revenue per payment method"""
+    split = analytics.payment_split()
+    assert split["Cash"] == {"bills": 2, "revenue": pytest.approx(1026.0)}
+    assert split["Card"] == {"bills": 1, "revenue": pytest.approx(9.0)}
+
+def test_date_window(analytics):
+    """Test that a window outside the data yields empty reports"""
+    window = SalesAnalytics(start=datetime(2000, 1, 1), end=datetime(2000, 1, 2))
+    assert window.daily_revenue() == {}
+    assert window.top_products() == []
+    assert window.average_basket_size() == {"lines": 0.0, "items": 0.0}
+
+def test_pure_python_fallback_warns(monkeypatch, setup_test_files, caplog):
+    """Test that running without NumPy logs a warning about the slow path"""
+    monkeypatch.setattr(sales_analytics, "np", None)
+    with caplog.at_level("WARNING", logger="model.sales_analytics"):
+        SalesAnalytics()
+    assert "NumPy is not installed" in caplog.text
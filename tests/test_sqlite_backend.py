@@ -0,0 +1,252 @@
+import pytest
+import json
+import sqlite3
+import threading
+from model.product import Product
+from model.sqlite_backend import SqliteBackend, SqliteDatabase, SqliteProductModel, migrate_from_json
+from controller.main_controller import MainController
+
+@pytest.fixture
+def backend(tmp_path):
+    """Fixture providing a SQLite backend on a temporary database"""
+    backend = SqliteBackend(str(tmp_path / "smart_mart.db"))
+    yield backend
+    backend.close()
+
+def test_product_crud(backend):
+    """Test product add/update/delete through the SQLite backend"""
+    products = backend.products
+    assert products.add_product("Electronics", "Laptop", 999.99, 5)
+
+    with pytest.raises(ValueError):
+        products.add_product("Electronics", "laptop", 899.99, 1)
+
+    assert products.get_product("Electronics", "LAPTOP") == ("Laptop", 999.99, 5)
+    assert products.update_product("Electronics", "Laptop", 899.99, 10)
+    assert products.get_all_products() == {"Electronics": [["Laptop", 899.99, 10]]}
+    assert products.get_price("laptop") == 899.99
+
+    assert products.delete_product("Electronics", "Laptop")
+    assert products.get_product("Electronics", "Laptop") is None
+
+    with pytest.raises(ValueError) as exc:
+        products.delete_product("Electronics", "Laptop")
+    assert "not found" in str(exc.value)
+
+def test_product_codes(backend):
+    """Test barcode lookup and code uniqueness through the SQLite backend"""
+    products = backend.products
+    products.add_product("Groceries", "Bread", 2.99, 20, code="4006381333931")
+    products.add_product("Groceries", "Milk", 3.99, 15)
+
+    assert products.get_product_by_code(" 4006381333931 ") == ("Groceries", ("Bread", 2.99, 20))
+    assert products.get_product_by_code("999") is None
+    with pytest.raises(ValueError) as exc:
+        products.add_product("Groceries", "Eggs", 4.10, 12, code="4006381333931")
+    assert "already used" in str(exc.value)
+    with pytest.raises(ValueError):
+        products.update_product("Groceries", "Milk", 3.99, 15, new_code="4006381333931")
+
+    products.update_product("Groceries", "Bread", 2.49, 20)
+    assert products.get_product_by_code("4006381333931")[1] == ("Bread", 2.49, 20)
+    products.update_product("Groceries", "Bread", 2.49, 20, new_code="")
+    products.update_product("Groceries", "Milk", 3.99, 15, new_code="4006381333931")
+    assert products.get_product_by_code("4006381333931")[1][0] == "Milk"
+
+def test_code_column_added_to_old_database(tmp_path):
+    """Test that opening a database from before product codes adds the column"""
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, category TEXT NOT NULL, name TEXT NOT NULL, "
+                 "name_key TEXT NOT NULL, price REAL NOT NULL, quantity INTEGER NOT NULL, UNIQUE (category, name_key))")
+    conn.execute("INSERT INTO products (category, name, name_key, price, quantity) VALUES ('Books', 'Atlas', 'atlas', 25, 2)")
+    conn.commit()
+    conn.close()
+
+    db = SqliteDatabase(path)
+    products = SqliteProductModel(db)
+    products.update_product("Books", "Atlas", 25.0, 2, new_code="42")
+    assert products.get_product_by_code("42") == ("Books", ("Atlas", 25.0, 2))
+    db.close()
+
+def test_search(backend):
+    """Test name search through the SQLite backend"""
+    products = backend.products
+    products.add_product("Groceries", "Milk", 3.99, 15)
+    products.add_product("Groceries", "Whole Milk", 4.49, 8)
+    products.add_product("Groceries", "100%_Juice", 2.99, 4)
+
+    assert [p[0] for _, p in products.search("mil")] == ["Milk", "Whole Milk"]
+    assert products.search("MILK", limit=1) == [("Groceries", ("Milk", 3.99, 15))]
+    assert products.search("%") == []
+    assert [p[0] for _, p in products.search("100%_")] == ["100%_Juice"]
+
+    # A name matching both as a prefix and at a later word is listed once
+    products.add_product("Groceries", "Milk Milkshake", 5.99, 2)
+    assert [p[0] for _, p in products.search("milk")] == ["Milk", "Milk Milkshake", "Whole Milk"]
+    assert all(isinstance(p, Product) for _, p in products.search("milk"))
+    assert all(isinstance(p, Product) for p in products.get_products_by_category("Groceries"))
+
+def test_reads_wait_for_open_transactions(backend):
+    """Test that a reader on another thread never sees uncommitted rows"""
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(backend.products.get_product("Groceries", "Milk")))
+    with backend.products.db.transaction() as conn:
+        conn.execute("INSERT INTO products (category, name, name_key, price, quantity) "
+                     "VALUES ('Groceries', 'Milk', 'milk', 3.99, 15)")
+        reader.start()
+        reader.join(0.2)
+        assert seen == []
+    reader.join()
+    assert seen == [("Milk", 3.99, 15)]
+
+def test_reduce_stock(backend):
+    """Test stock decrements are conditional on available quantity"""
+    products = backend.products
+    products.add_product("Groceries", "Bread", 2.99, 3)
+
+    assert products.reduce_stock("Groceries", "Bread", 2)
+    assert products.get_product("Groceries", "Bread")[2] == 1
+
+    with pytest.raises(ValueError) as exc:
+        products.reduce_stock("Groceries", "Bread", 2)
+    assert "Insufficient stock" in str(exc.value)
+
+    with pytest.raises(ValueError) as exc:
+        products.reduce_stock("Groceries", "Cheese", 1)
+    assert "not found" in str(exc.value)
+
+def test_products_page(backend):
+    """Test sorted catalog pages through the SQLite backend"""
+    products = backend.products
+    products.add_product("Groceries", "bread", 2.99, 20)
+    products.add_product("Books", "Novel", 12.0, 3)
+    products.add_product("Groceries", "Apple", 0.5, 100, code="123")
+
+    total, page = products.get_products_page(0, 2)
+    assert total == 3
+    assert [(c, p.name) for c, p in page] == [("Books", "Novel"), ("Groceries", "Apple")]
+    assert page[1][1].code == "123"
+    assert [p.name for _, p in products.get_products_page(0, 10, "name")[1]] == ["Apple", "bread", "Novel"]
+    assert [p.name for _, p in products.get_products_page(1, 1, "-stock")[1]] == ["bread"]
+    with pytest.raises(ValueError):
+        products.get_products_page(0, 10, "colour")
+
+def test_query_products(backend):
+    """Test filtered, multi-key sorted pages through the SQLite backend"""
+    products = backend.products
+    products.add_product("Groceries", "bread", 2.99, 20)
+    products.add_product("Groceries", "Butter", 4.5, 3)
+    products.add_product("Books", "Novel", 12.0, 3)
+    products.add_product("Electronics", "Battery", 4.5, 40)
+
+    def names(**kwargs):
+        total, page = products.query_products(**kwargs)
+        return total, [p.name for _, p in page]
+
+    assert names(max_price=5, sort="-stock", limit=2) == (3, ["Battery", "bread"])
+    assert names(category="Groceries", name_prefix="B", sort="name") == (2, ["bread", "Butter"])
+    assert names(min_stock=3, max_stock=3, sort="-price") == (2, ["Novel", "Butter"])
+    assert names(sort="price,-stock") == (4, ["bread", "Battery", "Butter", "Novel"])
+    with pytest.raises(ValueError):
+        products.query_products(sort="price,colour")
+
+def test_users_and_bills(backend):
+    """Test cashier accounts and bill numbering"""
+    users = backend.users
+    users.create_initial_admin()
+    assert users.validate_user("admin", "admin123")
+
+    users.add_user("john", "password123")
+    assert users.validate_user("john", "password123")
+    assert not users.validate_user("john", "wrong")
+    assert users.get_all_users() == ["john"]
+
+    with pytest.raises(ValueError):
+        users.delete_user("admin")
+
+    assert backend.bills.save_bill(10.0) == "0001"
+    assert backend.bills.save_bill(20.0) == "0002"
+    assert backend.bills.get_all_bills() == [(1, 10.0), (2, 20.0)]
+    with pytest.raises(ValueError):
+        backend.bills.save_bill(0)
+    assert backend.bills.save_bill(0.0, discount=5.0) == "0003"
+
+def test_migrate_from_json(tmp_path, setup_test_files):
+    """Test importing the JSON text files"""
+    with open(setup_test_files['products'], 'w') as f:
+        json.dump({"Electronics": [["Laptop", 999.99, 5, "123"]], "Books": [["Novel", 12.5, 3]]}, f)
+    with open(setup_test_files['cashiers'], 'w') as f:
+        json.dump({"john": "5e884898da28047151d0e56f8dc6292773603d0d6aabbdd62a11ef721d1542d8"}, f)
+    with open(setup_test_files['bills'], 'w') as f:
+        json.dump([{"bill_number": "0001", "total": 2.7, "date": "2025-05-28 19:27:09"}], f)
+
+    db = SqliteDatabase(str(tmp_path / "migrated.db"))
+    counts = migrate_from_json(db, setup_test_files['products'], setup_test_files['cashiers'],
+                               setup_test_files['admin'], setup_test_files['bills'])
+    assert counts == {"products": 2, "users": 2, "bills": 1, "promotions": 0}
+    assert SqliteProductModel(db).get_product_by_code("123") == ("Electronics", ("Laptop", 999.99, 5))
+
+    # Promotion rules without an id get a fresh one
+    promotions_file = tmp_path / "promotions.txt"
+    promotions_file.write_text(json.dumps([{"type": "percent", "scope": "category", "category": "Books", "value": 10}]))
+    counts = migrate_from_json(db, setup_test_files['products'], setup_test_files['cashiers'],
+                               setup_test_files['admin'], setup_test_files['bills'], str(promotions_file))
+    assert counts["promotions"] == 1
+    assert db.conn.execute("SELECT COUNT(*) FROM promotions").fetchone()[0] == 1
+
+    # Running the migration again must not duplicate rows
+    migrate_from_json(db, setup_test_files['products'], setup_test_files['cashiers'],
+                      setup_test_files['admin'], setup_test_files['bills'])
+    row = db.conn.execute("SELECT COUNT(*) FROM products").fetchone()
+    assert row[0] == 2
+    db.close()
+
+def test_controller_sqlite_backend(tmp_path):
+    """Test that MainController runs on the SQLite backend"""
+    controller = MainController(backend="sqlite", db_path=str(tmp_path / "smart_mart.db"))
+    assert controller.validate_login("admin", "admin123") == "admin"
+
+    controller.add_product("Electronics", "Laptop", 999.99, 5)
+    assert controller.add_to_cart("Electronics", "Laptop", 2) == ("Laptop", 999.99, 2)
+    controller.reduce_stock("Electronics", "Laptop", 2)
+    assert controller.get_product("Electronics", "Laptop") == ("Laptop", 999.99, 3)
+    assert controller.save_bill(1999.98) == "0001"
+    controller.backend.close()
+
+def test_checkout_rolls_back(tmp_path):
+    """Test that a failed checkout leaves stock untouched on SQLite"""
+    controller = MainController(backend="sqlite", db_path=str(tmp_path / "smart_mart.db"))
+    controller.add_product("Electronics", "Laptop", 1000.0, 5)
+    controller.add_product("Groceries", "Bread", 2.5, 1)
+
+    with pytest.raises(ValueError):
+        controller.checkout([("Electronics", "Laptop", 2), ("Groceries", "Bread", 3)], "Cash")
+    assert controller.get_product("Electronics", "Laptop")[2] == 5
+
+    receipt = controller.checkout([("Electronics", "Laptop", 2)], "Cash")
+    assert receipt["bill_number"] == "0001"
+    assert receipt["lines"][0]["remaining"] == 3
+    controller.backend.close()
+
+def test_bill_lines(backend):
+    """Test that bill lines and payment details are stored on SQLite"""
+    lines = [{"name": "Bread", "category": "Groceries", "price": 2.5, "quantity": 4}]
+    bill_number = backend.bills.save_bill(9.0, lines, "Card", 1.0, "john")
+
+    assert backend.bills.get_bill_lines(bill_number) == [("Bread", "Groceries", 2.5, 4)]
+    row = backend.db.conn.execute("SELECT payment_method, discount, cashier FROM bills").fetchone()
+    assert row == ("Card", 1.0, "john")
+
+def test_daily_summary(backend):
+    """Test that the SQLite aggregate tables follow saved bills"""
+    bread = {"name": "Bread", "category": "Groceries", "price": 2.5, "quantity": 4}
+    backend.bills.save_bill(10.0, [bread], "Cash", 0.0, "john")
+    backend.bills.save_bill(9.0, [bread], "Card", 1.0, "john")
+
+    day = next(iter(backend.bills.get_daily_summary().values()))
+    assert day["bills"] == 2
+    assert day["items"] == 8
+    assert day["categories"]["Groceries"] == {"revenue": 20.0, "items": 8}
+    assert day["cashiers"]["john"] == {"bills": 2, "revenue": 19.0}
+    assert backend.bills.rebuild_summary() == []
@@ -0,0 +1,145 @@
+import pytest
+from tkinter import ttk
+from view.virtual_tree import VirtualTreeview
+
+class FakeTree:
+    """Records the widget operations a VirtualTreeview does"""
+    def __init__(self, *args, **kwargs):
+        self.rows = {}
+        self.order = []
+        self.selected = ()
+        self.operations = 0
+
+    def insert(self, parent, index, values):
+        item = f"I{len(self.order)}"
+        self.rows[item] = values
+        self.order.append(item)
+        self.operations += 1
+        return item
+
+    def delete(self, item):
+        del self.rows[item]
+        self.order.remove(item)
+        self.operations += 1
+
+    def item(self, item, values):
+        self.rows[item] = values
+        self.operations += 1
+
+    def selection(self):
+        return self.selected
+
+    def selection_set(self, item):
+        self.selected = (item,)
+
+    def selection_remove(self, items):
+        self.selected = ()
+
+    def shown(self):
+        return [self.rows[item] for item in self.order]
+
+    configure = pack = bind = xview = lambda self, *args, **kwargs: None
+
+class FakeWidget:
+    def __init__(self, *args, **kwargs):
+        self.position = None
+
+    def set(self, first, last):
+        self.position = (first, last)
+
+    pack = configure = lambda self, *args, **kwargs: None
+
+class FakeStyle:
+    def lookup(self, style, option):
+        return "20"
+
+class FakeEvent:
+    def __init__(self, height):
+        self.height = height
+
+class InlineTasks:
+    """Runs calls when run_pending() is called, like AsyncController would later"""
+    def __init__(self):
+        self.pending = []
+        self.fetches = []
+
+    def call(self, target, *args, on_done=None, on_error=None, key=None):
+        self.fetches.append(args)
+        self.pending.append(lambda: on_done(target(*args)))
+
+    def run_pending(self):
+        pending, self.pending = self.pending, []
+        for run in pending:
+            run()
+
+@pytest.fixture
+def catalog(monkeypatch):
+    monkeypatch.setattr(ttk, "Treeview", FakeTree)
+    monkeypatch.setattr(ttk, "Frame", FakeWidget)
+    monkeypatch.setattr(ttk, "Scrollbar", FakeWidget)
+    monkeypatch.setattr(ttk, "Style", FakeStyle)
+    rows = [(f"Product {i:06d}", i) for i in range(100_000)]
+    tasks = InlineTasks()
+
+    def fetch(offset, limit):
+        return len(rows), rows[offset:offset + limit]
+
+    selected = []
+    view = VirtualTreeview(None, tasks, fetch, columns=("Name", "Stock"), key=lambda row: row[0],
+                           on_select=selected.append)
+    # 10 rows fit: (225 - header) // 20
+    view._on_resize(FakeEvent(225))
+    tasks.run_pending()
+    return view, tasks, rows, selected
+
+def test_only_visible_rows_are_materialized(catalog):
+    """Test that a 100k row list puts only the on-screen rows in the tree, fetched a block at a time"""
+    view, tasks, rows, _ = catalog
+    assert view.total == 100_000
+    assert view.tree.shown() == rows[:10]
+    assert tasks.fetches == [(0, VirtualTreeview.BLOCK)]
+
+    view.scroll(3)
+    assert view.tree.shown() == rows[3:13]
+    assert len(tasks.fetches) == 1  # still within the first block
+
+    view._on_scrollbar("moveto", "0.5")
+    tasks.run_pending()
+    assert view.tree.shown() == rows[50_000:50_010]
+    assert view.scrollbar.position == (0.5, 0.5001)
+    assert len(view.tree.order) == 10
+
+    # Scrolling past the end stops at the last full screen
+    view._on_scrollbar("moveto", "1.0")
+    tasks.run_pending()
+    assert view.tree.shown() == rows[-10:]
+
+def test_selection_follows_the_row_and_updates_patch_one_slot(catalog):
+    """Test that the selection sticks to its row while scrolling and update_row is one widget operation"""
+    view, tasks, rows, selected = catalog
+    view._on_key(1)  # Down selects the first row
+    view._on_key(1)
+    assert selected == [rows[0], rows[1]]
+    assert view.tree.selection() == (view.tree.order[1],)
+
+    view.scroll(5)
+    assert view.tree.selection() == ()  # row 1 scrolled out of view
+    view.scroll(-4)
+    assert view.tree.selection() == (view.tree.order[0],)
+    assert view.selected() == rows[1]
+
+    before = view.tree.operations
+    assert view.update_row(("Product 000003", -1))
+    assert view.tree.operations == before + 1
+    assert view.tree.shown()[2] == ("Product 000003", -1)
+    assert not view.update_row(("Product 099999", 0))  # not loaded
+
+def test_reload_refetches_and_keeps_old_rows_meanwhile(catalog):
+    """Test that reload() shows the old rows until the new ones arrive"""
+    view, tasks, rows, _ = catalog
+    del rows[0]
+    view.reload()
+    assert view.tree.shown()[0] == ("Product 000000", 0)
+    tasks.run_pending()
+    assert view.total == 99_999
+    assert view.tree.shown() == rows[:10]
@@ -1,11 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from controller.main_controller import MainController
+from controller.remote_controller import open_controller
+from controller.async_controller import AsyncController
+from controller import events
 from view.theme_manager import ThemeManager
+from view.virtual_tree import VirtualTreeview
 
 class AdminView:
-    def __init__(self):
-        self.controller = MainController()
+    # Product list columns that sort the list when their heading is clicked
+    PRODUCT_SORTS = {"Category": "category", "Name": "name", "Price": "price", "Stock": "stock"}
+
+    def __init__(self, controller=None):
+        # A logged in RemoteController when run against a server
+        self.controller = controller or open_controller()
         
         self.root = tk.Tk()
         self.root.title("Smart Mart - Admin Panel")
@@ -28,6 +35,16 @@ class AdminView:
         
         title_label = ttk.Label(header_frame, text="ADMIN PANEL", style="Title.TLabel")
         title_label.pack(side="left")
+        self.busy_label = ttk.Label(header_frame, text="")
+        self.busy_label.pack(side="right")
+
+        # Controller calls run in the background, results come back via after()
+        self.tasks = AsyncController(self.controller, self.root, on_busy=self.show_busy)
+
+        # The lists are patched from the controller's change events instead
+        # of being reloaded; cashier tree rows by username
+        self.cashier_rows = {}
+        unlisten = self.tasks.listen(self.controller.events, self.on_change)
         
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.root)
@@ -44,6 +61,25 @@ class AdminView:
         self._init_cashiers_tab()
         
         self.root.mainloop()
+        unlisten()
+        self.tasks.shutdown()
+
+    def show_busy(self, busy):
+        self.busy_label.config(text="Working..." if busy else "")
+        self.root.config(cursor="watch" if busy else "")
+
+    def show_error(self, error):
+        messagebox.showerror("Error", str(error))
+
+    def _run(self, method, *args, message, after=None, key=None, widgets=()):
+        """Run a controller change in the background, then confirm; the lists follow its events"""
+        def done(_):
+            if after:
+                after()
+            messagebox.showinfo("Success", message)
+
+        self.tasks.call(method, *args, on_done=done, on_error=self.show_error,
+                        key=key or (method,) + args, widgets=widgets)
     
     def _init_products_tab(self):
         # Left panel - Product Management
@@ -69,48 +105,48 @@ class AdminView:
         ttk.Label(left_frame, text="Quantity:").pack(anchor="w", pady=(0, 5))
         self.quantity = ttk.Entry(left_frame)
         self.quantity.pack(fill="x", pady=(0, 15))
+
+        ttk.Label(left_frame, text="Barcode / SKU (optional):").pack(anchor="w", pady=(0, 5))
+        self.code = ttk.Entry(left_frame)
+        self.code.pack(fill="x", pady=(0, 15))
         
         # Buttons
         btn_frame = ttk.Frame(left_frame)
         btn_frame.pack(fill="x", pady=(20, 0))
         
-        ttk.Button(btn_frame, text="Add Product", command=self.add_product, style="Success.TButton").pack(side="left", padx=5)
-        ttk.Button(btn_frame, text="Update Product", command=self.update_product).pack(side="left", padx=5)
-        ttk.Button(btn_frame, text="Delete Product", command=self.delete_product, style="Warning.TButton").pack(side="left", padx=5)
+        self.product_buttons = [
+            ttk.Button(btn_frame, text="Add Product", command=self.add_product, style="Success.TButton"),
+            ttk.Button(btn_frame, text="Update Product", command=self.update_product),
+            ttk.Button(btn_frame, text="Delete Product", command=self.delete_product, style="Warning.TButton"),
+        ]
+        for button in self.product_buttons:
+            button.pack(side="left", padx=5)
         
         # Right panel - Product List
         right_frame = ttk.LabelFrame(self.products_tab, text="Product List", padding=20)
         right_frame.pack(side="right", fill="both", expand=True, padx=(10, 0))
         
-        # Product list with scrollbar
-        tree_frame = ttk.Frame(right_frame)
-        tree_frame.pack(fill="both", expand=True)
-        
-        self.product_tree = ttk.Treeview(tree_frame, columns=("Category", "Name", "Price", "Stock"), show="headings", selectmode="browse")
-        
-        # Scrollbars
-        y_scroll = ttk.Scrollbar(tree_frame, orient="vertical", command=self.product_tree.yview)
-        x_scroll = ttk.Scrollbar(tree_frame, orient="horizontal", command=self.product_tree.xview)
-        self.product_tree.configure(yscrollcommand=y_scroll.set, xscrollcommand=x_scroll.set)
-        
-        # Pack scrollbars
-        y_scroll.pack(side="right", fill="y")
-        x_scroll.pack(side="bottom", fill="x")
-        self.product_tree.pack(fill="both", expand=True)
+        # Product list. Only the rows on screen exist in the tree; they are
+        # paged in from the catalog as the list scrolls (view/virtual_tree.py)
+        self.product_sort = ["category"]
+        self.product_list = VirtualTreeview(
+            right_frame, self.tasks, self._product_page,
+            columns=("Category", "Name", "Price", "Stock", "Code"),
+            key=self._product_key, on_select=self.on_product_select, on_error=self.show_error)
+        self.product_list.pack(fill="both", expand=True)
+        self.product_tree = self.product_list.tree
         
         # Configure columns
-        self.product_tree.heading("Category", text="Category")
-        self.product_tree.heading("Name", text="Name")
-        self.product_tree.heading("Price", text="Price")
-        self.product_tree.heading("Stock", text="Stock")
+        for column, key in self.PRODUCT_SORTS.items():
+            self.product_tree.heading(column, text=column, command=lambda key=key: self.sort_products(key))
+        self.product_tree.heading("Code", text="Barcode")
+        self._show_product_sort()
         
         self.product_tree.column("Category", width=150)
         self.product_tree.column("Name", width=200)
         self.product_tree.column("Price", width=100)
         self.product_tree.column("Stock", width=100)
-        
-        # Bind selection event
-        self.product_tree.bind('<<TreeviewSelect>>', self.on_product_select)
+        self.product_tree.column("Code", width=140)
         
         self.refresh_products()
         
@@ -132,9 +168,13 @@ class AdminView:
         btn_frame = ttk.Frame(left_frame)
         btn_frame.pack(fill="x", pady=(20, 0))
         
-        ttk.Button(btn_frame, text="Add Cashier", command=self.add_cashier, style="Success.TButton").pack(side="left", padx=5)
-        ttk.Button(btn_frame, text="Update Cashier", command=self.update_cashier).pack(side="left", padx=5)
-        ttk.Button(btn_frame, text="Delete Cashier", command=self.delete_cashier, style="Warning.TButton").pack(side="left", padx=5)
+        self.cashier_buttons = [
+            ttk.Button(btn_frame, text="Add Cashier", command=self.add_cashier, style="Success.TButton"),
+            ttk.Button(btn_frame, text="Update Cashier", command=self.update_cashier),
+            ttk.Button(btn_frame, text="Delete Cashier", command=self.delete_cashier, style="Warning.TButton"),
+        ]
+        for button in self.cashier_buttons:
+            button.pack(side="left", padx=5)
         
         # Right panel - Cashier List
         right_frame = ttk.LabelFrame(self.cashiers_tab, text="Cashier List", padding=20)
@@ -163,17 +203,17 @@ class AdminView:
         
         self.refresh_cashiers()
     
-    def on_product_select(self, event=None):
-        selected = self.product_tree.selection()
-        if selected:
-            values = self.product_tree.item(selected)['values']
-            self.category_var.set(values[0])
-            self.product_name.delete(0, tk.END)
-            self.product_name.insert(0, values[1])
-            self.price.delete(0, tk.END)
-            self.price.insert(0, values[2].replace('$', ''))
-            self.quantity.delete(0, tk.END)
-            self.quantity.insert(0, values[3])
+    def on_product_select(self, row):
+        category, name, price, quantity, code = row
+        self.category_var.set(category)
+        self.product_name.delete(0, tk.END)
+        self.product_name.insert(0, name)
+        self.price.delete(0, tk.END)
+        self.price.insert(0, price.replace('$', ''))
+        self.quantity.delete(0, tk.END)
+        self.quantity.insert(0, quantity)
+        self.code.delete(0, tk.END)
+        self.code.insert(0, code)
     
     def on_cashier_select(self, event=None):
         selected = self.cashier_tree.selection()
@@ -183,26 +223,81 @@ class AdminView:
             self.cashier_username.insert(0, values[0])
             self.cashier_password.delete(0, tk.END)
     
+    @staticmethod
+    def _row_values(category, product):
+        name, price, qty = product
+        return (category, name, f"${price:.2f}", qty, getattr(product, "code", None) or "")
+
+    @staticmethod
+    def _product_key(row):
+        return (row[0], row[1].lower())
+
+    def _product_page(self, offset, limit):
+        """(total, tree rows) for a page of the catalog; runs on a worker thread"""
+        total, items = self.controller.get_products_page(offset, limit, self.product_sort)
+        return total, [self._row_values(category, item) for category, item in items]
+
     def refresh_products(self):
-        # Clear existing items
-        for item in self.product_tree.get_children():
-            self.product_tree.delete(item)
-        
-        # Get products from controller and populate
-        products = self.controller.get_all_products()
-        for category, items in products.items():
-            for name, price, qty in items:
-                self.product_tree.insert("", "end", values=(category, name, f"${price:.2f}", qty))
+        self.product_list.reload()
+
+    def sort_products(self, key):
+        """
+        Sort the product list by key, or reverse it if already sorted by key.
+        The previous order breaks ties; the model does the sorting, see
+        ProductModel.query_products.
+        """
+        primary = self.product_sort[0]
+        if primary.lstrip("-") == key:
+            self.product_sort = [key if primary.startswith("-") else "-" + key] + self.product_sort[1:]
+        else:
+            self.product_sort = [key, primary]
+        self._show_product_sort()
+        self.product_list.reload()
+        self.product_list.show(0)
+
+    def _show_product_sort(self):
+        """Mark the sorted column's heading with the direction"""
+        primary = self.product_sort[0]
+        for column, key in self.PRODUCT_SORTS.items():
+            arrow = ""
+            if primary.lstrip("-") == key:
+                arrow = " \u25bc" if primary.startswith("-") else " \u25b2"
+            self.product_tree.heading(column, text=column + arrow)
     
     def refresh_cashiers(self):
-        # Clear existing items
-        for item in self.cashier_tree.get_children():
-            self.cashier_tree.delete(item)
-        
-        # Get cashiers from controller and populate
-        cashiers = self.controller.get_all_cashiers()
-        for username in cashiers:
-            self.cashier_tree.insert("", "end", values=(username,))
+        def loaded(cashiers):
+            # Clear existing items
+            for item in self.cashier_tree.get_children():
+                self.cashier_tree.delete(item)
+            self.cashier_rows = {}
+            for username in cashiers:
+                self.cashier_rows[username] = self.cashier_tree.insert("", "end", values=(username,))
+
+        self.tasks.call("get_all_cashiers", on_done=loaded, on_error=self.show_error,
+                        key="cashiers", policy="replace")
+
+    def on_change(self, event):
+        """Patch the tree row a change event is about"""
+        if event.kind in (events.CASHIER_ADDED, events.CASHIER_REMOVED):
+            row = self.cashier_rows.pop(event.username, None)
+            if row is not None:
+                self.cashier_tree.delete(row)
+            if event.kind == events.CASHIER_ADDED:
+                self.cashier_rows[event.username] = self.cashier_tree.insert("", "end", values=(event.username,))
+            return
+
+        key = (event.category, event.name.lower())
+        if event.kind in (events.PRODUCT_ADDED, events.PRODUCT_DELETED) or self.product_sort != ["category"]:
+            # Rows move: refetch the page on screen
+            self.product_list.reload()
+            return
+        row = self._row_values(event.category, event.product)
+        if event.kind == events.STOCK_CHANGED:
+            old = self.product_list.find(key)
+            if old is None:
+                return
+            row = old[:3] + (event.product[2],) + old[4:]
+        self.product_list.update_row(row)
     
     def add_product(self):
         try:
@@ -214,23 +309,22 @@ class AdminView:
             if not all([category, name, price > 0, quantity >= 0]):
                 messagebox.showerror("Error", "Please fill all fields with valid values")
                 return
-            
-            self.controller.add_product(category, name, price, quantity)
-            self.refresh_products()
-            messagebox.showinfo("Success", "Product added successfully")
-            
-            # Clear fields
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        def clear_fields():
             self.product_name.delete(0, tk.END)
             self.price.delete(0, tk.END)
             self.quantity.delete(0, tk.END)
+            self.code.delete(0, tk.END)
             self.category_combo.set('')
-            
-        except ValueError as e:
-            messagebox.showerror("Error", str(e))
+
+        self._run("add_product", category, name, price, quantity, self.code.get(),
+                  message="Product added successfully", after=clear_fields, widgets=self.product_buttons)
     
     def update_product(self):
-        selected = self.product_tree.selection()
-        if not selected:
+        if self.product_list.selected() is None:
             messagebox.showerror("Error", "Please select a product to update")
             return
             
@@ -243,27 +337,25 @@ class AdminView:
             if not all([category, name, price > 0, quantity >= 0]):
                 messagebox.showerror("Error", "Please fill all fields with valid values")
                 return
-            
-            self.controller.update_product(category, name, price, quantity)
-            self.refresh_products()
-            messagebox.showinfo("Success", "Product updated successfully")
-            
         except ValueError as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        # An emptied barcode field removes the code
+        self._run("update_product", category, name, price, quantity, self.code.get(),
+                  message="Product updated successfully", widgets=self.product_buttons)
     
     def delete_product(self):
-        selected = self.product_tree.selection()
-        if not selected:
+        selected = self.product_list.selected()
+        if selected is None:
             messagebox.showerror("Error", "Please select a product to delete")
             return
             
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this product?"):
-            values = self.product_tree.item(selected)['values']
-            category, name = values[0], values[1]
+            category, name = selected[0], selected[1]
             
-            self.controller.delete_product(category, name)
-            self.refresh_products()
-            messagebox.showinfo("Success", "Product deleted successfully")
+            self._run("delete_product", category, name, message="Product deleted successfully",
+                      widgets=self.product_buttons)
     
     def add_cashier(self):
         username = self.cashier_username.get().strip()
@@ -273,17 +365,12 @@ class AdminView:
             messagebox.showerror("Error", "Please fill both username and password")
             return
         
-        try:
-            self.controller.add_cashier(username, password)
-            self.refresh_cashiers()
-            messagebox.showinfo("Success", "Cashier added successfully")
-            
-            # Clear fields
+        def clear_fields():
             self.cashier_username.delete(0, tk.END)
             self.cashier_password.delete(0, tk.END)
-            
-        except ValueError as e:
-            messagebox.showerror("Error", str(e))
+
+        self._run("add_cashier", username, password, message="Cashier added successfully",
+                  after=clear_fields, widgets=self.cashier_buttons)
     
     def update_cashier(self):
         selected = self.cashier_tree.selection()
@@ -298,13 +385,8 @@ class AdminView:
             messagebox.showerror("Error", "Please fill both username and password")
             return
         
-        try:
-            self.controller.update_cashier(username, password)
-            self.refresh_cashiers()
-            messagebox.showinfo("Success", "Cashier updated successfully")
-            
-        except ValueError as e:
-            messagebox.showerror("Error", str(e))
+        self._run("update_cashier", username, password, message="Cashier updated successfully",
+                  widgets=self.cashier_buttons)
     
     def delete_cashier(self):
         selected = self.cashier_tree.selection()
@@ -315,9 +397,8 @@ class AdminView:
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this cashier?"):
             username = self.cashier_tree.item(selected)['values'][0]
             
-            self.controller.delete_cashier(username)
-            self.refresh_cashiers()
-            messagebox.showinfo("Success", "Cashier deleted successfully")
+            self._run("delete_cashier", username, message="Cashier deleted successfully",
+                      widgets=self.cashier_buttons)
 
 if __name__ == "__main__":
     AdminView()
@@ -1,14 +1,16 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from controller.main_controller import MainController
+from controller.remote_controller import open_controller
+from controller.async_controller import AsyncController
 from view.theme_manager import ThemeManager
 import os
 
 class CashierView:
-    def __init__(self, username):
-        self.controller = MainController()
+    def __init__(self, username, controller=None):
+        # A logged in RemoteController when run against a server
+        self.controller = controller or open_controller()
         self.username = username
-        self.cart = []  # List of tuples (name, price, quantity)
+        self.cart = self.controller.new_cart()
         
         self.root = tk.Tk()
         self.root.title(f"Smart Mart - Cashier Panel ({username})")
@@ -34,6 +36,11 @@ class CashierView:
         
         cashier_label = ttk.Label(header_frame, text=f"Logged in as: {username}", style="Subtitle.TLabel")
         cashier_label.pack(side="right")
+        self.busy_label = ttk.Label(header_frame, text="")
+        self.busy_label.pack(side="right", padx=20)
+
+        # Controller calls run in the background, results come back via after()
+        self.tasks = AsyncController(self.controller, self.root, on_busy=self.show_busy)
 
         # Create main frame
         main_frame = ttk.Frame(self.root, padding="20")
@@ -43,6 +50,28 @@ class CashierView:
         left_frame = ttk.LabelFrame(main_frame, text="Add Products", padding="20")
         left_frame.pack(side="left", fill="both", expand=True, padx=(0, 10))
 
+        # Barcode entry. A keyboard-wedge scanner types the code followed
+        # by Enter into whatever has focus, so this field keeps it.
+        ttk.Label(left_frame, text="Scan barcode:").pack(anchor="w", pady=(0, 5))
+        self.barcode_var = tk.StringVar()
+        self.barcode_entry = ttk.Entry(left_frame, textvariable=self.barcode_var)
+        self.barcode_entry.pack(fill="x")
+        self.barcode_entry.bind('<Return>', self.on_scan)
+        self.barcode_entry.bind('<KP_Enter>', self.on_scan)
+        self.scan_status = ttk.Label(left_frame, text="")
+        self.scan_status.pack(anchor="w", pady=(0, 15))
+
+        # Type-ahead product search
+        ttk.Label(left_frame, text="Search:").pack(anchor="w", pady=(0, 5))
+        self.search_var = tk.StringVar()
+        self.search_entry = ttk.Entry(left_frame, textvariable=self.search_var)
+        self.search_entry.pack(fill="x")
+        self.search_entry.bind('<KeyRelease>', self.on_search)
+        self.search_list = tk.Listbox(left_frame, height=6)
+        self.search_list.pack(fill="x", pady=(0, 15))
+        self.search_list.bind('<<ListboxSelect>>', self.on_search_select)
+        self.search_results = []
+
         # Category selection
         ttk.Label(left_frame, text="Category:").pack(anchor="w", pady=(0, 5))
         self.category_var = tk.StringVar()
@@ -64,7 +93,14 @@ class CashierView:
         self.quantity_entry.pack(fill="x", pady=(0, 15))
 
         # Add to cart button
-        ttk.Button(left_frame, text="Add to Cart", command=self.add_to_cart, style="Success.TButton").pack(fill="x", pady=20)
+        self.add_button = ttk.Button(left_frame, text="Add to Cart", command=self.add_to_cart, style="Success.TButton")
+        self.add_button.pack(fill="x", pady=(20, 5))
+
+        # Edit the cart line of the selected product
+        edit_frame = ttk.Frame(left_frame)
+        edit_frame.pack(fill="x")
+        ttk.Button(edit_frame, text="Set Quantity", command=self.set_cart_quantity).pack(side="left", expand=True, fill="x", padx=(0, 5))
+        ttk.Button(edit_frame, text="Remove from Cart", command=self.remove_from_cart, style="Warning.TButton").pack(side="left", expand=True, fill="x")
 
         # Right frame for cart and payment
         right_frame = ttk.LabelFrame(main_frame, text="Cart", padding="20")
@@ -79,25 +115,93 @@ class CashierView:
         payment_frame.pack(pady=10, fill="x")
         
         self.payment_var = tk.StringVar(value="Cash")
-        ttk.Radiobutton(payment_frame, text="Cash", variable=self.payment_var, value="Cash").pack(side="left", padx=20)
-        ttk.Radiobutton(payment_frame, text="Card (10% discount)", variable=self.payment_var, value="Card").pack(side="left", padx=20)
+        ttk.Radiobutton(payment_frame, text="Cash", variable=self.payment_var, value="Cash",
+                        command=self.on_payment_change).pack(side="left", padx=20)
+        ttk.Radiobutton(payment_frame, text="Card (10% discount)", variable=self.payment_var, value="Card",
+                        command=self.on_payment_change).pack(side="left", padx=20)
 
         # Process payment button
-        ttk.Button(right_frame, text="Process Payment", command=self.process_payment, style="Success.TButton").pack(fill="x", pady=10)
+        self.pay_button = ttk.Button(right_frame, text="Process Payment", command=self.process_payment, style="Success.TButton")
+        self.pay_button.pack(fill="x", pady=10)
 
         # Initialize product list
         self.products_by_category = {}
         self.update_cart_display()
 
+        self.barcode_entry.focus_set()
         self.root.mainloop()
+        self.tasks.shutdown()
+
+    def show_busy(self, busy):
+        self.busy_label.config(text="Working..." if busy else "")
+        self.root.config(cursor="watch" if busy else "")
 
-    def on_category_select(self, event=None):
+    def show_error(self, error):
+        messagebox.showerror("Error", str(error))
+
+    def on_category_select(self, event=None, select=''):
         category = self.category_var.get()
-        if category:
-            products = self.controller.get_products_by_category(category)
+        if not category:
+            return
+
+        def loaded(products):
             self.products_by_category[category] = products
             self.product_combo['values'] = [p[0] for p in products]  # p[0] is the product name
-            self.product_combo.set('')  # Clear current selection
+            self.product_combo.set(select)
+
+        self.tasks.call("get_products_by_category", category, on_done=loaded, on_error=self.show_error,
+                        key="category", policy="replace")
+
+    def on_search(self, event=None):
+        query = self.search_var.get()
+        if not query.strip():
+            self.show_search_results([])
+            return
+        # Only the latest keystroke's results are shown
+        self.tasks.call("search_products", query, 10, on_done=self.show_search_results,
+                        on_error=self.show_error, key="search", policy="replace")
+
+    def show_search_results(self, results):
+        self.search_results = results
+        self.search_list.delete(0, tk.END)
+        for category, product in self.search_results:
+            self.search_list.insert(tk.END, f"{product[0]}  ({category}, ${product[1]:.2f})")
+
+    def on_search_select(self, event=None):
+        selection = self.search_list.curselection()
+        if not selection:
+            return
+        category, product = self.search_results[selection[0]]
+        # Select the match through the category/product boxes so the cart
+        # and payment code see it the same way
+        self.category_var.set(category)
+        self.on_category_select(select=product[0])
+
+    def on_scan(self, event=None):
+        code = self.barcode_var.get().strip()
+        self.barcode_var.set('')
+        if not code:
+            return "break"
+
+        def scanned(found):
+            try:
+                if found is None:
+                    raise ValueError(f"No product with code '{code}'")
+                category, product = found
+                self.controller.put_in_cart(self.cart, category, product)
+            except ValueError as e:
+                scan_failed(e)
+                return
+            self.update_cart_display()
+            self.scan_status.config(text=f"Added {product[0]} (${product[1]:.2f})")
+
+        def scan_failed(error):
+            # No dialog: it would take the focus and swallow the next scans
+            self.scan_status.config(text=str(error))
+            self.root.bell()
+
+        self.tasks.call("get_product_by_code", code, on_done=scanned, on_error=scan_failed)
+        return "break"
 
     def add_to_cart(self):
         category = self.category_var.get()
@@ -115,85 +219,134 @@ class CashierView:
             messagebox.showerror("Error", str(e))
             return
 
-        try:
-            # Add to cart using controller
-            item = self.controller.add_to_cart(category, product_name, quantity)
-            self.cart.append(item)
+        def fetched(product):
+            try:
+                if product is None:
+                    raise ValueError(f"Product '{product_name}' not found in category '{category}'")
+                self.controller.put_in_cart(self.cart, category, product, quantity)
+            except ValueError as e:
+                self.show_error(e)
+                return
             self.update_cart_display()
             
             # Clear selections
             self.product_var.set('')
             self.quantity_var.set('1')
-            
+
+        self.tasks.call("get_product", category, product_name, on_done=fetched, on_error=self.show_error,
+                        key=("add", category, product_name, quantity), widgets=[self.add_button])
+
+    def set_cart_quantity(self):
+        category = self.category_var.get()
+        product_name = self.product_var.get()
+        if not category or not product_name:
+            messagebox.showerror("Error", "Please select both category and product")
+            return
+
+        try:
+            quantity = int(self.quantity_var.get())
         except ValueError as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        def fetched(product):
+            try:
+                if quantity > 0 and product is None:
+                    raise ValueError(f"Product '{product_name}' not found in category '{category}'")
+                if quantity > 0 and quantity > product[2]:
+                    raise ValueError(f"Only {product[2]} items available for '{product_name}'")
+                self.cart.set_quantity(category, product_name, quantity)
+            except ValueError as e:
+                self.show_error(e)
+                return
+            self.update_cart_display()
+
+        self.tasks.call("get_product", category, product_name, on_done=fetched, on_error=self.show_error,
+                        key=("set", category, product_name), policy="replace")
+
+    def remove_from_cart(self):
+        category = self.category_var.get()
+        product_name = self.product_var.get()
+        if not category or not product_name:
+            messagebox.showerror("Error", "Please select both category and product")
+            return
+
+        try:
+            self.cart.remove(category, product_name)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        self.update_cart_display()
+
+    def on_payment_change(self):
+        self.cart.payment_method = self.payment_var.get()
+        self.update_cart_display()
 
     def update_cart_display(self):
-        self.cart_text.delete('1.0', tk.END)
-        
         if not self.cart:
+            self.cart_text.delete('1.0', tk.END)
             self.cart_text.insert(tk.END, "Cart is empty\n")
             return
-            
-        # Display cart items
+
+        def priced(pricing):
+            # A pricing that finished after the cart was emptied is stale
+            if self.cart:
+                self.show_pricing(pricing)
+
+        # Pricing may go to the server; a newer change replaces one in flight
+        self.tasks.call("price_cart", self.cart.copy(), on_done=priced, on_error=self.show_error,
+                        key="pricing", policy="replace")
+
+    def show_pricing(self, pricing):
+        self.cart_text.delete('1.0', tk.END)
         self.cart_text.insert(tk.END, f"{'Product':<30}{'Price':>10}{'Qty':>8}{'Total':>12}\n")
         self.cart_text.insert(tk.END, "-" * 60 + "\n")
-        
-        total = 0
-        for name, price, qty in self.cart:
-            item_total = price * qty
-            total += item_total
-            self.cart_text.insert(tk.END, f"{name:<30}${price:>9.2f}{qty:>8}${item_total:>11.2f}\n")
+
+        for category, name, price, qty, discount, rule in pricing.lines:
+            self.cart_text.insert(tk.END, f"{name:<30}${price:>9.2f}{qty:>8}${price * qty:>11.2f}\n")
+            if discount:
+                label = f"  {rule.get('name') or 'Promotion'}"
+                self.cart_text.insert(tk.END, f"{label:<48}-${discount:>10.2f}\n")
             
         self.cart_text.insert(tk.END, "\n" + "-" * 60 + "\n")
         
-        # Apply discount if card payment
-        if self.payment_var.get() == "Card":
-            discount = total * 0.10
-            self.cart_text.insert(tk.END, f"{'Subtotal:':<30}${total:>31.2f}\n")
-            self.cart_text.insert(tk.END, f"{'Discount (10%):':<30}${discount:>31.2f}\n")
-            total -= discount
+        if pricing.discount:
+            self.cart_text.insert(tk.END, f"{'Subtotal:':<30}${pricing.subtotal:>31.2f}\n")
+            if pricing.basket_rule:
+                label = f"{pricing.basket_rule.get('name') or 'Basket discount'}:"
+                self.cart_text.insert(tk.END, f"{label:<30}${pricing.basket_discount:>31.2f}\n")
+            self.cart_text.insert(tk.END, f"{'Total discount:':<30}${pricing.discount:>31.2f}\n")
             
-        self.cart_text.insert(tk.END, f"{'Total:':<30}${total:>31.2f}\n")
+        self.cart_text.insert(tk.END, f"{'Total:':<30}${pricing.total:>31.2f}\n")
 
     def process_payment(self):
         if not self.cart:
             messagebox.showinfo("Info", "Cart is empty")
             return
 
-        total = self.controller.calculate_total(self.cart)
-        
-        # Apply discount for card payment
-        if self.payment_var.get() == "Card":
-            total = total * 0.9  # 10% discount
-
-        try:
-            # Reduce stock for all items
-            for name, _, qty in self.cart:
-                category = None
-                # Find the category for the product
-                for cat, products in self.products_by_category.items():
-                    if any(p[0] == name for p in products):
-                        category = cat
-                        break
-                        
-                if category:
-                    self.controller.reduce_stock(category, name, qty)
-
-            # Save the bill
-            self.controller.save_bill(total)
-            
+        def paid(receipt):
             messagebox.showinfo("Success", 
                               f"Payment processed successfully!\n\n"
-                              f"Payment Method: {self.payment_var.get()}\n"
-                              f"Total Amount: ${total:.2f}")
-            
-            # Clear cart
-            self.cart = []
+                              f"Bill Number: {receipt['bill_number']}\n"
+                              f"Payment Method: {payment_method}\n"
+                              f"Total Amount: ${receipt['total']:.2f}")
+
+            # Only what was sold; lines scanned meanwhile stay in the cart
+            self.cart.remove_lines(lines)
             self.update_cart_display()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to process payment: {str(e)}")
+            self.barcode_entry.focus_set()
+
+        def failed(error):
+            messagebox.showerror("Error", f"Failed to process payment: {str(error)}")
+
+        # Take the stock and save the bill in one step. The worker gets a
+        # snapshot of the lines; the cart itself is only touched on this
+        # thread, and a second click while paying joins the running call.
+        payment_method = self.payment_var.get()
+        lines = self.cart.checkout_lines()
+        self.tasks.call("checkout", lines, payment_method, self.username,
+                        on_done=paid, on_error=failed, key="checkout",
+                        widgets=[self.pay_button, self.add_button, self.barcode_entry])
 
 if __name__ == "__main__":
     CashierView("test_cashier")
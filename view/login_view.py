@@ -1,13 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from controller.main_controller import MainController
+from controller.remote_controller import open_controller
 from view.admin_view import AdminView
 from view.cashier_view import CashierView
 from view.theme_manager import ThemeManager
 
 class LoginView:
     def __init__(self):
-        self.controller = MainController()
+        self.controller = open_controller()
         
         self.root = tk.Tk()
         self.root.title("Smart Mart - Login")
@@ -95,10 +95,10 @@ class LoginView:
             
             if user_type == "admin":
                 self.root.destroy()
-                AdminView()
+                AdminView(self.controller)
             elif user_type == "cashier":
                 self.root.destroy()
-                CashierView(username)
+                CashierView(username, self.controller)
             else:
                 messagebox.showerror("Error", "Invalid username or password")
                 self.password_entry.delete(0, tk.END)
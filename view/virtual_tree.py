@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from tkinter import ttk
+
+
+class VirtualTreeview:
+    """
+    A ttk.Treeview showing a window onto a list too long to insert whole,
+    like a 100k product catalog. The tree only holds as many rows as fit
+    on screen; scrolling refills them from blocks of rows that are fetched
+    on the AsyncController's pool as they come into view, and kept (a few
+    screens' worth) for scrolling back.
+
+    fetch(offset, limit) returns (total, rows) with rows as tuples of column
+    values; key(row) identifies a row, so the selection survives scrolling
+    and reloads. on_select(row) is called when the user selects a row.
+    """
+
+    BLOCK = 200
+    MAX_BLOCKS = 8
+    HEADER_HEIGHT = 25
+
+    def __init__(self, parent, tasks, fetch, columns, key, on_select=None, on_error=None):
+        self.tasks = tasks
+        self.fetch = fetch
+        self.columns = columns
+        self.key = key
+        self.on_select = on_select
+        self.on_error = on_error
+        self.total = None        # unknown until the first block arrives
+        self.offset = 0          # index of the row in the top slot
+        self._blocks = OrderedDict()  # block number -> list of rows, least recently used first
+        self._stale = {}         # blocks from before reload(), shown until refetched
+        self._loading = set()
+        self._generation = 0     # bumped by reload(), results of older fetches are dropped
+        self._slots = []         # tree item ids, top to bottom
+        self._shown = []         # the values each slot shows
+        self._selected = None    # key of the selected row
+        self._selected_row = None
+        self._selected_index = None
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings", selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self._on_scrollbar)
+        x_scroll = ttk.Scrollbar(self.frame, orient="horizontal", command=self.tree.xview)
+        self.tree.configure(xscrollcommand=x_scroll.set)
+        self.scrollbar.pack(side="right", fill="y")
+        x_scroll.pack(side="bottom", fill="x")
+        self.tree.pack(fill="both", expand=True)
+
+        row_height = ttk.Style().lookup("Treeview", "rowheight")
+        self.row_height = int(row_height) if row_height else 20
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<MouseWheel>", lambda event: self.scroll(-3 if event.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll(3))
+        for keysym, step in (("Up", -1), ("Down", 1), ("Prior", "-page"), ("Next", "page")):
+            self.tree.bind(f"<{keysym}>", lambda event, step=step: self._on_key(step))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    @property
+    def visible(self):
+        return len(self._slots)
+
+    def selected(self):
+        """The selected row, or None"""
+        return self._selected_row
+
+    def reload(self):
+        """Refetch the rows, e.g. after rows were added or removed; the old ones show meanwhile"""
+        self._generation += 1
+        self._stale, self._blocks = dict(self._blocks), OrderedDict()
+        self._loading.clear()
+        self._redraw()
+
+    def find(self, key):
+        """The loaded row with this key, or None"""
+        for rows in self._blocks.values():
+            for row in rows:
+                if self.key(row) == key:
+                    return row
+        return None
+
+    def update_row(self, row):
+        """Replace a loaded row in place, found by its key; returns False if it is not loaded"""
+        key = self.key(row)
+        for number, rows in self._blocks.items():
+            for position, old in enumerate(rows):
+                if self.key(old) == key:
+                    rows[position] = row
+                    if key == self._selected:
+                        self._selected_row = row
+                    slot = number * self.BLOCK + position - self.offset
+                    if 0 <= slot < self.visible:
+                        self._show(slot, row)
+                    return True
+        return False
+
+    def scroll(self, delta):
+        self.show(self.offset + delta)
+        return "break"
+
+    def show(self, offset):
+        """Scroll so that row offset is at the top"""
+        last = max((self.total or 0) - self.visible, 0)
+        self.offset = min(max(offset, 0), last)
+        self._redraw()
+
+    def _row(self, index):
+        """The row at index if its block is loaded (else fetch it), or a stale copy, or None"""
+        number = index // self.BLOCK
+        rows = self._blocks.get(number)
+        if rows is None:
+            self._request(number)
+            rows = self._stale.get(number)
+        else:
+            self._blocks.move_to_end(number)
+        if rows is None or index - number * self.BLOCK >= len(rows):
+            return None
+        return rows[index - number * self.BLOCK]
+
+    def _request(self, number):
+        if number in self._loading:
+            return
+        self._loading.add(number)
+        generation = self._generation
+        self.tasks.call(self.fetch, number * self.BLOCK, self.BLOCK,
+                        on_done=lambda result: self._loaded(number, generation, result),
+                        on_error=self._failed(number, generation),
+                        key=("rows", id(self), generation, number))
+
+    def _failed(self, number, generation):
+        def failed(error):
+            if generation == self._generation:
+                self._loading.discard(number)
+            if self.on_error:
+                self.on_error(error)
+        return failed
+
+    def _loaded(self, number, generation, result):
+        if generation != self._generation:
+            return
+        self._loading.discard(number)
+        total, rows = result
+        self._blocks[number] = list(rows)
+        self._stale.pop(number, None)
+        while len(self._blocks) > self.MAX_BLOCKS:
+            self._blocks.popitem(last=False)
+        if total != self.total:
+            self.total = total
+            self.show(self.offset)  # clamps the offset to the new length
+        else:
+            self._redraw()
+
+    def _redraw(self):
+        """Fill every slot from the loaded rows, touching only the slots that change"""
+        selected_slot = None
+        for slot in range(self.visible):
+            index = self.offset + slot
+            row = self._row(index) if self.total is None or index < self.total else None
+            self._show(slot, row)
+            if row is not None and self.key(row) == self._selected:
+                selected_slot = slot
+                self._selected_index = index
+        if selected_slot is None:
+            if self.tree.selection():
+                self.tree.selection_remove(self.tree.selection())
+        elif self.tree.selection() != (self._slots[selected_slot],):
+            self.tree.selection_set(self._slots[selected_slot])
+        total = self.total or 0
+        if total:
+            self.scrollbar.set(self.offset / total, min((self.offset + self.visible) / total, 1.0))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _show(self, slot, row):
+        values = tuple(row) if row is not None else ("",) * len(self.columns)
+        if self._shown[slot] != values:
+            self._shown[slot] = values
+            self.tree.item(self._slots[slot], values=values)
+
+    def _on_resize(self, event):
+        wanted = max((event.height - self.HEADER_HEIGHT) // self.row_height, 1)
+        while len(self._slots) < wanted:
+            self._slots.append(self.tree.insert("", "end", values=()))
+            self._shown.append(None)
+        while len(self._slots) > wanted:
+            self.tree.delete(self._slots.pop())
+            self._shown.pop()
+        self.show(self.offset)
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.show(int(float(amount) * (self.total or 0)))
+        elif unit == "pages":
+            self.scroll(int(amount) * self.visible)
+        else:
+            self.scroll(int(amount))
+
+    def _on_tree_select(self, event=None):
+        selection = self.tree.selection()
+        if not selection:
+            return
+        index = self.offset + self._slots.index(selection[0])
+        row = self._row(index)
+        if row is None:
+            return
+        self._selected_index = index
+        # Ignore the event for the selection _redraw puts back
+        if self.key(row) != self._selected:
+            self._select(row)
+
+    def _select(self, row):
+        self._selected = self.key(row)
+        self._selected_row = row
+        if self.on_select:
+            self.on_select(row)
+
+    def _on_key(self, step):
+        if not self.total:
+            return "break"
+        if step in ("page", "-page"):
+            step = self.visible if step == "page" else -self.visible
+        current = self._selected_index if self._selected_index is not None else self.offset - 1
+        index = min(max(current + step, 0), self.total - 1)
+        if index < self.offset:
+            self.show(index)
+        elif index >= self.offset + self.visible:
+            self.show(index - self.visible + 1)
+        row = self._row(index)
+        if row is not None:
+            self._selected_index = index
+            self._select(row)
+            self._redraw()
+        return "break"